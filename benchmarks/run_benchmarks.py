@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+import gc
+import sys
+import json
+import time
+import platform
+import threading
+import os.path
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
+
+from workloads import Workloads
+
+PipelineStages = ['scan', 'parse', 'frontEnd', 'analysis', 'optimization', 'gcm', 'interpretation']
+
+class PipelineStageTimer:
+    def __init__(self) -> None:
+        self.stageTimes = {}
+
+    def time(self, stage: str, function, *arguments):
+        startTime = time.perf_counter()
+        result = function(*arguments)
+        self.stageTimes[stage] = time.perf_counter() - startTime
+        return result
+
+def runPipelineOnSource(sourceText: str, sourceName: str, optimize: bool = True) -> dict:
+    from pyst.scanner import scanSourceString
+    from pyst.parser import ParserState, parseTopLevelExpressionWithErrors
+    from pyst.syntax import ASGParseTreeFrontEnd
+    from pyst.analysis import expandAndAnalyze
+    from pyst.optimization import optimizeTopLevelScript
+    from pyst.environment import makeScriptAnalysisEnvironment
+    from pyst.gcm import topLevelScriptGCM
+
+    timer = PipelineStageTimer()
+    sourceCode, tokens = timer.time('scan', scanSourceString, sourceText, sourceName)
+    parseTree, parseErrors = timer.time('parse', lambda: parseTopLevelExpressionWithErrors(ParserState(sourceCode, tokens)))
+    if len(parseErrors) != 0:
+        raise Exception('Parse errors in benchmark workload %s: %s' % (sourceName, parseErrors[0].message))
+
+    asgSyntax = timer.time('frontEnd', ASGParseTreeFrontEnd().visitNode, parseTree)
+    asgAnalyzed, asgAnalysisErrors = timer.time('analysis', expandAndAnalyze, makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), sourceName), asgSyntax)
+    if len(asgAnalysisErrors) != 0:
+        raise Exception('Analysis errors in benchmark workload %s: %s' % (sourceName, asgAnalysisErrors[0].prettyPrintError()))
+
+    if optimize:
+        asgAnalyzed, removedNodeCount = timer.time('optimization', optimizeTopLevelScript, asgAnalyzed)
+    interpretableScript = timer.time('gcm', lambda: topLevelScriptGCM(asgAnalyzed).asInterpretableInstructions())
+    timer.time('interpretation', evaluateWithDiscardedOutput, interpretableScript)
+    return timer.stageTimes
+
+def evaluateWithDiscardedOutput(interpretableScript):
+    from pyst.environment import Stdio, FileStream
+
+    stdout = Stdio.stdout
+    with open(os.devnull, 'w') as nullOutput:
+        Stdio.stdout = FileStream(nullOutput)
+        try:
+            return interpretableScript.evaluateWithArguments()
+        finally:
+            Stdio.stdout = stdout
+
+class BenchmarkDriver:
+    def __init__(self) -> None:
+        self.benchmarksFolder = os.path.realpath(os.path.dirname(__file__))
+        self.selectedWorkloads = []
+        self.outputFileName = None
+        self.baselineFileName = os.path.join(self.benchmarksFolder, 'baseline.json')
+        self.threshold = 0.5
+        self.minimumComparedTime = 0.001
+        self.repeatCount = 3
+        self.sizeScale = 1.0
+        self.optimize = True
+        self.saveBaseline = False
+        self.isDone = False
+
+    def printHelp(self):
+        print(
+"""run_benchmarks.py [options] [workloads]*
+-h -help --help             Prints this message.
+-o                          Writes the JSON results into the given file.
+-baseline                   Sets the baseline results file. Defaults to benchmarks/baseline.json.
+-save-baseline              Writes the results as the new baseline instead of comparing against it.
+-threshold                  Sets the accepted slowdown fraction before reporting a regression. Defaults to 0.5.
+-repeat                     Sets the number of repetitions. The best time of each stage is kept.
+-scale                      Scales the size of the generated workloads.
+-no-optimization            Skips the optimization passes.
+-list                       Lists the available workloads.
+"""
+        )
+
+    def parseCommandLineArguments(self, argv):
+        i = 1
+        while i < len(argv):
+            arg = argv[i]
+            i += 1
+            if len(arg) > 0 and arg[0] == '-':
+                if arg in ['-h', '-help', '--help']:
+                    self.printHelp()
+                    self.isDone = True
+                    return True
+                elif arg in ['-list']:
+                    for workloadName in Workloads.keys():
+                        print(workloadName)
+                    self.isDone = True
+                    return True
+                elif arg in ['-save-baseline']:
+                    self.saveBaseline = True
+                elif arg in ['-no-optimization']:
+                    self.optimize = False
+                elif arg in ['-o', '-baseline', '-threshold', '-repeat', '-scale']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    value = argv[i]
+                    i += 1
+                    if arg == '-o':
+                        self.outputFileName = value
+                    elif arg == '-baseline':
+                        self.baselineFileName = value
+                    elif arg == '-threshold':
+                        self.threshold = float(value)
+                    elif arg == '-repeat':
+                        self.repeatCount = max(1, int(value))
+                    elif arg == '-scale':
+                        self.sizeScale = float(value)
+                else:
+                    self.printHelp()
+                    return False
+            else:
+                if arg not in Workloads:
+                    sys.stderr.write('Unknown workload %s.\n' % arg)
+                    return False
+                self.selectedWorkloads.append(arg)
+        return True
+
+    def runWorkload(self, workloadName: str) -> dict:
+        generator, defaultSize = Workloads[workloadName]
+        size = max(1, int(defaultSize * self.sizeScale))
+        sourceText = generator(size)
+
+        bestStageTimes = {}
+        for i in range(self.repeatCount):
+            gc.collect()
+            stageTimes = runPipelineOnSource(sourceText, workloadName + '.st', self.optimize)
+            for stage, stageTime in stageTimes.items():
+                bestStageTimes[stage] = min(stageTime, bestStageTimes.get(stage, stageTime))
+
+        return {
+            'size': size,
+            'sourceSize': len(sourceText),
+            'stages': bestStageTimes
+        }
+
+    def runWorkloads(self) -> dict:
+        workloadNames = self.selectedWorkloads
+        if len(workloadNames) == 0:
+            workloadNames = list(Workloads.keys())
+
+        results = {}
+        for workloadName in workloadNames:
+            results[workloadName] = self.runWorkload(workloadName)
+            self.printWorkloadResult(workloadName, results[workloadName])
+
+        return {
+            'version': 1,
+            'python': platform.python_version(),
+            'repeat': self.repeatCount,
+            'scale': self.sizeScale,
+            'optimize': self.optimize,
+            'workloads': results
+        }
+
+    def printWorkloadResult(self, workloadName: str, result: dict):
+        print('%s (size %d)' % (workloadName, result['size']))
+        for stage in PipelineStages:
+            if stage in result['stages']:
+                print('    %-16s %10.3f ms' % (stage, result['stages'][stage] * 1000.0))
+
+    def compareWithBaseline(self, results: dict, baseline: dict) -> bool:
+        regressions = []
+        if baseline.get('optimize', True) != results['optimize']:
+            print('The baseline was recorded with different optimization settings.')
+            return True
+
+        for workloadName, result in results['workloads'].items():
+            baselineResult = baseline['workloads'].get(workloadName, None)
+            if baselineResult is None or baselineResult['size'] != result['size']:
+                continue
+
+            for stage, stageTime in result['stages'].items():
+                baselineTime = baselineResult['stages'].get(stage, None)
+                # Stages below the timer resolution are dominated by noise.
+                if baselineTime is None or baselineTime < self.minimumComparedTime:
+                    continue
+
+                ratio = stageTime / baselineTime
+                if ratio > 1.0 + self.threshold:
+                    regressions.append((workloadName, stage, baselineTime, stageTime, ratio))
+
+        for workloadName, stage, baselineTime, stageTime, ratio in regressions:
+            print('Regression in %s %s: %.3f ms -> %.3f ms (%.2fx)' % (workloadName, stage, baselineTime * 1000.0, stageTime * 1000.0, ratio))
+        if len(regressions) == 0:
+            print('No regressions above %d%% against the baseline.' % int(self.threshold * 100))
+        return len(regressions) == 0
+
+    def writeResults(self, results: dict, fileName: str):
+        with open(fileName, 'w') as f:
+            json.dump(results, f, indent = 2)
+            f.write('\n')
+
+    def main(self, argv):
+        if not self.parseCommandLineArguments(argv):
+            return False
+        if self.isDone:
+            return True
+
+        results = self.runWorkloads()
+        if self.outputFileName is not None:
+            self.writeResults(results, self.outputFileName)
+
+        if self.saveBaseline:
+            self.writeResults(results, self.baselineFileName)
+            return True
+
+        if os.path.exists(self.baselineFileName):
+            with open(self.baselineFileName, 'r') as f:
+                baseline = json.load(f)
+            return self.compareWithBaseline(results, baseline)
+        return True
+
+def runWithLargeStack(function):
+    # The analysis and GCM recurse along the sequencing chains, so long scripts need a deep stack.
+    sys.setrecursionlimit(200000)
+    threading.stack_size(512*1024*1024)
+    result = []
+    thread = threading.Thread(target = lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return len(result) != 0 and result[0]
+
+if __name__ == "__main__":
+    if not runWithLargeStack(lambda: BenchmarkDriver().main(sys.argv)):
+        sys.exit(1)
@@ -0,0 +1,43 @@
+# The workloads print their results, so that the optimizer cannot remove their computations.
+def generateStraightLineScript(size: int) -> str:
+    return ''.join('Stdio stdout print: ([:x | {x. %d}] value: %d); nl.\n' % (i, i) for i in range(size)) + 'nil\n'
+
+def generateNestedBlocks(size: int) -> str:
+    arguments = ['a%d' % i for i in range(size)]
+    block = '{%s}' % '. '.join(arguments)
+    for argument in reversed(arguments):
+        block = '[:%s | %s]' % (argument, block)
+    for i in range(size):
+        block = '(%s value: %d)' % (block, i)
+    return block + '\n'
+
+def generateWideLiteralArrays(size: int) -> str:
+    elements = list(map(str, range(size)))
+    return '{#(%s). {%s}}\n' % (' '.join(elements), '. '.join(elements))
+
+def generateManySends(size: int) -> str:
+    sends = ''.join('    b value: %d.\n' % i for i in range(size))
+    return '[:b |\n%s    nil\n] value: [:x | {x}]\n' % sends
+
+def generateClosureCallChain(size: int) -> str:
+    block = '[:x | {x}]'
+    for i in range(size):
+        block = '[:x | {%d. %s value: x}]' % (i, block)
+    return 'Stdio stdout print: (%s value: 0); nl\n' % block
+
+def generateClosureRecursion(size: int) -> str:
+    # A block walks a list encoded as blocks by applying itself, so the calls are only known at run time.
+    list = '[:cons :nil | nil value]'
+    for i in reversed(range(size)):
+        list = '[:cons :nil | cons value: %d value: %s]' % (i, list)
+    walk = '[:walk :list | list value: [:head :tail | {head. walk value: walk value: tail}] value: [nil]]'
+    return 'Stdio stdout print: (%s value: %s value: %s); nl\n' % (walk, walk, list)
+
+Workloads = {
+    'straightLine': (generateStraightLineScript, 2000),
+    'nestedBlocks': (generateNestedBlocks, 64),
+    'wideLiteralArrays': (generateWideLiteralArrays, 20000),
+    'manySends': (generateManySends, 2000),
+    'closureCallChain': (generateClosureCallChain, 128),
+    'closureRecursion': (generateClosureRecursion, 200),
+}
@@ -8,7 +8,7 @@ class FrontEndDriver:
     def __init__(self) -> None:
         self.module = None
         self.moduleName = None
-        self.topFolder = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+        self.topFolder = os.path.realpath(os.path.dirname(__file__))
         self.inputSourceFiles = []
         self.includeDirectories = [
             os.path.join(self.topFolder, 'module-sources')
@@ -16,6 +16,16 @@ class FrontEndDriver:
         self.analyzedSources = []
         self.outputFileName = 'a.out'
         self.verbose = False
+        self.statistics = None
+        self.statisticsJsonFileName = None
+        self.profiler = None
+        self.profileCollapsedStacksFileName = None
+        self.samplingProfiler = None
+        self.samplingProfileFileName = None
+        self.analysisProfiler = None
+        self.useModuleImages = True
+        self.compileImage = False
+        self.parseProcessCount = 1
         self.isDone = False
 
     def printHelp(self):
@@ -25,6 +35,17 @@ class FrontEndDriver:
 -version --version          Prints the version information.
 -v                          Enable the verbosity in the output.
 -o                          Sets the output file name.
+-c                          Compiles the input script into an instruction image written into the output file, instead of evaluating it.
+-I                          Adds a directory where the required modules are searched.
+-parse-processes            Parses the top-level statements of each big input script in chunks with the given number of processes.
+-no-provenance              Keeps only the source positions of the analyzed nodes instead of the nodes they were derived from.
+-no-module-images           Analyzes the required modules from their sources without reading or writing their images.
+-stats --stats              Reports the time, memory peak and element counts of each pipeline stage.
+-stats-json --stats-json    Writes the pipeline statistics into the given JSON file.
+-profile --profile          Profiles the interpreted instructions and blocks, and prints a flat and a call tree report.
+-profile-collapsed          Writes the profile in the collapsed stack format of the flamegraph tools into the given file.
+-sample-profile             Samples the evaluation periodically, and writes the samples per source line into the given file.
+-analysis-profile           Reports the time spent by each expansion pattern and the unification lookups of the builders.
 """
         )
 
@@ -54,66 +75,250 @@ class FrontEndDriver:
 
                     self.outputFileName = argv[i]
                     i += 1
+                elif arg in ['-I']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    self.includeDirectories.append(argv[i])
+                    i += 1
+                elif arg in ['-c']:
+                    self.compileImage = True
+                elif arg in ['-parse-processes']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    self.parseProcessCount = int(argv[i])
+                    i += 1
+                elif arg in ['-no-provenance']:
+                    from pyst.mop import setProvenanceRecordingEnabled
+                    setProvenanceRecordingEnabled(False)
+                elif arg in ['-no-module-images']:
+                    self.useModuleImages = False
+                elif arg in ['-stats', '--stats']:
+                    self.enableStatistics()
+                elif arg in ['-stats-json', '--stats-json']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    self.enableStatistics()
+                    self.statisticsJsonFileName = argv[i]
+                    i += 1
+                elif arg in ['-profile', '--profile']:
+                    self.enableProfiler()
+                elif arg in ['-profile-collapsed', '--profile-collapsed']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    self.enableProfiler()
+                    self.profileCollapsedStacksFileName = argv[i]
+                    i += 1
+                elif arg in ['-analysis-profile', '--analysis-profile']:
+                    from pyst.profiler import ASGAnalysisProfiler
+                    self.analysisProfiler = ASGAnalysisProfiler()
+                elif arg in ['-sample-profile', '--sample-profile']:
+                    if i >= len(argv):
+                        self.printHelp()
+                        return False
+
+                    from pyst.profiler import ASGSamplingProfiler
+                    self.samplingProfiler = ASGSamplingProfiler()
+                    self.samplingProfileFileName = argv[i]
+                    i += 1
             else:
                 self.inputSourceFiles.append(arg)
         return True
 
+    def enableStatistics(self):
+        from pyst.statistics import PipelineStatistics
+        from pyst.interpreter import setInstructionCountingEnabled
+        if self.statistics is None:
+            self.statistics = PipelineStatistics()
+            setInstructionCountingEnabled(True)
+
+    def enableProfiler(self):
+        from pyst.profiler import ASGInterpreterProfiler
+        if self.profiler is None:
+            self.profiler = ASGInterpreterProfiler()
+
+    def measureStage(self, sourceFile, stageName, function, *arguments):
+        if self.statistics is None:
+            return function(*arguments)
+        return self.statistics.statisticsForSourceFile(sourceFile).measureStage(stageName, function, *arguments)
+
+    def setStatisticsCount(self, sourceFile, name, value):
+        if self.statistics is not None:
+            self.statistics.statisticsForSourceFile(sourceFile).setCount(name, value)
+
+    def parseSourceFileInParallel(self, sourceFile):
+        from pyst.parsetree import SourceCode
+        from pyst.parser import parseTopLevelStatementsInParallelWithCounts
+        from pyst.syntax import ASGSyntaxBuilder
+
+        with open(sourceFile, 'rb') as f:
+            sourceCode = SourceCode(os.path.dirname(sourceFile), os.path.basename(sourceFile), 'smalltalk', f.read())
+
+        # Scripts that cannot be split or that have syntax errors are parsed again serially, which also reports the errors.
+        result = self.measureStage(sourceFile, 'parse', parseTopLevelStatementsInParallelWithCounts, sourceCode, self.parseProcessCount, ASGSyntaxBuilder)
+        if result is None:
+            return None
+
+        asgSyntax, tokenCount, builtNodeCount = result
+        if self.statistics is not None:
+            self.setStatisticsCount(sourceFile, 'tokens', tokenCount)
+            self.setStatisticsCount(sourceFile, 'parseNodes', builtNodeCount)
+        return asgSyntax
+
     def parseAndAnalyzeSourceFile(self, sourceFile):
-        from pyst.parser import parseFileNamed
-        from pyst.parsetree import ParseTreeErrorVisitor
-        from pyst.syntax import ASGParseTreeFrontEnd
+        from pyst.scanner import scanFileNamed
+        from pyst.parser import ParserState, parseTopLevelExpressionWithErrors
+        from pyst.syntax import ASGSyntaxBuilder
         from pyst.analysis import expandAndAnalyze
+        from pyst.optimization import optimizeTopLevelScript
         from pyst.visualizations import asgToDotFileNamed, asgWithDerivationsToDotFileNamed
         from pyst.environment import makeScriptAnalysisEnvironment
-        from pyst.mop import asgPredecessorTopoSortDo
+        from pyst.mop import ASGBuilderWithGVN
 
-        parseTree = parseFileNamed(sourceFile)
-        if not ParseTreeErrorVisitor().checkAndPrintErrors(parseTree):
+        asgSyntax = None
+        syntaxErrors = []
+        if self.parseProcessCount > 1:
+            asgSyntax = self.parseSourceFileInParallel(sourceFile)
+        if asgSyntax is None:
+            sourceCode, tokens = self.measureStage(sourceFile, 'scan', scanFileNamed, sourceFile)
+            syntaxBuilder = ASGSyntaxBuilder()
+            asgSyntax, syntaxErrors = self.measureStage(sourceFile, 'parse', lambda: parseTopLevelExpressionWithErrors(ParserState(sourceCode, tokens, syntaxBuilder)))
+            if self.statistics is not None:
+                self.setStatisticsCount(sourceFile, 'tokens', len(tokens))
+                self.setStatisticsCount(sourceFile, 'parseNodes', syntaxBuilder.builtNodeCount)
+        for errorNode in syntaxErrors:
+            sys.stderr.write('%s\n' % errorNode.prettyPrintError())
+        if len(syntaxErrors) != 0:
             return False
 
-        asgSyntax = ASGParseTreeFrontEnd().visitNode(parseTree)
         asgToDotFileNamed(asgSyntax, 'asgSyntax.dot')
 
-        asgAnalyzed, asgAnalysisErrors = expandAndAnalyze(makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), sourceFile), asgSyntax)
+        initialBuiltNodeCount = ASGBuilderWithGVN.builtNodeCount
+        initialUnificationHitCount = ASGBuilderWithGVN.unificationHitCount
+        asgAnalyzed, asgAnalysisErrors = self.measureStage(sourceFile, 'analysis', expandAndAnalyze, makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), sourceFile), asgSyntax)
         asgToDotFileNamed(asgAnalyzed, 'asgAnalyzed.dot')
         asgWithDerivationsToDotFileNamed(asgAnalyzed, 'asgAnalyzedWithDerivation.dot')
         for error in asgAnalysisErrors:
             sys.stderr.write('%s\n' % error.prettyPrintError())
-        self.analyzedSources.append(asgAnalyzed)
+        if len(asgAnalysisErrors) == 0:
+            asgAnalyzed, removedNodeCount = self.measureStage(sourceFile, 'optimization', optimizeTopLevelScript, asgAnalyzed)
+            self.setStatisticsCount(sourceFile, 'removedDeadNodes', removedNodeCount)
+            if self.verbose:
+                sys.stderr.write('Dead code elimination removed %d nodes.\n' % removedNodeCount)
+        self.setStatisticsCount(sourceFile, 'asgNodesBuilt', ASGBuilderWithGVN.builtNodeCount - initialBuiltNodeCount)
+        self.setStatisticsCount(sourceFile, 'gvnUnificationHits', ASGBuilderWithGVN.unificationHitCount - initialUnificationHitCount)
+        self.analyzedSources.append((sourceFile, asgAnalyzed))
         return len(asgAnalysisErrors) == 0
 
     def parseAndAnalyzeSourceFiles(self):
+        from pyst.image import ImageExtension
         success = True
-        for inputSource in self.inputSourceFiles:
-            if not self.parseAndAnalyzeSourceFile(inputSource):
-                success = False
+        if self.analysisProfiler is not None:
+            self.analysisProfiler.start()
+        try:
+            for inputSource in self.inputSourceFiles:
+                # Precompiled images are loaded directly by the evaluation.
+                if inputSource.endswith(ImageExtension):
+                    self.analyzedSources.append((inputSource, None))
+                    continue
+                if not self.parseAndAnalyzeSourceFile(inputSource):
+                    success = False
+        finally:
+            if self.analysisProfiler is not None:
+                self.analysisProfiler.stop()
+                sys.stderr.write(self.analysisProfiler.report())
         return success
 
-    def evaluateAnalyzedSource(self, analyzedSource):
+    def compileAnalyzedSource(self, sourceFile, analyzedSource):
         from pyst.gcm import topLevelScriptGCM
-        gcm = topLevelScriptGCM(analyzedSource)
-        interpretableScript = gcm.asInterpretableInstructions()
+        from pyst.image import loadInstructionsImageFromFileNamed
+
+        if analyzedSource is None:
+            return self.measureStage(sourceFile, 'load', loadInstructionsImageFromFileNamed, sourceFile)
+
+        interpretableScript = self.measureStage(sourceFile, 'gcm', lambda: topLevelScriptGCM(analyzedSource).asInterpretableInstructions())
         #print('Toplevel script')
         #print(interpretableScript.dump())
         interpretableScript.dumpDotToFileNamed('toplevelGCM.dot')
-        scriptResult = interpretableScript.evaluateWithArguments()
+        return interpretableScript
+
+    def evaluateAnalyzedSource(self, sourceFile, analyzedSource):
+        from pyst.interpreter import ASGNodeWithInterpretableInstructions, ASGNodeCountingInterpreterActivationContext
+        from pyst.image import writeInstructionsImageToFileNamed
+
+        initialScheduledInstructionCount = ASGNodeWithInterpretableInstructions.scheduledInstructionCount
+        interpretableScript = self.compileAnalyzedSource(sourceFile, analyzedSource)
+        analyzedSource = None
+        if self.compileImage:
+            self.measureStage(sourceFile, 'image', writeInstructionsImageToFileNamed, interpretableScript, self.outputFileName)
+            return None
+
+        initialExecutedInstructionCount = ASGNodeCountingInterpreterActivationContext.executedInstructionCount
+        if self.profiler is not None:
+            self.profiler.start()
+        if self.samplingProfiler is not None:
+            self.samplingProfiler.start()
+        try:
+            scriptResult = self.measureStage(sourceFile, 'evaluation', interpretableScript.evaluateWithArguments)
+        finally:
+            if self.samplingProfiler is not None:
+                self.samplingProfiler.stop()
+            if self.profiler is not None:
+                self.profiler.stop()
+        self.setStatisticsCount(sourceFile, 'instructionsScheduled', ASGNodeWithInterpretableInstructions.scheduledInstructionCount - initialScheduledInstructionCount)
+        self.setStatisticsCount(sourceFile, 'instructionsExecuted', ASGNodeCountingInterpreterActivationContext.executedInstructionCount - initialExecutedInstructionCount)
         return scriptResult
 
     def evaluateAnalyzedSources(self):
-        for analyzedSource in self.analyzedSources:
-            evalResult = self.evaluateAnalyzedSource(analyzedSource)
+        # The analyzed graph of each source is released once it is compiled, before the evaluation.
+        while len(self.analyzedSources) != 0:
+            evalResult = self.evaluateAnalyzedSource(*self.analyzedSources.pop(0))
             if self.verbose and evalResult is not None:
                 print(evalResult)
         return True
     
+    def configureModuleLoader(self):
+        from pyst.modules import ASGModuleLoader
+        moduleLoader = ASGModuleLoader.uniqueInstance()
+        moduleLoader.includeDirectories = self.includeDirectories
+        moduleLoader.useModuleImages = self.useModuleImages
+
     def runPipeline(self):
-        if not self.parseAndAnalyzeSourceFiles():
-            return False
+        self.configureModuleLoader()
+        if self.statistics is not None:
+            self.statistics.start()
 
-        if not self.evaluateAnalyzedSources():
-            return False
-        
-        return True
+        # The reports are also written when a script fails or is interrupted, with the samples gathered so far.
+        try:
+            return self.parseAndAnalyzeSourceFiles() and self.evaluateAnalyzedSources()
+        finally:
+            if self.statistics is not None:
+                self.statistics.stop()
+                self.reportStatistics()
+            if self.profiler is not None:
+                self.reportProfile()
+            if self.samplingProfiler is not None:
+                self.samplingProfiler.writeReportToFileNamed(self.samplingProfileFileName)
+
+    def reportProfile(self):
+        sys.stderr.write(self.profiler.flatReport())
+        sys.stderr.write(self.profiler.treeReport())
+        if self.profileCollapsedStacksFileName is not None:
+            self.profiler.writeCollapsedStacksToFileNamed(self.profileCollapsedStacksFileName)
+
+    def reportStatistics(self):
+        sys.stderr.write(self.statistics.prettyPrint())
+        if self.statisticsJsonFileName is not None:
+            with open(self.statisticsJsonFileName, 'w') as f:
+                json.dump(self.statistics.asJson(), f, indent = 2)
+                f.write('\n')
     
     def main(self, argv):
         if not self.parseCommandLineArguments(argv):
@@ -121,6 +326,9 @@ class FrontEndDriver:
         if len(self.inputSourceFiles) == 0:
             self.printHelp()
             return True
+        if self.compileImage and len(self.inputSourceFiles) != 1:
+            sys.stderr.write('A single input script is required for compiling an instruction image.\n')
+            return False
         return self.runPipeline()    
 
 if __name__ == "__main__":
@@ -6,9 +6,11 @@ from .environment import *
 class ASGBetaSubstitutionContext:
     def __init__(self) -> None:
         self.substitutionTable = {}
+        self.substitutionMask = 0
 
     def setSubstitutionForNode(self, oldNode: ASGNode, replacedNode: ASGNode):
         self.substitutionTable[oldNode] = replacedNode
+        self.substitutionMask |= oldNode.betaReplaceableBit()
 
     def getSubstitutionFor(self, node):
         return self.substitutionTable.get(node, node)
@@ -19,11 +21,9 @@ class ASGBetaSubstitutionContext:
     def includesNode(self, node) -> bool:
         return node in self.substitutionTable
     
-    def includesAnyOf(self, listOfNodes) -> bool:
-        for node in listOfNodes:
-            if self.includesNode(node):
-                return True
-        return False
+    def mayIncludeAnyOfMask(self, dependencyMask: int) -> bool:
+        # Nodes of different functions may share a bit, so a match still has to be confirmed with the substitution table.
+        return (self.substitutionMask & dependencyMask) != 0
 
 class ASGReductionAlgorithm(ASGDynamicProgrammingReductionAlgorithm):
     @asgPatternMatchingOnNodeKind(ASGApplicationNode, when = lambda n: n.isLiteralAlwaysReducedPrimitiveApplication() or n.isLiteralPureCompileTimePrimitiveApplication())
@@ -43,8 +43,7 @@ class ASGBetaSubstitutionAlgorithm(ASGDynamicProgrammingAlgorithm):
         if self.substitutionContext.includesNode(node):
             return self.substitutionContext.getSubstitutionFor(node)
         
-        betaReplaceableDependencies = node.betaReplaceableDependencies()
-        if not self.substitutionContext.includesAnyOf(betaReplaceableDependencies):
+        if not self.substitutionContext.mayIncludeAnyOfMask(node.betaReplaceableDependencyMask()):
             return node
 
         return self(node)
@@ -55,6 +54,11 @@ class ASGBetaSubstitutionAlgorithm(ASGDynamicProgrammingAlgorithm):
             return self.expandGenericNodeRecursively(node)
         else:
             return self.substitutionContext.getSubstitutionFor(node)
+
+    @asgPatternMatchingOnNodeKind(ASGBlockDefinitionNode)
+    def expandBlockDefinitionNode(self, node: ASGBlockDefinitionNode) -> ASGAnalyzedNode:
+        # Block definitions are closed. They only see the outer scope through the captures of their instances.
+        return node
         
     def expandParameter(self, parameter):
         if isinstance(parameter, ASGNode):
@@ -82,13 +86,77 @@ class ASGAnalysisErrorAcumulator:
     def addError(self, error: ASGErrorNode):
         self.errorList.append(error)
 
+class ASGLexicalAddressScope:
+    def __init__(self, argumentIndices: dict) -> None:
+        self.argumentIndices = argumentIndices
+        self.capturedAddresses = {}
+
+class ASGLexicalAddressResolutionAlgorithm(ASGDynamicProgrammingAlgorithm):
+    """
+    Resolves the identifier references of a syntax graph into the (depth, index) address of a block argument, where the depth is the number of enclosing blocks that are crossed.
+    The identifiers that are not bound by a block are looked up by name in the environment where the analysis starts.
+    """
+    def __init__(self, environment: ASGEnvironment) -> None:
+        super().__init__()
+        self.environment = environment
+        self.identifierAddresses = {}
+        self.freeIdentifiers = set()
+        self.blockCaptures = {}
+        self.scopes: list[ASGLexicalAddressScope] = []
+
+    def capturesOfBlock(self, node: ASGSyntaxBlockNode) -> list[tuple[int, int]]:
+        return self.blockCaptures.get(node, ())
+
+    @asgPatternMatchingOnNodeKind(ASGSyntaxIdentifierReferenceNode)
+    def resolveIdentifierReferenceNode(self, node: ASGSyntaxIdentifierReferenceNode):
+        scopeCount = len(self.scopes)
+        for depth in range(scopeCount):
+            index = self.scopes[scopeCount - depth - 1].argumentIndices.get(node.value, None)
+            if index is not None:
+                self.identifierAddresses[node] = (depth, index)
+                for crossedDepth in range(depth):
+                    self.scopes[scopeCount - crossedDepth - 1].capturedAddresses[(depth - crossedDepth, index)] = True
+                return
+
+        self.freeIdentifiers.add(node)
+
+    @asgPatternMatchingOnNodeKind(ASGSyntaxBlockNode)
+    def resolveBlockNode(self, node: ASGSyntaxBlockNode):
+        argumentIndices = {}
+        for i in range(len(node.arguments)):
+            argumentIndices[node.arguments[i].name] = i
+
+        scope = ASGLexicalAddressScope(argumentIndices)
+        self.scopes.append(scope)
+        try:
+            if node.body is not None:
+                self(node.body)
+        finally:
+            self.scopes.pop()
+        self.blockCaptures[node] = list(scope.capturedAddresses.keys())
+
+    @asgPatternMatchingOnNodeKind(ASGSyntaxLexicalSequenceNode)
+    def resolveLexicalSequenceNode(self, node: ASGSyntaxLexicalSequenceNode):
+        # Local variables are rejected by the analysis, so their references are left unresolved.
+        if len(node.locals) == 0:
+            self.resolveDependenciesOf(node)
+
+    @asgPatternMatchingOnNodeKind(ASGNode)
+    def resolveGenericNode(self, node: ASGNode):
+        self.resolveDependenciesOf(node)
+
+    def resolveDependenciesOf(self, node: ASGNode):
+        for dependency in node.dataDependencies():
+            self(dependency)
+
 class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
-    def __init__(self, environment: ASGEnvironment, builder: ASGBuilderWithGVNAndEnvironment = None, reductionAlgorithm: ASGReductionAlgorithm = None, errorAccumulator = None) -> None:
+    def __init__(self, environment: ASGEnvironment, builder: ASGBuilderWithGVNAndEnvironment = None, reductionAlgorithm: ASGReductionAlgorithm = None, errorAccumulator = None, lexicalAddresses: ASGLexicalAddressResolutionAlgorithm = None) -> None:
         super().__init__()
         self.environment = environment
         self.builder = builder
         self.reductionAlgorithm = reductionAlgorithm
         self.errorAccumulator = errorAccumulator
+        self.lexicalAddresses = lexicalAddresses
         if self.builder is None:
             self.builder = ASGBuilderWithGVNAndEnvironment(None, self.environment.getTopLevelTargetEnvironment())
         if self.reductionAlgorithm is None:
@@ -97,7 +165,7 @@ class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
             self.errorAccumulator = ASGAnalysisErrorAcumulator()
 
     def withDivergingEnvironment(self, newEnvironment: ASGEnvironment):
-        return ASGExpansionAndAnalysisAlgorithm(newEnvironment, ASGBuilderWithGVNAndEnvironment(self.builder, newEnvironment.getTopLevelTargetEnvironment()), self.reductionAlgorithm, self.errorAccumulator)
+        return ASGExpansionAndAnalysisAlgorithm(newEnvironment, ASGBuilderWithGVNAndEnvironment(self.builder, newEnvironment.getTopLevelTargetEnvironment()), self.reductionAlgorithm, self.errorAccumulator, self.lexicalAddresses)
 
     def withFunctionalAnalysisEnvironment(self, newEnvironment: ASGFunctionalAnalysisEnvironment):
         return self.withDivergingEnvironment(newEnvironment)
@@ -202,12 +270,22 @@ class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
 
     @asgPatternMatchingOnNodeKind(ASGSyntaxIdentifierReferenceNode)
     def expandSyntaxIdentifierReferenceNode(self, node: ASGSyntaxIdentifierReferenceNode) -> ASGAnalyzedNode:
-        binding = self.environment.lookSymbolBindingRecursively(node.value)
+        binding = self.lookIdentifierBinding(node)
         if binding is None:
             return self.makeErrorAtNode('Failed to finding binding for symbol %s.' % node.value, node)
         else:
             return self(binding)
 
+    def lookIdentifierBinding(self, node: ASGSyntaxIdentifierReferenceNode) -> ASGNode:
+        # Identifiers synthesized during the expansion are not resolved ahead.
+        if self.lexicalAddresses is not None:
+            address = self.lexicalAddresses.identifierAddresses.get(node, None)
+            if address is not None:
+                return self.environment.getFunctionalAnalysisEnvironment().lookLexicalAddress(*address)
+            if node in self.lexicalAddresses.freeIdentifiers:
+                return self.lexicalAddresses.environment.lookSymbolBindingRecursively(node.value)
+        return self.environment.lookSymbolBindingRecursively(node.value)
+
     @asgPatternMatchingOnNodeKind(ASGSyntaxMessageCascadeNode)
     def expandSyntaxBinaryExpressionSequenceNode(self, node: ASGSyntaxMessageCascadeNode) -> ASGAnalyzedNode:
         receiver = None
@@ -295,6 +373,9 @@ class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
             if analyzedArgument.isKindOf(ASGArgumentNode):
                 functionalEnvironment.addArgumentBinding(analyzedArgument)
                 analyzedArguments.append(analyzedArgument)
+        if self.lexicalAddresses is not None:
+            for depth, index in self.lexicalAddresses.capturesOfBlock(node):
+                functionalEnvironment.lookLexicalAddress(depth, index)
         functionalAnalyzer.builder.currentPredecessor = None
         entryPoint = functionalAnalyzer.builder.forSyntaxExpansionBuildAndSequence(self, node, ASGSequenceEntryNode)
 
@@ -304,7 +385,7 @@ class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
             body = functionalAnalyzer(node.body)
         bodyReturn = functionalAnalyzer.builder.forSyntaxExpansionBuildAndSequence(self, node, ASGSequenceReturnNode, body, predecessor = functionalAnalyzer.builder.currentPredecessor)
         
-        blockDefinition = self.builder.forSyntaxExpansionBuildAndSequence(self, node, ASGBlockDefinitionNode, functionalEnvironment.captureBindings, analyzedArguments, entryPoint, exitPoint = bodyReturn)
+        blockDefinition = self.builder.forSyntaxExpansionBuildAndSequence(self, node, ASGBlockDefinitionNode, analyzedArguments, functionalEnvironment.captureBindings, entryPoint, exitPoint = bodyReturn)
         return self.builder.forSyntaxExpansionBuildAndSequence(self, node, ASGBlockInstanceNode,functionalEnvironment.capturedValues, blockDefinition)
 
     def analyzeDivergentBranchExpression(self, node: ASGNode) -> tuple[ASGSequenceEntryNode, ASGNode]:
@@ -333,11 +414,19 @@ class ASGExpansionAndAnalysisAlgorithm(ASGDynamicProgrammingAlgorithm):
                 return self.fromNodeContinueExpanding(node, elementsToExpand[i])
         assert False, "Should not reach here."
 
+    @asgPatternMatchingOnNodeKind(ASGSyntaxLexicalSequenceNode)
+    def expandSyntaxLexicalSequenceNode(self, node: ASGSyntaxLexicalSequenceNode) -> ASGAnalyzedNode:
+        if len(node.locals) != 0:
+            return self.makeErrorAtNode('Local variables are not yet supported.', node)
+        return self.fromNodeContinueExpanding(node, ASGSyntaxSequenceNode(ASGNodeSyntaxExpansionDerivation(self, node), node.elements))
+
     @asgPatternMatchingOnNodeKind(ASGAnalyzedNode)
     def expandSyntaxTypecheckedNode(self, node: ASGAnalyzedNode) -> ASGAnalyzedNode:
         return node
 
 def expandAndAnalyze(environment: ASGEnvironment, node: ASGNode):
-    expander = ASGExpansionAndAnalysisAlgorithm(environment)
+    lexicalAddresses = ASGLexicalAddressResolutionAlgorithm(environment)
+    lexicalAddresses(node)
+    expander = ASGExpansionAndAnalysisAlgorithm(environment, lexicalAddresses = lexicalAddresses)
     result = expander.expandTopLevelScript(node)
     return result, expander.errorAccumulator.errorList
@@ -0,0 +1,62 @@
+import unittest
+from .parser import parseSourceString
+from .syntax import ASGParseTreeFrontEnd
+from .analysis import *
+from .environment import makeScriptAnalysisEnvironment
+from .mop import setProvenanceRecordingEnabled
+from .testing import ASGCompilationTestMixin
+
+class TestLexicalAddressResolution(ASGCompilationTestMixin, unittest.TestCase):
+    def resolveSourceString(self, string: str) -> tuple[ASGNode, ASGLexicalAddressResolutionAlgorithm]:
+        asgSyntax = ASGParseTreeFrontEnd().visitNode(parseSourceString(string))
+        lexicalAddresses = ASGLexicalAddressResolutionAlgorithm(makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), 'test.st'))
+        lexicalAddresses(asgSyntax)
+        return asgSyntax, lexicalAddresses
+
+    def identifierAddressesOf(self, lexicalAddresses: ASGLexicalAddressResolutionAlgorithm) -> dict:
+        return dict(map(lambda pair: (pair[0].value, pair[1]), lexicalAddresses.identifierAddresses.items()))
+
+    def testNestedBlockAddresses(self):
+        asgSyntax, lexicalAddresses = self.resolveSourceString('[:x | [:y | [:z | {x. y. z. Stdio}]]]')
+        self.assertEqual(self.identifierAddressesOf(lexicalAddresses), {'x': (2, 0), 'y': (1, 0), 'z': (0, 0)})
+        self.assertEqual(list(map(lambda identifier: identifier.value, lexicalAddresses.freeIdentifiers)), ['Stdio'])
+        self.assertEqual(sorted(map(len, lexicalAddresses.blockCaptures.values())), [0, 1, 2])
+
+    def testShadowedArgument(self):
+        asgSyntax, lexicalAddresses = self.resolveSourceString('[:x :y | [:x | {x. y}]]')
+        self.assertEqual(self.identifierAddressesOf(lexicalAddresses), {'x': (0, 0), 'y': (1, 1)})
+
+    def testCapturesAreAnalyzedFromAddresses(self):
+        asgSyntax, lexicalAddresses = self.resolveSourceString('(([:x :y | [:z | {y. x. z}]] value: 1 value: 2) value: 3)')
+        asgAnalyzed, asgAnalysisErrors = expandAndAnalyze(lexicalAddresses.environment, asgSyntax)
+        self.assertEqual(len(asgAnalysisErrors), 0)
+        self.assertEqual(list(self.compileAnalyzedScript(asgAnalyzed).evaluateWithArguments()), [2, 1, 3])
+
+class TestProvenanceRecording(ASGCompilationTestMixin, unittest.TestCase):
+    def tearDown(self):
+        setProvenanceRecordingEnabled(True)
+
+    def testErrorsKeepTheirSourcePositions(self):
+        asgAnalyzed, asgAnalysisErrors = self.analyzeSourceStringWithErrors('{1. undefinedThing value: 2}')
+        setProvenanceRecordingEnabled(False)
+        asgReleaseAnalyzed, asgReleaseAnalysisErrors = self.analyzeSourceStringWithErrors('{1. undefinedThing value: 2}')
+        self.assertEqual(len(asgAnalysisErrors), 1)
+        self.assertEqual(list(map(lambda error: error.prettyPrintError(), asgReleaseAnalysisErrors)), list(map(lambda error: error.prettyPrintError(), asgAnalysisErrors)))
+
+    def testDerivationsDoNotReferenceTheSyntax(self):
+        setProvenanceRecordingEnabled(False)
+        asgAnalyzed, asgAnalysisErrors = self.analyzeSourceStringWithErrors('([:x | {x. 1}] value: 2) value: 3')
+        self.assertEqual(len(asgAnalysisErrors), 0)
+        pendingNodes = [asgAnalyzed]
+        visitedNodes = set()
+        while len(pendingNodes) != 0:
+            node = pendingNodes.pop()
+            if node in visitedNodes:
+                continue
+            visitedNodes.add(node)
+            self.assertEqual(list(node.allDerivationNodes()), [])
+            pendingNodes += node.allDependencies()
+        self.assertGreater(len(visitedNodes), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,9 +20,17 @@ class ASGSequenceEntryNode(ASGSequencingNode):
     
     def isSequenceEntryNode(self) -> bool:
         return True
+
+    def isBetaReplaceableNode(self) -> bool:
+        # The entry point is replaced by the call site predecessor when inlining.
+        return True
+
+    def betaReplaceableBit(self) -> int:
+        return 1
     
-    def interpretInContext(self, context, parameterList):
-        pass
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGSequenceEntryInstruction
+        return ASGSequenceEntryInstruction.getSingleton()
 
 class ASGSequenceDivergenceNode(ASGSequencingNode):
     predecessor = ASGSequencingPredecessorAttribute()
@@ -81,8 +89,9 @@ class ASGSequenceReturnNode(ASGSequencingNode):
     def getRegionOfUsedValue(self, usedValue):
         return self.predecessor
     
-    def interpretInContext(self, context, parameters):
-        context.returnValue(context[parameters[0]])
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGSequenceReturnInstruction
+        return ASGSequenceReturnInstruction.getSingleton()
 
 class ASGAnalyzedDataExpressionNode(ASGAnalyzedNode):
     def isPureDataNode(self) -> bool:
@@ -206,7 +215,7 @@ class ASGBetaReplaceableNode(ASGAnalyzedDataExpressionNode):
 
 class ASGArgumentNode(ASGBetaReplaceableNode):
     index = ASGNodeDataAttribute(int, default = 0)
-    name = ASGNodeDataAttribute(str, default = None, notCompared = True)
+    name = ASGNodeDataAttribute(str, default = None)
 
     def isArgumentNode(self) -> bool:
         return True
@@ -214,6 +223,10 @@ class ASGArgumentNode(ASGBetaReplaceableNode):
     def isActivationContextParameterDataNode(self):
         return True
 
+    def betaReplaceableBit(self) -> int:
+        # The beta replaceable nodes are numbered per function: the entry point, and then the arguments and captures interleaved by index.
+        return 1 << (1 + 2*self.index)
+
 class ASGCapturedValueNode(ASGBetaReplaceableNode):
     index = ASGNodeDataAttribute(int)
 
@@ -223,6 +236,9 @@ class ASGCapturedValueNode(ASGBetaReplaceableNode):
     def isActivationContextParameterDataNode(self):
         return True
 
+    def betaReplaceableBit(self) -> int:
+        return 1 << (2 + 2*self.index)
+
 class ASGArrayNode(ASGAnalyzedDataExpressionNode):
     elements = ASGNodeDataInputPorts()
 
@@ -251,10 +267,26 @@ class ASGBlockDefinitionNode(ASGAnalyzedDataExpressionNode):
         super().__init__(*positionalArguments, **kwArguments)
         self.hasEvaluatedConstantValue = False
         self.constantEvaluationResult = None
+        self.bodySize_ = None
 
     def scheduledDataDependencies(self):
         return ()
 
+    def bodySize(self) -> int:
+        if self.bodySize_ is None:
+            visited = set()
+            pendingNodes = [self.exitPoint]
+            while len(pendingNodes) != 0:
+                node = pendingNodes.pop()
+                if node in visited:
+                    continue
+
+                visited.add(node)
+                if not node.isBlockDefinitionNode():
+                    pendingNodes += node.allDependencies()
+            self.bodySize_ = len(visited)
+        return self.bodySize_
+
     def isConstantDataNode(self) -> bool:
         return True
 
@@ -264,9 +296,7 @@ class ASGBlockDefinitionNode(ASGAnalyzedDataExpressionNode):
     def evaluateAsConstantValue(self):
         if not self.hasEvaluatedConstantValue:
             from .gcm import blockGCM
-            self.constantEvaluationResult = blockGCM(self).asInterpretableInstructions()
-            #print('Block instructions')
-            #print(self.constantEvaluationResult.dump())
+            self.constantEvaluationResult = blockGCM(self).asLazyInterpretableInstructions()
             self.hasEvaluatedConstantValue = True
         return self.constantEvaluationResult
 
@@ -290,17 +320,15 @@ class ASGBlockInstanceNode(ASGAnalyzedDataExpressionNode):
 
     def evaluateAsConstantValue(self):
         if not self.hasEvaluatedConstantValue:
-            captureConstants = list(map(lambda c: c.evaluateAsConstantValue(), self.captures))
+            captureConstants = tuple(map(lambda c: c.evaluateAsConstantValue(), self.captures))
             definitionValue = self.definition.evaluateAsConstantValue()
-            self.constantEvaluationResult = definitionValue.instantiateClosureWithCaptures(self.captures)
+            self.constantEvaluationResult = definitionValue.instantiateClosureWithCaptures(captureConstants)
             self.hasEvaluatedConstantValue = True
         return self.constantEvaluationResult
 
-    def interpretInContext(self, context, parameters):
-        capturesAndDefinition = list(map(lambda x: context[x], parameters))
-        captures = capturesAndDefinition[:-1]
-        definition = capturesAndDefinition[-1]
-        return definition.instantiateClosureWithCaptures(captures)
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGBlockInstanceInstruction
+        return ASGBlockInstanceInstruction.getSingleton()
 
 class ASGApplicationNode(ASGAnalyzedDataExpressionNode):
     functional = ASGNodeDataInputPort()
@@ -316,10 +344,18 @@ class ASGFxApplicationNode(ASGSequencingAndDataNode):
     functional = ASGNodeDataInputPort()
     arguments = ASGNodeDataInputPorts()
     
-    def interpretInContext(self, context, parameters):
-        functional = context[parameters[0]]
-        arguments = list(map(lambda x: context[x], parameters[1:]))
-        return functional(*arguments)
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGApplicationInstruction
+        return ASGApplicationInstruction.getSingleton()
+
+class ASGFxBlockApplicationNode(ASGSequencingAndDataNode):
+    definition = ASGNodeDataInputPort()
+    captures = ASGNodeDataInputPorts()
+    arguments = ASGNodeDataInputPorts()
+
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGBlockApplicationInstruction
+        return ASGBlockApplicationInstruction(len(self.captures))
 
 class ASGMessageSendNode(ASGAnalyzedDataExpressionNode):
     receiver = ASGNodeDataInputPort()
@@ -331,18 +367,16 @@ class ASGFxMessageSendNode(ASGSequencingAndDataNode):
     selector = ASGNodeDataInputPort()
     arguments = ASGNodeDataInputPorts()
 
-    def interpretInContext(self, context, parameters):
-        from .environment import performInWithArguments
-        receiver = context[parameters[0]]
-        selector = context[parameters[1]]
-        arguments = list(map(lambda x: context[x], parameters[2:]))
-        return performInWithArguments(receiver, selector, arguments)
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGMessageSendInstruction
+        return ASGMessageSendInstruction.getSingleton()
 
 class ASGMutableArrayNode(ASGAnalyzedStatefullExpressionNode):
     elements = ASGNodeDataInputPorts()
 
-    def interpretInContext(self, context, parameters):
-        return list(map(lambda x: context[x], parameters))
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGMutableArrayInstruction
+        return ASGMutableArrayInstruction.getSingleton()
 
 class ASGTopLevelScriptNode(ASGAnalyzedDataExpressionNode):
     entryPoint = ASGSequencingDestinationPort()
@@ -1,6 +1,7 @@
 from .mop import *
 from .syntax import *
 from .asg import *
+from .modules import requireModuleNamed
 import sys
 
 class PystMetaclass(type):
@@ -130,6 +131,95 @@ class FileStream(PystObject):
 class Stdio(PystObject):
     stdout = FileStream(sys.stdout)
 
+SymbolTableHashBits = 5
+SymbolTableHashMask = (1 << SymbolTableHashBits) - 1
+SymbolTableHashSize = 64
+
+def symbolTableHashOf(symbol: str) -> int:
+    return hash(symbol) & ((1 << SymbolTableHashSize) - 1)
+
+class ASGPersistentSymbolTableNode:
+    """
+    A node of the hash array mapped trie. Its entries are either (symbol, binding) pairs or child nodes, in the order of the bits that are set in the bitmap.
+    """
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap: int, entries: tuple) -> None:
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def lookup(self, symbol: str, symbolHash: int, shift: int):
+        bit = 1 << ((symbolHash >> shift) & SymbolTableHashMask)
+        if (self.bitmap & bit) == 0:
+            return None
+
+        entry = self.entries[(self.bitmap & (bit - 1)).bit_count()]
+        if isinstance(entry, tuple):
+            return entry[1] if entry[0] == symbol else None
+        return entry.lookup(symbol, symbolHash, shift + SymbolTableHashBits)
+
+    def withBinding(self, symbol: str, symbolHash: int, binding, shift: int):
+        bit = 1 << ((symbolHash >> shift) & SymbolTableHashMask)
+        index = (self.bitmap & (bit - 1)).bit_count()
+        if (self.bitmap & bit) == 0:
+            return ASGPersistentSymbolTableNode(self.bitmap | bit, self.entries[:index] + ((symbol, binding),) + self.entries[index:])
+
+        entry = self.entries[index]
+        if not isinstance(entry, tuple):
+            newEntry = entry.withBinding(symbol, symbolHash, binding, shift + SymbolTableHashBits)
+        elif entry[0] == symbol:
+            newEntry = (symbol, binding)
+        else:
+            newEntry = makeSymbolTableNodeWithPairs(entry, symbolTableHashOf(entry[0]), (symbol, binding), symbolHash, shift + SymbolTableHashBits)
+        return ASGPersistentSymbolTableNode(self.bitmap, self.entries[:index] + (newEntry,) + self.entries[index + 1:])
+
+class ASGPersistentSymbolTableCollisionNode:
+    """
+    Holds the (symbol, binding) pairs whose whole hashes are equal.
+    """
+    __slots__ = ('pairs',)
+
+    def __init__(self, pairs: tuple) -> None:
+        self.pairs = pairs
+
+    def lookup(self, symbol: str, symbolHash: int, shift: int):
+        for pairSymbol, binding in self.pairs:
+            if pairSymbol == symbol:
+                return binding
+        return None
+
+    def withBinding(self, symbol: str, symbolHash: int, binding, shift: int):
+        return ASGPersistentSymbolTableCollisionNode(tuple(pair for pair in self.pairs if pair[0] != symbol) + ((symbol, binding),))
+
+def makeSymbolTableNodeWithPairs(firstPair: tuple, firstHash: int, secondPair: tuple, secondHash: int, shift: int):
+    if shift >= SymbolTableHashSize:
+        return ASGPersistentSymbolTableCollisionNode((firstPair, secondPair))
+
+    firstIndex = (firstHash >> shift) & SymbolTableHashMask
+    secondIndex = (secondHash >> shift) & SymbolTableHashMask
+    if firstIndex == secondIndex:
+        return ASGPersistentSymbolTableNode(1 << firstIndex, (makeSymbolTableNodeWithPairs(firstPair, firstHash, secondPair, secondHash, shift + SymbolTableHashBits),))
+    if firstIndex < secondIndex:
+        return ASGPersistentSymbolTableNode((1 << firstIndex) | (1 << secondIndex), (firstPair, secondPair))
+    return ASGPersistentSymbolTableNode((1 << firstIndex) | (1 << secondIndex), (secondPair, firstPair))
+
+class ASGPersistentSymbolTable:
+    """
+    An immutable map from symbols into their last binding, stored as a hash array mapped trie.
+    Adding a binding only copies the nodes along the path of its symbol, so it takes O(log n) time, also when branching from an older version.
+    """
+    __slots__ = ('root',)
+    EmptyRoot = ASGPersistentSymbolTableNode(0, ())
+
+    def __init__(self, root: ASGPersistentSymbolTableNode = None) -> None:
+        self.root = root if root is not None else self.EmptyRoot
+
+    def withBinding(self, symbol: str, binding):
+        return ASGPersistentSymbolTable(self.root.withBinding(symbol, symbolTableHashOf(symbol), binding, 0))
+
+    def lookup(self, symbol: str):
+        return self.root.lookup(symbol, symbolTableHashOf(symbol), 0)
+
 class ASGEnvironment(ABC):
     @abstractmethod
     def getTopLevelTargetEnvironment(self):
@@ -144,6 +234,9 @@ class ASGEnvironment(ABC):
 
     def isScriptEnvironment(self):
         return False
+
+    def getFunctionalAnalysisEnvironment(self):
+        return None
     
     def childWithSymbolBinding(self, symbol: str, binding: ASGNode):
         return ASGChildEnvironmentWithBindings(self).childWithSymbolBinding(symbol, binding)
@@ -157,7 +250,7 @@ class ASGTopLevelTargetEnvironment(ASGEnvironment):
 
     def __init__(self) -> None:
         super().__init__()
-        self.symbolTable = {}
+        self.symbolTable = ASGPersistentSymbolTable()
         topLevelDerivation = ASGNodeNoDerivation.getSingleton()
         self.topLevelUnificationTable = {}
         self.addSymbolValue('nil', ASGLiteralNilNode(topLevelDerivation))
@@ -165,6 +258,7 @@ class ASGTopLevelTargetEnvironment(ASGEnvironment):
         self.addSymbolValue('true', ASGLiteralTrueNode(topLevelDerivation))
 
         self.addSymbolValue('Stdio', ASGLiteralObjectNode(topLevelDerivation, Stdio))
+        self.addSymbolValue('require:', ASGLiteralObjectNode(topLevelDerivation, requireModuleNamed))
 
         self.addPrimitiveFunctions()
         self.gcmCache = {}
@@ -180,27 +274,22 @@ class ASGTopLevelTargetEnvironment(ASGEnvironment):
 
     def addSymbolValue(self, name: str, value: ASGNode):
         if name is not None:
-            self.symbolTable[name] = [value] + self.symbolTable.get(name, [])
+            self.symbolTable = self.symbolTable.withBinding(name, value)
 
     def lookLastBindingOf(self, name: str):
-        if not name in self.symbolTable:
-            return None
-        return self.symbolTable[name][0]
+        return self.symbolTable.lookup(name)
     
     def lookValidLastBindingOf(self, name: str):
-        if not name in self.symbolTable:
+        binding = self.symbolTable.lookup(name)
+        if binding is None:
             raise Exception('Missing required binding for %s.' % name)
-        return self.symbolTable[name][0]
+        return binding
 
     def getTopLevelTargetEnvironment(self):
         return self
     
     def lookSymbolBindingRecursively(self, symbol: str):
-        result = self.symbolTable.get(symbol, None)
-        if result is not None:
-            return result[0]
-        else:
-            return None
+        return self.symbolTable.lookup(symbol)
 
     @classmethod
     def uniqueInstance(cls):
@@ -218,34 +307,35 @@ class ASGChildEnvironment(ASGEnvironment):
         self.parent = parent
         self.sourcePosition = sourcePosition
         self.topLevelTargetEnvironment = parent.getTopLevelTargetEnvironment()
+        self.functionalAnalysisEnvironment = parent.getFunctionalAnalysisEnvironment()
     
     def getTopLevelTargetEnvironment(self):
         return self.topLevelTargetEnvironment
 
+    def getFunctionalAnalysisEnvironment(self):
+        return self.functionalAnalysisEnvironment
+
     def lookSymbolBindingRecursively(self, symbol: str):
         return self.parent.lookSymbolBindingRecursively(symbol)
 
 class ASGChildEnvironmentWithBindings(ASGChildEnvironment):
     def __init__(self, parent: ASGEnvironment, sourcePosition: SourcePosition = None) -> None:
         super().__init__(parent, sourcePosition)
-        self.symbolTable = {}
-
-    def postCopy(self):
-        self.symbolTable = dict(self.symbolTable)
+        self.symbolTable = ASGPersistentSymbolTable()
 
     def addSymbolBinding(self, symbol: str, binding: ASGNode):
         if symbol is not None:
-            self.symbolTable[symbol] = [binding] + self.symbolTable.get(symbol, [])
+            self.symbolTable = self.symbolTable.withBinding(symbol, binding)
 
     def childWithSymbolBinding(self, symbol: str, binding: ASGNode):
         child = copy.copy(self)
-        child.postCopy()
         child.addSymbolBinding(symbol, binding)
         return child
 
     def lookSymbolBindingRecursively(self, symbol: str):
-        if symbol in self.symbolTable:
-            return self.symbolTable[symbol][0]
+        binding = self.symbolTable.lookup(symbol)
+        if binding is not None:
+            return binding
         return self.parent.lookSymbolBindingRecursively(symbol)
 
 class ASGLexicalEnvironment(ASGChildEnvironment):
@@ -255,17 +345,41 @@ class ASGLexicalEnvironment(ASGChildEnvironment):
 class ASGFunctionalAnalysisEnvironment(ASGLexicalEnvironment):
     def __init__(self, parent: ASGEnvironment, sourcePosition: SourcePosition = None) -> None:
         super().__init__(parent, sourcePosition)
+        self.parentFunctionalAnalysisEnvironment = self.functionalAnalysisEnvironment
+        self.functionalAnalysisEnvironment = self
         self.arguments = []
+        self.argumentIndexTable = {}
         self.capturedValues = []
         self.captureBindings = []
-        self.symbolTable = {}
+        self.symbolTable = ASGPersistentSymbolTable()
         self.capturedSymbolTable = {}
         self.capturedValueTable = {}
+        self.capturedAddressTable = {}
 
     def addArgumentBinding(self, argument: ASGArgumentNode):
         self.arguments.append(argument)
+        self.argumentIndexTable[argument.index] = argument
         if argument.name is not None:
-            self.symbolTable[argument.name] = [argument] + self.symbolTable.get(argument.name, [])
+            self.symbolTable = self.symbolTable.withBinding(argument.name, argument)
+
+    def lookLexicalAddress(self, depth: int, index: int):
+        if depth == 0:
+            return self.argumentIndexTable.get(index, None)
+
+        address = (depth, index)
+        if address in self.capturedAddressTable:
+            return self.capturedAddressTable[address]
+        
+        if self.parentFunctionalAnalysisEnvironment is None:
+            return None
+        parentBinding = self.parentFunctionalAnalysisEnvironment.lookLexicalAddress(depth - 1, index)
+        if parentBinding is None:
+            return None
+
+        if parentBinding.isBetaReplaceableNode():
+            parentBinding = self.getValidCaptureBindingFor(parentBinding)
+        self.capturedAddressTable[address] = parentBinding
+        return parentBinding
 
     def getValidCaptureBindingFor(self, capturedValue):
         if capturedValue in self.capturedValueTable:
@@ -278,8 +392,9 @@ class ASGFunctionalAnalysisEnvironment(ASGLexicalEnvironment):
         return binding
 
     def lookSymbolBindingRecursively(self, symbol: str):
-        if symbol in self.symbolTable:
-            return self.symbolTable[symbol][0]
+        binding = self.symbolTable.lookup(symbol)
+        if binding is not None:
+            return binding
         
         if symbol in self.capturedSymbolTable:
             return self.capturedSymbolTable[symbol]
@@ -0,0 +1,58 @@
+import unittest
+from .environment import *
+
+class TestPersistentSymbolTable(unittest.TestCase):
+    def testAddingBindingsKeepsPreviousVersions(self):
+        emptyTable = ASGPersistentSymbolTable()
+        firstTable = emptyTable.withBinding('a', 1)
+        secondTable = firstTable.withBinding('b', 2)
+        shadowingTable = secondTable.withBinding('a', 3)
+        self.assertIsNone(emptyTable.lookup('a'))
+        self.assertEqual(firstTable.lookup('a'), 1)
+        self.assertIsNone(firstTable.lookup('b'))
+        self.assertEqual(secondTable.lookup('a'), 1)
+        self.assertEqual(secondTable.lookup('b'), 2)
+        self.assertEqual(shadowingTable.lookup('a'), 3)
+        self.assertEqual(shadowingTable.lookup('b'), 2)
+
+    def testManyBindings(self):
+        table = ASGPersistentSymbolTable()
+        for i in range(1000):
+            table = table.withBinding('v%d' % i, i)
+        for i in range(1000):
+            self.assertEqual(table.lookup('v%d' % i), i)
+        self.assertIsNone(table.lookup('v1000'))
+
+    def testBranchingFromTheSameVersion(self):
+        table = ASGPersistentSymbolTable()
+        for i in range(127):
+            table = table.withBinding('v%d' % i, i)
+
+        branches = list(map(lambda i: table.withBinding('b%d' % i, i), range(100)))
+        for i in range(100):
+            self.assertEqual(branches[i].lookup('b%d' % i), i)
+            self.assertIsNone(branches[i].lookup('b%d' % ((i + 1) % 100)))
+            self.assertEqual(branches[i].lookup('v126'), 126)
+        self.assertIsNone(table.lookup('b0'))
+
+    def testHashCollisions(self):
+        class CollidingSymbol(str):
+            def __hash__(self) -> int:
+                return 42
+
+        table = ASGPersistentSymbolTable().withBinding(CollidingSymbol('a'), 1).withBinding(CollidingSymbol('b'), 2)
+        shadowingTable = table.withBinding(CollidingSymbol('a'), 3)
+        self.assertEqual((table.lookup(CollidingSymbol('a')), table.lookup(CollidingSymbol('b'))), (1, 2))
+        self.assertEqual((shadowingTable.lookup(CollidingSymbol('a')), shadowingTable.lookup(CollidingSymbol('b'))), (3, 2))
+        self.assertIsNone(table.lookup(CollidingSymbol('c')))
+
+    def testChildEnvironmentBindings(self):
+        topLevelEnvironment = ASGTopLevelTargetEnvironment.uniqueInstance()
+        environment = ASGChildEnvironmentWithBindings(topLevelEnvironment).childWithSymbolBinding('x', topLevelEnvironment.lookLastBindingOf('true'))
+        shadowingEnvironment = environment.childWithSymbolBinding('x', topLevelEnvironment.lookLastBindingOf('false'))
+        self.assertTrue(environment.lookSymbolBindingRecursively('x').isKindOf(ASGLiteralTrueNode))
+        self.assertTrue(shadowingEnvironment.lookSymbolBindingRecursively('x').isKindOf(ASGLiteralFalseNode))
+        self.assertTrue(shadowingEnvironment.lookSymbolBindingRecursively('nil').isKindOf(ASGLiteralNilNode))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 from .mop import *
 from .asg import *
-from .interpreter import ASGNodeWithInterpretableInstructions
+from .interpreter import ASGNodeWithInterpretableInstructions, ASGLazyInterpretableInstructions, ASGUninterpretableInstruction, ASGInstructionSourceTable
 
 class ASGNodeWithInstructionScheduling:
     def __init__(self, functionalNode, activationParameters, constants, serializedInstructions) -> None:
@@ -25,8 +25,41 @@ class ASGNodeWithInstructionScheduling:
         for node in self.serializedInstructions:
             yield node 
 
+    def getName(self) -> str:
+        kind = 'block' if self.functionalNode.isBlockDefinitionNode() else 'script'
+        return '%s %s' % (kind, str(self.functionalNode.sourceDerivation.getSourcePosition()).replace(';', ','))
+
     def asInterpretableInstructions(self):
-        return ASGNodeWithInterpretableInstructions(self.functionalNode, list(self.enumerateForInterpretation()), len(self.constants), len(self.activationParameters))
+        return ASGNodeWithInterpretableInstructions(*self.detachInterpretableInstructions())
+
+    def asLazyInterpretableInstructions(self):
+        return ASGLazyInterpretableInstructions(*self.detachInterpretableInstructions())
+
+    def detachInterpretableInstructions(self) -> tuple:
+        # The compiled unit only keeps the constant values, the parameter indices and the source ranges, so the ASG can be collected afterwards.
+        nodes = list(self.enumerateForInterpretation())
+        constantCount = len(self.constants)
+        instructionIndexTable = {}
+        for i in range(len(nodes)):
+            instructionIndexTable[nodes[i]] = i - constantCount
+
+        constants = list(map(lambda node: node.evaluateAsConstantValue(), self.constants))
+        constantInstructions = {}
+        instructions = []
+        for node in self.constants:
+            kindName = node.__class__.__asgKindName__
+            constantInstruction = constantInstructions.get(kindName, None)
+            if constantInstruction is None:
+                constantInstruction = ASGUninterpretableInstruction(kindName)
+                constantInstructions[kindName] = constantInstruction
+            instructions.append(constantInstruction)
+        instructions += map(lambda node: node.asInterpretableInstruction(), nodes[constantCount:])
+        parametersLists = list(map(lambda node: tuple(map(lambda dep: instructionIndexTable[dep], node.interpretationDependencies())), nodes[constantCount:]))
+
+        sourceTable = ASGInstructionSourceTable()
+        for node in nodes[constantCount + len(self.activationParameters):]:
+            sourceTable.addSourcePosition(node.sourceDerivation.getSourcePosition())
+        return self.getName(), instructions, constantCount, len(self.activationParameters), constants, parametersLists, sourceTable
 
 class InstructionUserList:
     def __init__(self) -> None:
@@ -196,20 +229,23 @@ class GlobalCodeMotionAlgorithm:
             instruction = self.dataInstructions[instructionIndex]
 
             for dependency in instruction.dataDependencies():
-                if dependency not in self.dataInstructionIndexDictionary:
+                # Values produced by sequencing nodes are available in the region of the node.
+                if dependency in self.regionToIndexDictionary:
+                    dependencyRegion = self.regionToIndexDictionary[dependency]
+                elif dependency in self.dataInstructionIndexDictionary:
+                    dependencyIndex = self.dataInstructionIndexDictionary[dependency]
+                    visitInstruction(dependencyIndex)
+                    dependencyRegion = self.earlySchedule[dependencyIndex]
+                else:
                     continue
 
-                dependencyIndex = self.dataInstructionIndexDictionary[dependency]
-                visitInstruction(dependencyIndex)
-
                 if not self.pinnedDataInstructions[instructionIndex]:
-                    dependencyRegion = self.earlySchedule[dependencyIndex]
                     dependencyRegionDepth = self.dominanceTreeDepths[dependencyRegion]
 
                     instructionRegion = self.earlySchedule[instructionIndex]
                     instructionRegionDepth = self.dominanceTreeDepths[instructionRegion]
                     if instructionRegionDepth < dependencyRegionDepth:
-                        self.earlySchedule[instructionIndex] = self.earlySchedule[dependencyIndex]
+                        self.earlySchedule[instructionIndex] = dependencyRegion
 
         for i in range(len(self.dataInstructions)):
             visitInstruction(i)
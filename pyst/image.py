@@ -0,0 +1,369 @@
+import mmap
+import struct
+from .interpreter import ASGNodeWithInterpretableInstructions, ASGLazyInterpretableInstructions, ASGClosureInstance, ASGInterpretableInstruction
+from .interpreter import ASGUninterpretableInstruction, ASGSequenceEntryInstruction, ASGSequenceReturnInstruction, ASGBlockInstanceInstruction
+from .interpreter import ASGApplicationInstruction, ASGBlockApplicationInstruction, ASGMessageSendInstruction, ASGMutableArrayInstruction
+
+ImageMagic = b'PSTI'
+ImageVersion = 2
+ImageExtension = '.stimage'
+
+# Magic, version, source size, source modification time, root unit, unit count, string count, string table offset and unit table offset.
+ImageHeaderFormat = struct.Struct('<4sHQqIIIII')
+
+ValueTagNil = 0
+ValueTagFalse = 1
+ValueTagTrue = 2
+ValueTagInteger = 3
+ValueTagLargeInteger = 4
+ValueTagFloat = 5
+ValueTagString = 6
+ValueTagTuple = 7
+ValueTagUnit = 8
+ValueTagClosure = 9
+ValueTagGlobal = 10
+
+UInt8Format = struct.Struct('<B')
+UInt16Format = struct.Struct('<H')
+UInt32Format = struct.Struct('<I')
+Int32Format = struct.Struct('<i')
+Int64Format = struct.Struct('<q')
+Float64Format = struct.Struct('<d')
+UnitHeaderFormat = struct.Struct('<III')
+StringEntryFormat = struct.Struct('<II')
+
+class ImageFormatError(Exception):
+    pass
+
+class ImageUnsupportedValue(Exception):
+    pass
+
+def makeGlobalNameTable(values: list) -> dict:
+    return dict(map(lambda value: ((value.__module__, value.__qualname__), value), values))
+
+# The images only refer to these globals by name, so a loaded image cannot reach any other module or object.
+ImageInstructionClasses = makeGlobalNameTable([
+    ASGUninterpretableInstruction,
+    ASGSequenceEntryInstruction,
+    ASGSequenceReturnInstruction,
+    ASGBlockInstanceInstruction,
+    ASGApplicationInstruction,
+    ASGBlockApplicationInstruction,
+    ASGMessageSendInstruction,
+    ASGMutableArrayInstruction,
+])
+ImageGlobalValues = None
+
+def getImageGlobalValues() -> dict:
+    global ImageGlobalValues
+    if ImageGlobalValues is None:
+        # Imported on demand, because the environment depends on the module loader, which depends on the images.
+        from .environment import Stdio
+        from .modules import requireModuleNamed
+        ImageGlobalValues = makeGlobalNameTable([Stdio, requireModuleNamed])
+    return ImageGlobalValues
+
+class ASGInstructionImageWriter:
+    """
+    Encodes interpretable instructions, along with the blocks reachable from their constants, into the binary image format.
+    Each instruction is stored as the name of its class, its parameter list and its operands.
+    """
+    def __init__(self) -> None:
+        self.strings = []
+        self.stringIndices = {}
+        self.units = []
+        self.unitIndices = {}
+
+    def internString(self, string: str) -> int:
+        stringIndex = self.stringIndices.get(string, None)
+        if stringIndex is None:
+            stringIndex = len(self.strings)
+            self.strings.append(string.encode('utf-8'))
+            self.stringIndices[string] = stringIndex
+        return stringIndex
+
+    def encodeUnit(self, instructions: ASGNodeWithInterpretableInstructions) -> int:
+        unitIndex = self.unitIndices.get(instructions, None)
+        if unitIndex is not None:
+            return unitIndex
+
+        unitIndex = len(self.units)
+        self.unitIndices[instructions] = unitIndex
+        self.units.append(None)
+
+        unitData = bytearray()
+        instructionCount = len(instructions.instructions) - instructions.constantCount
+        unitData += UnitHeaderFormat.pack(instructions.constantCount, instructions.activationParameterCount, instructionCount)
+        for constant in instructions.constants:
+            self.encodeValueInto(constant, unitData)
+        for i in range(instructionCount):
+            self.encodeInstructionInto(instructions.instructions[instructions.constantCount + i], instructions.parametersLists[i], unitData)
+
+        self.units[unitIndex] = bytes(unitData)
+        return unitIndex
+
+    def encodeValueInto(self, value, data: bytearray):
+        if value is None:
+            data += UInt8Format.pack(ValueTagNil)
+        elif value is False:
+            data += UInt8Format.pack(ValueTagFalse)
+        elif value is True:
+            data += UInt8Format.pack(ValueTagTrue)
+        elif isinstance(value, int):
+            if -(1 << 63) <= value < (1 << 63):
+                data += UInt8Format.pack(ValueTagInteger) + Int64Format.pack(value)
+            else:
+                data += UInt8Format.pack(ValueTagLargeInteger) + UInt32Format.pack(self.internString(str(value)))
+        elif isinstance(value, float):
+            data += UInt8Format.pack(ValueTagFloat) + Float64Format.pack(value)
+        elif isinstance(value, str):
+            data += UInt8Format.pack(ValueTagString) + UInt32Format.pack(self.internString(value))
+        elif isinstance(value, tuple):
+            data += UInt8Format.pack(ValueTagTuple) + UInt32Format.pack(len(value))
+            for element in value:
+                self.encodeValueInto(element, data)
+        elif isinstance(value, (ASGNodeWithInterpretableInstructions, ASGLazyInterpretableInstructions)):
+            data += UInt8Format.pack(ValueTagUnit) + UInt32Format.pack(self.encodeUnit(value.getInstructions()))
+        elif isinstance(value, ASGClosureInstance):
+            data += UInt8Format.pack(ValueTagClosure) + UInt32Format.pack(self.encodeUnit(value.instructions.getInstructions()))
+            self.encodeValueInto(tuple(value.captures), data)
+        else:
+            moduleName, qualifiedName = self.encodeGlobal(value, getImageGlobalValues())
+            data += UInt8Format.pack(ValueTagGlobal) + UInt32Format.pack(moduleName) + UInt32Format.pack(qualifiedName)
+
+    def encodeGlobal(self, value, globalNameTable: dict) -> tuple[int, int]:
+        moduleName = getattr(value, '__module__', None)
+        qualifiedName = getattr(value, '__qualname__', None)
+        if not isinstance(moduleName, str) or not isinstance(qualifiedName, str) or globalNameTable.get((moduleName, qualifiedName), None) is not value:
+            raise ImageUnsupportedValue('Cannot encode the value %s in an image.' % repr(value))
+        return self.internString(moduleName), self.internString(qualifiedName)
+
+    def encodeInstructionInto(self, instruction: ASGInterpretableInstruction, parameters: tuple, data: bytearray):
+        moduleName, qualifiedName = self.encodeGlobal(instruction.__class__, ImageInstructionClasses)
+        data += UInt32Format.pack(moduleName) + UInt32Format.pack(qualifiedName)
+        data += UInt16Format.pack(len(parameters))
+        for parameter in parameters:
+            data += Int32Format.pack(parameter)
+
+        operands = instruction.getOperands()
+        data += UInt16Format.pack(len(operands))
+        for operand in operands:
+            self.encodeValueInto(operand, data)
+
+    def encode(self, instructions: ASGNodeWithInterpretableInstructions, sourceSize: int = 0, sourceModificationTime: int = 0) -> bytes:
+        rootUnitIndex = self.encodeUnit(instructions)
+
+        stringTableOffset = ImageHeaderFormat.size
+        stringDataOffset = stringTableOffset + StringEntryFormat.size * len(self.strings)
+        stringTable = bytearray()
+        stringData = bytearray()
+        for string in self.strings:
+            stringTable += StringEntryFormat.pack(stringDataOffset + len(stringData), len(string))
+            stringData += string
+
+        unitTableOffset = stringDataOffset + len(stringData)
+        unitDataOffset = unitTableOffset + UInt32Format.size * len(self.units)
+        unitTable = bytearray()
+        unitData = bytearray()
+        for unit in self.units:
+            unitTable += UInt32Format.pack(unitDataOffset + len(unitData))
+            unitData += unit
+
+        header = ImageHeaderFormat.pack(ImageMagic, ImageVersion, sourceSize, sourceModificationTime, rootUnitIndex, len(self.units), len(self.strings), stringTableOffset, unitTableOffset)
+        return header + stringTable + stringData + unitTable + unitData
+
+class ASGInstructionImageHeader:
+    def __init__(self, buffer) -> None:
+        if len(buffer) < ImageHeaderFormat.size:
+            raise ImageFormatError('Truncated image header.')
+
+        magic, version, sourceSize, sourceModificationTime, rootUnitIndex, unitCount, stringCount, stringTableOffset, unitTableOffset = ImageHeaderFormat.unpack_from(buffer, 0)
+        if magic != ImageMagic:
+            raise ImageFormatError('Not an instruction image.')
+        if version != ImageVersion:
+            raise ImageFormatError('Unsupported image version %d.' % version)
+
+        self.sourceSize = sourceSize
+        self.sourceModificationTime = sourceModificationTime
+        self.rootUnitIndex = rootUnitIndex
+        self.unitCount = unitCount
+        self.stringCount = stringCount
+        self.stringTableOffset = stringTableOffset
+        self.unitTableOffset = unitTableOffset
+
+class ASGInstructionImageReader:
+    """
+    Rebuilds executable instructions from an image buffer, reading the fields in place with struct. The images do not keep the source ranges.
+    """
+    def __init__(self, buffer, imageName: str = '<image>') -> None:
+        self.buffer = memoryview(buffer)
+        self.imageName = imageName
+        self.header = None
+        self.strings = []
+        self.units = []
+        self.unitsBeingDecoded = set()
+        self.offset = 0
+
+    def readHeader(self):
+        self.header = ASGInstructionImageHeader(self.buffer)
+        self.strings = [None] * self.header.stringCount
+        self.units = [None] * self.header.unitCount
+
+    def release(self):
+        self.buffer.release()
+
+    def checkRange(self, offset: int, size: int):
+        if offset < 0 or offset + size > len(self.buffer):
+            raise ImageFormatError('Truncated image.')
+
+    def readFormatAt(self, format: struct.Struct, offset: int):
+        self.checkRange(offset, format.size)
+        return format.unpack_from(self.buffer, offset)
+
+    def readFormat(self, format: struct.Struct):
+        result = self.readFormatAt(format, self.offset)
+        self.offset += format.size
+        return result
+
+    def readUInt8(self) -> int:
+        return self.readFormat(UInt8Format)[0]
+
+    def readUInt16(self) -> int:
+        return self.readFormat(UInt16Format)[0]
+
+    def readUInt32(self) -> int:
+        return self.readFormat(UInt32Format)[0]
+
+    def readInt32(self) -> int:
+        return self.readFormat(Int32Format)[0]
+
+    def stringAt(self, stringIndex: int) -> str:
+        if stringIndex >= self.header.stringCount:
+            raise ImageFormatError('Invalid string index in image.')
+
+        string = self.strings[stringIndex]
+        if string is None:
+            stringOffset, stringSize = self.readFormatAt(StringEntryFormat, self.header.stringTableOffset + stringIndex * StringEntryFormat.size)
+            self.checkRange(stringOffset, stringSize)
+            try:
+                string = str(self.buffer[stringOffset:stringOffset + stringSize], 'utf-8')
+            except UnicodeDecodeError:
+                raise ImageFormatError('Invalid string encoding in image.')
+            self.strings[stringIndex] = string
+        return string
+
+    def readString(self) -> str:
+        return self.stringAt(self.readUInt32())
+
+    def decodeRootUnit(self) -> ASGNodeWithInterpretableInstructions:
+        return self.decodeUnit(self.header.rootUnitIndex)
+
+    def decodeUnit(self, unitIndex: int) -> ASGNodeWithInterpretableInstructions:
+        if unitIndex >= self.header.unitCount:
+            raise ImageFormatError('Invalid unit index in image.')
+        if self.units[unitIndex] is not None:
+            return self.units[unitIndex]
+        if unitIndex in self.unitsBeingDecoded:
+            raise ImageFormatError('Cyclic unit reference in image.')
+
+        self.unitsBeingDecoded.add(unitIndex)
+        savedOffset = self.offset
+        self.offset = self.readFormatAt(UInt32Format, self.header.unitTableOffset + unitIndex * UInt32Format.size)[0]
+        constantCount, activationParameterCount, instructionCount = self.readFormat(UnitHeaderFormat)
+        if activationParameterCount > instructionCount:
+            raise ImageFormatError('Invalid activation parameter count in image.')
+
+        constants = []
+        for i in range(constantCount):
+            constants.append(self.readValue())
+        constantInstruction = ASGUninterpretableInstruction('Constant')
+        instructions = [constantInstruction] * constantCount
+
+        parametersLists = []
+        for i in range(instructionCount):
+            instructionClass = self.readGlobal(ImageInstructionClasses)
+
+            parameterCount = self.readUInt16()
+            parameters = tuple(self.readInt32() for j in range(parameterCount))
+            for parameter in parameters:
+                if parameter < -constantCount or parameter >= instructionCount:
+                    raise ImageFormatError('Invalid instruction parameter in image.')
+            parametersLists.append(parameters)
+
+            operandCount = self.readUInt16()
+            operands = list(self.readValue() for j in range(operandCount))
+            try:
+                instructions.append(instructionClass(*operands) if operandCount != 0 else instructionClass.getSingleton())
+            except TypeError:
+                raise ImageFormatError('Invalid instruction operands in image.')
+
+        self.offset = savedOffset
+        self.unitsBeingDecoded.remove(unitIndex)
+        unit = ASGNodeWithInterpretableInstructions(None, instructions, constantCount, activationParameterCount, constants, parametersLists)
+        unit.imageLocation = '%s:%d' % (self.imageName, unitIndex)
+        self.units[unitIndex] = unit
+        return unit
+
+    def readValue(self):
+        tag = self.readUInt8()
+        return self.readValueWithTag(tag)
+
+    def readValueWithTag(self, tag: int):
+        if tag == ValueTagNil:
+            return None
+        elif tag == ValueTagFalse:
+            return False
+        elif tag == ValueTagTrue:
+            return True
+        elif tag == ValueTagInteger:
+            return self.readFormat(Int64Format)[0]
+        elif tag == ValueTagLargeInteger:
+            return int(self.readString())
+        elif tag == ValueTagFloat:
+            return self.readFormat(Float64Format)[0]
+        elif tag == ValueTagString:
+            return self.readString()
+        elif tag == ValueTagTuple:
+            elementCount = self.readUInt32()
+            return tuple(self.readValue() for i in range(elementCount))
+        elif tag == ValueTagUnit:
+            return self.decodeUnit(self.readUInt32())
+        elif tag == ValueTagClosure:
+            unit = self.decodeUnit(self.readUInt32())
+            return unit.instantiateClosureWithCaptures(self.readValue())
+        elif tag == ValueTagGlobal:
+            return self.readGlobal(getImageGlobalValues())
+        raise ImageFormatError('Invalid value tag %d in image.' % tag)
+
+    def readGlobal(self, globalNameTable: dict):
+        moduleName = self.readString()
+        qualifiedName = self.readString()
+        value = globalNameTable.get((moduleName, qualifiedName), None)
+        if value is None:
+            raise ImageFormatError('Unknown global %s.%s in image.' % (moduleName, qualifiedName))
+        return value
+
+def encodeInstructionsImage(instructions: ASGNodeWithInterpretableInstructions, sourceSize: int = 0, sourceModificationTime: int = 0) -> bytes:
+    return ASGInstructionImageWriter().encode(instructions, sourceSize, sourceModificationTime)
+
+def writeInstructionsImageToFileNamed(instructions: ASGNodeWithInterpretableInstructions, fileName: str, sourceSize: int = 0, sourceModificationTime: int = 0):
+    data = encodeInstructionsImage(instructions, sourceSize, sourceModificationTime)
+    with open(fileName, 'wb') as f:
+        f.write(data)
+
+def decodeInstructionsImage(buffer, imageName: str = '<image>', expectedSourceSize: int = None, expectedSourceModificationTime: int = None) -> ASGNodeWithInterpretableInstructions | None:
+    reader = ASGInstructionImageReader(buffer, imageName)
+    try:
+        reader.readHeader()
+        if expectedSourceSize is not None and reader.header.sourceSize != expectedSourceSize:
+            return None
+        if expectedSourceModificationTime is not None and reader.header.sourceModificationTime != expectedSourceModificationTime:
+            return None
+        return reader.decodeRootUnit()
+    finally:
+        reader.release()
+
+def loadInstructionsImageFromFileNamed(fileName: str, expectedSourceSize: int = None, expectedSourceModificationTime: int = None) -> ASGNodeWithInterpretableInstructions | None:
+    with open(fileName, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mappedImage:
+            return decodeInstructionsImage(mappedImage, fileName, expectedSourceSize, expectedSourceModificationTime)
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from .image import *
+from .testing import ASGCompilationTestMixin
+
+class TestInstructionImage(ASGCompilationTestMixin, unittest.TestCase):
+    def testRoundTrip(self):
+        instructions = self.compileSourceString("[:x | {x. #symbol. 'string'. 42. nil. true}] value: 1")
+        loadedInstructions = decodeInstructionsImage(encodeInstructionsImage(instructions))
+        self.assertEqual(loadedInstructions.constantCount, instructions.constantCount)
+        self.assertEqual(loadedInstructions.activationParameterCount, instructions.activationParameterCount)
+        self.assertEqual(loadedInstructions.parametersLists, instructions.parametersLists)
+        self.assertEqual(loadedInstructions.evaluateWithArguments(), [1, 'symbol', 'string', 42, None, True])
+
+    def testNestedBlocks(self):
+        instructions = self.compileSourceString('[:x | [:y | {x. y}]]')
+        loadedBlock = decodeInstructionsImage(encodeInstructionsImage(instructions)).evaluateWithArguments()
+        self.assertEqual(loadedBlock(1)(2), [1, 2])
+
+    def testLoadFromFile(self):
+        instructions = self.compileSourceString('[:a :b | {b. a}] value: 1 value: 2')
+        with tempfile.TemporaryDirectory() as directory:
+            imageFileName = os.path.join(directory, 'script' + ImageExtension)
+            writeInstructionsImageToFileNamed(instructions, imageFileName, 10, 20)
+            self.assertIsNone(loadInstructionsImageFromFileNamed(imageFileName, 11, 20))
+            self.assertEqual(loadInstructionsImageFromFileNamed(imageFileName, 10, 20).evaluateWithArguments(), [2, 1])
+
+    def testTamperedGlobals(self):
+        from .environment import Stdio
+        instructions = self.compileSourceString('[:x | {x. Stdio}] value: 1')
+        self.assertEqual(decodeInstructionsImage(encodeInstructionsImage(instructions)).evaluateWithArguments(), [1, Stdio])
+
+        for tamperedValue in [Stdio, ASGMutableArrayInstruction]:
+            class TamperedImageWriter(ASGInstructionImageWriter):
+                def encodeGlobal(self, value, globalNameTable: dict) -> tuple[int, int]:
+                    if value is tamperedValue:
+                        return self.internString('os'), self.internString('system')
+                    return super().encodeGlobal(value, globalNameTable)
+
+            self.assertRaises(ImageFormatError, decodeInstructionsImage, TamperedImageWriter().encode(instructions))
+
+    def testInvalidImage(self):
+        self.assertRaises(ImageFormatError, decodeInstructionsImage, b'not an image')
+        data = bytearray(encodeInstructionsImage(self.compileSourceString('nil')))
+        self.assertRaises(ImageFormatError, decodeInstructionsImage, data[:len(data) - 1])
+
+        data = encodeInstructionsImage(self.compileSourceString("[:x | {x. #symbol. 'string'. 42}] value: 1"))
+        for size in range(len(data)):
+            self.assertRaises(ImageFormatError, decodeInstructionsImage, data[:size])
+
+        instructions = self.compileSourceString('[:x | {x. 42}] value: 1')
+        for invalidParameter in [1000, -1000]:
+            class TamperedImageWriter(ASGInstructionImageWriter):
+                def encodeInstructionInto(self, instruction: ASGInterpretableInstruction, parameters: tuple, data: bytearray):
+                    super().encodeInstructionInto(instruction, parameters + (invalidParameter,), data)
+
+            self.assertRaises(ImageFormatError, decodeInstructionsImage, TamperedImageWriter().encode(instructions))
+
+if __name__ == '__main__':
+    unittest.main()
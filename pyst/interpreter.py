@@ -1,35 +1,245 @@
+import threading
 from typing import Any
+from array import array
 from .mop import *
-from .asg import *
+
+class ASGInterpretableInstruction:
+    """
+    An instruction of a compiled unit. It only keeps its operands, so the compiled code does not refer back to the ASG.
+    """
+    __slots__ = ()
+    kindName = 'Instruction'
+    Singleton = None
+
+    @classmethod
+    def getSingleton(cls):
+        # Only for the instructions without operands. Each of them has its own Singleton class attribute.
+        if cls.Singleton is None:
+            cls.Singleton = cls()
+        return cls.Singleton
+
+    def getOperands(self) -> tuple:
+        return ()
+
+    def printName(self) -> str:
+        return self.kindName
+
+    def interpretInContext(self, context, parameters):
+        raise Exception('Cannot interpret %s.' % self.printName())
+
+class ASGUninterpretableInstruction(ASGInterpretableInstruction):
+    """
+    Placeholder for the constants, the activation parameters and the nodes that cannot be interpreted.
+    """
+    __slots__ = ('description',)
+
+    def __init__(self, description: str) -> None:
+        self.description = description
+
+    def getOperands(self) -> tuple:
+        return (self.description,)
+
+    def printName(self) -> str:
+        return self.description
+
+class ASGSequenceEntryInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'SequenceEntry'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        pass
+
+class ASGSequenceReturnInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'SequenceReturn'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        context.returnValue(context[parameters[0]])
+
+class ASGBlockInstanceInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'BlockInstance'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        definition = context[parameters[-1]]
+        return definition.instantiateClosureWithCaptures(tuple(context[parameters[i]] for i in range(len(parameters) - 1)))
+
+class ASGApplicationInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'FxApplication'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        functional = context[parameters[0]]
+        arguments = list(map(lambda x: context[x], parameters[1:]))
+        return functional(*arguments)
+
+class ASGBlockApplicationInstruction(ASGInterpretableInstruction):
+    __slots__ = ('captureCount',)
+    kindName = 'FxBlockApplication'
+
+    def __init__(self, captureCount: int) -> None:
+        self.captureCount = captureCount
+
+    def getOperands(self) -> tuple:
+        return (self.captureCount,)
+
+    def printName(self) -> str:
+        return '%s(captureCount = %d)' % (self.kindName, self.captureCount)
+
+    def interpretInContext(self, context, parameters):
+        definition = context[parameters[0]]
+        argumentsStart = 1 + self.captureCount
+        captures = tuple(context[parameters[i]] for i in range(1, argumentsStart))
+        arguments = tuple(context[parameters[i]] for i in range(argumentsStart, len(parameters)))
+        return definition.evaluateWithCapturesAndArguments(captures, arguments)
+
+class ASGMessageSendInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'FxMessageSend'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        from .environment import performInWithArguments
+        receiver = context[parameters[0]]
+        selector = context[parameters[1]]
+        arguments = list(map(lambda x: context[x], parameters[2:]))
+        return performInWithArguments(receiver, selector, arguments)
+
+class ASGMutableArrayInstruction(ASGInterpretableInstruction):
+    __slots__ = ()
+    kindName = 'MutableArray'
+    Singleton = None
+
+    def interpretInContext(self, context, parameters):
+        return list(map(lambda x: context[x], parameters))
+
+class ASGInstructionSourceTable:
+    """
+    The source ranges of the executed instructions of a unit, packed into an integer array. The source positions are only materialized on request.
+    """
+    __slots__ = ('sourceCodes', 'ranges')
+    RangeSize = 7
+    NoRange = (-1, 0, 0, 0, 0, 0, 0)
+
+    def __init__(self) -> None:
+        self.sourceCodes = []
+        self.ranges = array('i')
+
+    def addSourcePosition(self, sourcePosition):
+        if not isinstance(sourcePosition, SourcePosition):
+            self.ranges.extend(self.NoRange)
+            return
+
+        try:
+            sourceCodeIndex = self.sourceCodes.index(sourcePosition.sourceCode)
+        except ValueError:
+            sourceCodeIndex = len(self.sourceCodes)
+            self.sourceCodes.append(sourcePosition.sourceCode)
+
+        self.ranges.extend((sourceCodeIndex,
+            sourcePosition.startIndex, sourcePosition.endIndex,
+            sourcePosition.startLine, sourcePosition.startColumn,
+            sourcePosition.endLine, sourcePosition.endColumn))
+
+    def sourcePositionAt(self, index: int):
+        offset = index * self.RangeSize
+        if offset < 0 or offset >= len(self.ranges) or self.ranges[offset] < 0:
+            return EmptySourcePosition.getSingleton()
+
+        sourceCodeIndex, startIndex, endIndex, startLine, startColumn, endLine, endColumn = self.ranges[offset:offset + self.RangeSize]
+        return SourcePosition(self.sourceCodes[sourceCodeIndex], startIndex, endIndex, startLine, startColumn, endLine, endColumn)
 
 class ASGNodeWithInterpretableInstructions:
-    def __init__(self, functionalNode, instructions, constantCount, activationParameterCount) -> None:
-        self.functionalNode = functionalNode
+    scheduledInstructionCount = 0
+
+    def __init__(self, name: str | None, instructions: list[ASGInterpretableInstruction], constantCount: int, activationParameterCount: int, constants: list, parametersLists: list[tuple], sourceTable: ASGInstructionSourceTable = None) -> None:
+        self.name = name
+        self.imageLocation = None
         self.instructions = instructions
         self.constantCount = constantCount
         self.activationParameterCount = activationParameterCount
         self.startpc = constantCount + activationParameterCount
         self.activationContextSize = len(self.instructions) - self.constantCount
-        self.parametersLists = None
-        self.constants = []
-        self.buildParametersLists()
+        self.constants = list(constants)
+        self.parametersLists = list(parametersLists)
+        self.sourceTable = sourceTable if sourceTable is not None else ASGInstructionSourceTable()
+        self.resultSlots = None
+        self.slotParametersLists = None
+        self.freeActivationContexts = []
+        self.maxFreeActivationContexts = 4
+        self.allocateSlots()
+        self.emptyActivationContextData = (None,) * self.activationContextSize
+        ASGNodeWithInterpretableInstructions.scheduledInstructionCount += len(self.instructions)
 
-    def buildParametersLists(self):
-        self.parametersLists = []
-        instructionIndexTable = {}
-        for i in range(len(self.instructions)):
-            instructionIndexTable[self.instructions[i]] = i - self.constantCount
-        for i in range(self.constantCount):
-            constantInstruction = self.instructions[i]
-            self.constants.append(constantInstruction.evaluateAsConstantValue())
-        for i in range(self.constantCount, len(self.instructions)):
-            instruction = self.instructions[i]
-            parameterList = tuple(map(lambda dep: instructionIndexTable[dep], instruction.interpretationDependencies()))
-            self.parametersLists.append(parameterList)
+    def sourcePositionAt(self, pc: int):
+        return self.sourceTable.sourcePositionAt(pc - self.startpc)
+
+    def getInstructions(self):
+        return self
+
+    def allocateSlots(self):
+        # Linear scan over the serialized instructions. A slot is reused once the last user of its value has been reached.
+        dataInstructionCount = len(self.instructions) - self.constantCount
+        lastUses = list(range(dataInstructionCount))
+        for i in range(dataInstructionCount):
+            for parameter in self.parametersLists[i]:
+                if parameter >= 0:
+                    lastUses[parameter] = i
+
+        expiringValues = [[] for i in range(dataInstructionCount)]
+        for i in range(dataInstructionCount):
+            expiringValues[lastUses[i]].append(i)
+
+        self.resultSlots = [None] * dataInstructionCount
+        freeSlots = []
+        slotCount = 0
+        activationParameterEnd = self.startpc - self.constantCount
+        for i in range(dataInstructionCount):
+            if i >= activationParameterEnd:
+                for expiringValue in expiringValues[i]:
+                    if expiringValue != i:
+                        freeSlots.append(self.resultSlots[expiringValue])
+
+            if i >= activationParameterEnd and len(freeSlots) != 0:
+                self.resultSlots[i] = freeSlots.pop()
+            else:
+                self.resultSlots[i] = slotCount
+                slotCount += 1
+
+            if i >= activationParameterEnd and lastUses[i] == i:
+                freeSlots.append(self.resultSlots[i])
+
+        self.activationContextSize = slotCount
+        self.slotParametersLists = []
+        for parameters in self.parametersLists:
+            self.slotParametersLists.append(tuple(map(lambda parameter: self.resultSlots[parameter] if parameter >= 0 else parameter, parameters)))
 
     def evaluateWithArguments(self, *args):
-        activationContext = ASGNodeInterpreterActivationContext(self.startpc, (), args, self)
-        return activationContext.execute()
+        return self.evaluateWithCapturesAndArguments((), args)
+
+    def evaluateWithCapturesAndArguments(self, captures, arguments):
+        # A pooled context is not in use, so recursive calls get a fresh one. The pool is only touched through pop and append, so concurrent calls never share a context.
+        # The pooled contexts are discarded when the context class was swapped by the instruction counting or the profiler.
+        activationContextClass = self.activationContextClass
+        try:
+            activationContext = self.freeActivationContexts.pop()
+        except IndexError:
+            activationContext = None
+
+        if type(activationContext) is activationContextClass:
+            activationContext.initializeWith(self.startpc, captures, arguments)
+        else:
+            activationContext = activationContextClass(self.startpc, captures, arguments, self)
+
+        result = activationContext.execute()
+        if len(self.freeActivationContexts) < self.maxFreeActivationContexts and type(activationContext) is self.activationContextClass:
+            activationContext.release()
+            self.freeActivationContexts.append(activationContext)
+        return result
 
     def instantiateClosureWithCaptures(self, captures):
         return ASGClosureInstance(self, captures)
@@ -37,7 +247,7 @@ class ASGNodeWithInterpretableInstructions:
     def dump(self) -> str:
         result = ''
         for i in range(len(self.instructions)):
-            result += '%d: %s' % (i - self.constantCount, self.instructions[i].prettyPrintNameWithDataAttributes())
+            result += '%d: %s' % (i - self.constantCount, self.instructions[i].printName())
             if i >= self.constantCount:
                 parameters = self.parametersLists[i - self.constantCount]
                 if len(parameters) > 0:
@@ -65,7 +275,7 @@ class ASGNodeWithInterpretableInstructions:
                 return 'N%d' % id
 
         for i in range(len(self.instructions)):
-            result += '  %s [label="%s"]\n' % (formatId(i - self.constantCount), self.instructions[i].prettyPrintNameWithDataAttributes().replace('\\', '\\\\'.replace('\"', '\\"')))
+            result += '  %s [label="%s"]\n' % (formatId(i - self.constantCount), self.instructions[i].printName().replace('\\', '\\\\'.replace('\"', '\\"')))
 
         for i in range(self.constantCount, len(self.instructions)):
             if i > self.startpc:
@@ -82,29 +292,66 @@ class ASGNodeWithInterpretableInstructions:
         with open(filename, "w") as f:
             f.write(self.dumpDot())
 
+class ASGLazyInterpretableInstructions:
+    """
+    Stands for the scheduled instructions of a block definition until the block is invoked for the first time.
+    It only holds the detached instructions, so the block definition graph is not kept alive.
+    The slots and the activation contexts are set up once, under a lock, when the block is first invoked.
+    """
+    def __init__(self, name: str | None, instructions: list[ASGInterpretableInstruction], constantCount: int, activationParameterCount: int, constants: list, parametersLists: list[tuple], sourceTable: ASGInstructionSourceTable = None) -> None:
+        self.name = name
+        self.detachedInstructions = (instructions, constantCount, activationParameterCount, constants, parametersLists, sourceTable)
+        self.instructions = None
+        self.lock = threading.Lock()
+
+    def getInstructions(self) -> ASGNodeWithInterpretableInstructions:
+        instructions = self.instructions
+        if instructions is None:
+            with self.lock:
+                if self.instructions is None:
+                    self.instructions = ASGNodeWithInterpretableInstructions(self.name, *self.detachedInstructions)
+                    self.detachedInstructions = None
+                instructions = self.instructions
+        return instructions
+
+    def evaluateWithArguments(self, *args):
+        return self.getInstructions().evaluateWithCapturesAndArguments((), args)
+
+    def evaluateWithCapturesAndArguments(self, captures, arguments):
+        return self.getInstructions().evaluateWithCapturesAndArguments(captures, arguments)
+
+    def instantiateClosureWithCaptures(self, captures):
+        # The closures created after the compilation call the instructions directly.
+        instructions = self.instructions
+        return ASGClosureInstance(instructions if instructions is not None else self, captures)
+
 class ASGClosureInstance:
-    def __init__(self, instructions: ASGNodeWithInterpretableInstructions, captures: list) -> None:
+    def __init__(self, instructions: ASGNodeWithInterpretableInstructions | ASGLazyInterpretableInstructions, captures: list) -> None:
         self.instructions = instructions
         self.captures = captures
 
     def __call__(self, *args: Any) -> Any:
-        activationContext = ASGNodeInterpreterActivationContext(self.instructions.startpc, self.captures, args, self.instructions)
-        return activationContext.execute()
+        return self.instructions.evaluateWithCapturesAndArguments(self.captures, args)
 
 class ASGNodeInterpreterActivationContext:
     def __init__(self, pc, captureVector: list, activationParameters, instructions: ASGNodeWithInterpretableInstructions) -> None:
-        self.pc = pc
         self.data = [None] * instructions.activationContextSize
         self.instructions = instructions
+        self.initializeWith(pc, captureVector, activationParameters)
+
+    def initializeWith(self, pc, captureVector: list, activationParameters):
+        self.pc = pc
         self.result = None
         self.shouldReturn = None
 
         captureVectorSize = len(captureVector)
-        for i in range(captureVectorSize):
-            self.data[i] = captureVector[i]
+        self.data[0:captureVectorSize] = captureVector
+        self.data[captureVectorSize:captureVectorSize + len(activationParameters)] = activationParameters
 
-        for i in range(len(activationParameters)):
-            self.data[captureVectorSize + i] = activationParameters[i]
+    def release(self):
+        # Drop the references to the values of the previous activation.
+        self.data[:] = self.instructions.emptyActivationContextData
+        self.result = None
 
     def execute(self):
         self.shouldReturn = False
@@ -112,9 +359,9 @@ class ASGNodeInterpreterActivationContext:
         while not self.shouldReturn:
             pc = self.pc
             instruction = self.instructions.instructions[pc]
-            parameters = self.instructions.parametersLists[pc - constantCount]
+            parameters = self.instructions.slotParametersLists[pc - constantCount]
             self.pc += 1
-            self.data[pc - constantCount] = instruction.interpretInContext(self, parameters)
+            self.data[self.instructions.resultSlots[pc - constantCount]] = instruction.interpretInContext(self, parameters)
 
         return self.result
 
@@ -127,3 +374,29 @@ class ASGNodeInterpreterActivationContext:
             return self.instructions.constants[self.instructions.constantCount + index]
         else:
             return self.data[index]
+
+class ASGNodeCountingInterpreterActivationContext(ASGNodeInterpreterActivationContext):
+    executedInstructionCount = 0
+
+    def execute(self):
+        self.shouldReturn = False
+        constantCount = self.instructions.constantCount
+        executedInstructionCount = 0
+        while not self.shouldReturn:
+            pc = self.pc
+            instruction = self.instructions.instructions[pc]
+            parameters = self.instructions.slotParametersLists[pc - constantCount]
+            self.pc += 1
+            executedInstructionCount += 1
+            self.data[self.instructions.resultSlots[pc - constantCount]] = instruction.interpretInContext(self, parameters)
+
+        ASGNodeCountingInterpreterActivationContext.executedInstructionCount += executedInstructionCount
+        return self.result
+
+ASGNodeWithInterpretableInstructions.activationContextClass = ASGNodeInterpreterActivationContext
+
+def setInstructionCountingEnabled(enabled: bool):
+    if enabled:
+        ASGNodeWithInterpretableInstructions.activationContextClass = ASGNodeCountingInterpreterActivationContext
+    else:
+        ASGNodeWithInterpretableInstructions.activationContextClass = ASGNodeInterpreterActivationContext
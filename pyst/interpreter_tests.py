@@ -0,0 +1,229 @@
+import gc
+import threading
+import time
+import types
+import unittest
+from .environment import ASGBuilderWithGVNAndEnvironment
+from .interpreter import *
+from .testing import ASGCompilationTestMixin
+from .profiler import ASGInterpreterProfiler, ASGSamplingProfiler, ASGAnalysisProfiler
+
+class TestSlotAllocation(ASGCompilationTestMixin, unittest.TestCase):
+    def testDeadValueSlotsAreReused(self):
+        block = self.compileSourceString('[:a | {{{{a}}}}]').evaluateWithArguments()
+        instructions = block.instructions.getInstructions()
+        self.assertTrue(instructions.activationContextSize < len(instructions.instructions) - instructions.constantCount)
+        self.assertEqual(block(1), [[[[1]]]])
+
+    def testActivationParametersKeepTheirSlots(self):
+        block = self.compileSourceString('[:a :b | {b. {a}. a. b}]').evaluateWithArguments()
+        self.assertEqual(block.instructions.getInstructions().resultSlots[:2], [0, 1])
+        self.assertEqual(block(1, 2), [2, [1], 1, 2])
+
+    def testCapturedValuesAfterSlotReuse(self):
+        self.assertEqual(self.compileSourceString('[:a :b | [:c | {{a}. {b}. {c}}] value: 3] value: 1 value: 2').evaluateWithArguments(), [[1], [2], [3]])
+
+    def testArrayOfSendResults(self):
+        self.assertEqual(self.compileSourceString('[:f | {f value: 1. f value: 2}] value: [:x | {x}]').evaluateWithArguments(), [[1], [2]])
+
+class TestActivationContextPooling(ASGCompilationTestMixin, unittest.TestCase):
+    def compileBlock(self, string: str) -> ASGClosureInstance:
+        return self.compileSourceString(string).evaluateWithArguments()
+
+    def testActivationContextIsReused(self):
+        block = self.compileBlock('[:a | {a}]')
+        self.assertEqual(block(1), [1])
+        pooledContext = block.instructions.getInstructions().freeActivationContexts[-1]
+        self.assertTrue(all(value is None for value in pooledContext.data))
+        self.assertEqual(block(2), [2])
+        self.assertIs(block.instructions.getInstructions().freeActivationContexts[-1], pooledContext)
+
+    def testReentrantActivation(self):
+        block = self.compileBlock('[:k :x | {x. k value: x}]')
+        self.assertEqual(block(lambda x: block(lambda y: y, x + 1), 1), [1, [2, 2]])
+
+class TestDetachedInstructions(ASGCompilationTestMixin, unittest.TestCase):
+    def testCompiledCodeDoesNotReferenceTheGraph(self):
+        script = self.compileSourceString('[:x | [:y | {x. y}] value: x] value: 1')
+        self.assertDoesNotReferenceTheGraph(script)
+        self.assertEqual(script.evaluateWithArguments(), [1, 1])
+
+    def testUninvokedBlocksDoNotReferenceTheGraph(self):
+        script = self.compileSourceString('[:f | {f value: 1. f value: 2}] value: [:x | {x. [:y | {x. y}]}]')
+        self.assertDoesNotReferenceTheGraph(script)
+        self.assertEqual(list(map(lambda element: element[0], script.evaluateWithArguments())), [1, 2])
+        self.assertDoesNotReferenceTheGraph(script)
+
+    def assertDoesNotReferenceTheGraph(self, script):
+        visited = set()
+        pendingObjects = [script]
+        while len(pendingObjects) != 0:
+            object = pendingObjects.pop()
+            if id(object) in visited or isinstance(object, (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)):
+                continue
+            visited.add(id(object))
+            self.assertNotIsInstance(object, ASGNode)
+            pendingObjects += gc.get_referents(object)
+
+    def testSourcePositions(self):
+        script = self.compileSourceString('{1.\n2} foo: 3')
+        sendPcs = [pc for pc in range(script.startpc, len(script.instructions)) if isinstance(script.instructions[pc], ASGMessageSendInstruction)]
+        self.assertEqual(len(sendPcs), 1)
+        sourcePosition = script.sourcePositionAt(sendPcs[0])
+        self.assertEqual((sourcePosition.startLine, sourcePosition.endLine, sourcePosition.endColumn), (1, 2, 10))
+        self.assertIsInstance(script.sourcePositionAt(len(script.instructions)), EmptySourcePosition)
+
+class TestInstructionCounting(ASGCompilationTestMixin, unittest.TestCase):
+    def tearDown(self):
+        setInstructionCountingEnabled(False)
+
+    def testPooledContextsAcrossCounting(self):
+        block = self.compileSourceString('[:a | {a}]').evaluateWithArguments()
+        self.assertEqual(block(1), [1])
+        setInstructionCountingEnabled(True)
+        initialCount = ASGNodeCountingInterpreterActivationContext.executedInstructionCount
+        self.assertEqual(block(2), [2])
+        countedInstructions = ASGNodeCountingInterpreterActivationContext.executedInstructionCount - initialCount
+        self.assertGreater(countedInstructions, 0)
+
+        setInstructionCountingEnabled(False)
+        self.assertEqual(block(3), [3])
+        self.assertEqual(ASGNodeCountingInterpreterActivationContext.executedInstructionCount - initialCount, countedInstructions)
+
+class TestLazyBlockCompilation(ASGCompilationTestMixin, unittest.TestCase):
+    def testBlockIsCompiledOnFirstCall(self):
+        block = self.compileSourceString('[:a | {a. [:b | {b}]}]').evaluateWithArguments()
+        self.assertIsNone(block.instructions.instructions)
+        value, innerBlock = block(1)
+        self.assertEqual(value, 1)
+        self.assertIsNone(block.instructions.detachedInstructions)
+        self.assertIsNone(innerBlock.instructions.instructions)
+        self.assertEqual(innerBlock(2), [2])
+        self.assertIsInstance(innerBlock.instructions.instructions, ASGNodeWithInterpretableInstructions)
+
+    def testConcurrentFirstCalls(self):
+        block = self.compileSourceString('[:a | {a}]').evaluateWithArguments()
+        initialScheduledInstructionCount = ASGNodeWithInterpretableInstructions.scheduledInstructionCount
+        barrier = threading.Barrier(4)
+        results = []
+        def compileBlock():
+            barrier.wait()
+            results.append(block.instructions.getInstructions())
+        threads = list(map(lambda i: threading.Thread(target = compileBlock), range(4)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(instructions is results[0] for instructions in results))
+        self.assertEqual(ASGNodeWithInterpretableInstructions.scheduledInstructionCount - initialScheduledInstructionCount, len(results[0].instructions))
+        self.assertEqual(block(1), [1])
+
+    def testConcurrentCalls(self):
+        # The pool yields to the other threads whenever it is inspected, so that the threads interleave inside the pooling of the activation contexts.
+        class InterleavingPool(list):
+            def __len__(self) -> int:
+                time.sleep(0)
+                return super().__len__()
+
+            def __getitem__(self, index):
+                time.sleep(0)
+                return super().__getitem__(index)
+
+        block = self.compileSourceString('[:a | {a. {a}}]').evaluateWithArguments()
+        instructions = block.instructions.getInstructions()
+        instructions.freeActivationContexts = InterleavingPool()
+        barrier = threading.Barrier(4)
+        failures = []
+        def callBlock(threadIndex):
+            barrier.wait()
+            try:
+                for i in range(1000):
+                    value = (threadIndex, i)
+                    result = block(value)
+                    if result != [value, [value]]:
+                        failures.append(result)
+            except Exception as exception:
+                failures.append(exception)
+        threads = list(map(lambda i: threading.Thread(target = callBlock, args = (i,)), range(4)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+
+class TestInterpreterProfiler(ASGCompilationTestMixin, unittest.TestCase):
+    def testProfileCounts(self):
+        script = self.compileSourceString('[:f | {f value: 1. f value: 2}] value: [:x | {x}]')
+        profiler = ASGInterpreterProfiler()
+        profiler.start()
+        try:
+            self.assertEqual(script.evaluateWithArguments(), [[1], [2]])
+        finally:
+            profiler.stop()
+
+        blockCallCounts = sorted(map(lambda profile: profile.callCount, profiler.blockProfiles.values()))
+        self.assertEqual(blockCallCounts, [1, 1, 2])
+        self.assertTrue(all(profile.getSourcePosition().startLine == 1 for profile in profiler.instructionProfiles.values()))
+        self.assertEqual(len(profiler.callTree.children), 1)
+        for line in profiler.collapsedStacks().splitlines():
+            self.assertTrue(line.startswith('script '))
+        self.assertIs(ASGNodeWithInterpretableInstructions.activationContextClass, ASGNodeInterpreterActivationContext)
+
+    def testPooledContextsAcrossProfiling(self):
+        block = self.compileSourceString('[:a | {a}]').evaluateWithArguments()
+        self.assertEqual(block(1), [1])
+        profiler = ASGInterpreterProfiler()
+        profiler.start()
+        try:
+            self.assertEqual(block(2), [2])
+            self.assertEqual(block(3), [3])
+        finally:
+            profiler.stop()
+        self.assertEqual(block(4), [4])
+
+        blockProfiles = list(profiler.blockProfiles.values())
+        self.assertEqual(len(blockProfiles), 1)
+        self.assertEqual(blockProfiles[0].callCount, 2)
+
+class TestSamplingProfiler(ASGCompilationTestMixin, unittest.TestCase):
+    def testSamplesPerSourceLine(self):
+        block = self.compileSourceString('[:f | {\nf value: 1.\nf value: 2}]').evaluateWithArguments()
+        profiler = ASGSamplingProfiler(0.0005)
+        profiler.start()
+        try:
+            while profiler.sampleCount < 10:
+                block(lambda x: sum(range(1000)))
+        finally:
+            profiler.stop()
+
+        sampledLines = set(map(lambda samples: samples.line, profiler.lineSamples.values()))
+        self.assertTrue(sampledLines.issubset({1, 2, 3}))
+        self.assertTrue(2 in sampledLines or 3 in sampledLines)
+        self.assertIn('<string>:', profiler.report())
+
+class TestAnalysisProfiler(ASGCompilationTestMixin, unittest.TestCase):
+    def testPatternAndBuilderCounts(self):
+        originalUnifyChildNode = ASGBuilderWithGVN.unifyChildNode
+        profiler = ASGAnalysisProfiler()
+        profiler.start()
+        try:
+            self.compileSourceString('[:x | {#a. #a. x}] value: #a')
+        finally:
+            profiler.stop()
+        self.assertIs(ASGBuilderWithGVN.unifyChildNode, originalUnifyChildNode)
+
+        profiles = dict(map(lambda profile: (profile.name, profile), profiler.patternProfiles.values()))
+        self.assertEqual(profiles['ASGExpansionAndAnalysisAlgorithm.expandSyntaxBlockNode'].invocationCount, 1)
+        self.assertEqual(profiles['ASGExpansionAndAnalysisAlgorithm.expandSyntaxApplicationNode'].invocationCount, 1)
+        self.assertGreater(sum(map(lambda profile: profile.memoHitCount, profiles.values())), 0)
+
+        builderProfile = profiler.builderProfiles[ASGBuilderWithGVNAndEnvironment]
+        self.assertGreater(builderProfile.lookupCount, 0)
+        self.assertGreater(builderProfile.hitCount, 0)
+        self.assertGreaterEqual(builderProfile.maxScopeDepth, 1)
+        self.assertIn('expandSyntaxBlockNode', profiler.report())
+
+if __name__ == '__main__':
+    unittest.main()
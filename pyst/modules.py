@@ -0,0 +1,120 @@
+import os
+from .interpreter import ASGNodeWithInterpretableInstructions
+from .image import ImageExtension, ImageFormatError, ImageUnsupportedValue, encodeInstructionsImage, loadInstructionsImageFromFileNamed
+
+ModuleImageCacheDirectoryName = '__pystcache__'
+
+class ModuleLoadingError(Exception):
+    pass
+
+class ASGModuleLoader:
+    """
+    Resolves the required modules through the include directories. Each module is analyzed and evaluated once per process, and its scheduled instructions are cached in a module image next to its source.
+    """
+    uniqueInstance_ = None
+
+    def __init__(self, includeDirectories: list[str] = None) -> None:
+        self.includeDirectories = list(includeDirectories or [])
+        self.useModuleImages = True
+        self.loadedModules = {}
+        self.modulesBeingLoaded = set()
+        self.analyzedModuleCount = 0
+        self.loadedModuleImageCount = 0
+
+    @classmethod
+    def uniqueInstance(cls):
+        if cls.uniqueInstance_ is None:
+            cls.uniqueInstance_ = cls()
+
+        return cls.uniqueInstance_
+
+    def resolveModuleNamed(self, name: str) -> str:
+        fileName = name
+        if not fileName.endswith('.st'):
+            fileName += '.st'
+
+        for includeDirectory in self.includeDirectories:
+            modulePath = os.path.join(includeDirectory, fileName)
+            if os.path.isfile(modulePath):
+                return os.path.realpath(modulePath)
+        raise ModuleLoadingError('Failed to find module %s in the include directories.' % name)
+
+    def requireModuleNamed(self, name: str):
+        modulePath = self.resolveModuleNamed(name)
+        if modulePath in self.loadedModules:
+            return self.loadedModules[modulePath]
+        if modulePath in self.modulesBeingLoaded:
+            raise ModuleLoadingError('Circular dependency while loading module %s.' % name)
+
+        self.modulesBeingLoaded.add(modulePath)
+        try:
+            instructions = self.loadModuleInstructions(modulePath)
+            moduleValue = instructions.evaluateWithArguments()
+        finally:
+            self.modulesBeingLoaded.remove(modulePath)
+
+        self.loadedModules[modulePath] = moduleValue
+        return moduleValue
+
+    def moduleImageFileNameFor(self, modulePath: str) -> str:
+        moduleName = os.path.splitext(os.path.basename(modulePath))[0]
+        return os.path.join(os.path.dirname(modulePath), ModuleImageCacheDirectoryName, moduleName + ImageExtension)
+
+    def loadModuleInstructions(self, modulePath: str) -> ASGNodeWithInterpretableInstructions:
+        sourceStat = os.stat(modulePath)
+        if self.useModuleImages:
+            instructions = self.readModuleImage(modulePath, sourceStat.st_size, sourceStat.st_mtime_ns)
+            if instructions is not None:
+                self.loadedModuleImageCount += 1
+                return instructions
+
+        instructions = self.compileModuleFileNamed(modulePath)
+        if self.useModuleImages:
+            self.writeModuleImage(modulePath, instructions, sourceStat.st_size, sourceStat.st_mtime_ns)
+        return instructions
+
+    def readModuleImage(self, modulePath: str, sourceSize: int, sourceModificationTime: int) -> ASGNodeWithInterpretableInstructions | None:
+        imageFileName = self.moduleImageFileNameFor(modulePath)
+        try:
+            return loadInstructionsImageFromFileNamed(imageFileName, sourceSize, sourceModificationTime)
+        except (OSError, ValueError, ImageFormatError):
+            return None
+
+    def writeModuleImage(self, modulePath: str, instructions: ASGNodeWithInterpretableInstructions, sourceSize: int, sourceModificationTime: int):
+        try:
+            data = encodeInstructionsImage(instructions, sourceSize, sourceModificationTime)
+        except ImageUnsupportedValue:
+            return
+
+        # The image is only cache, so failing to write it is not an error.
+        imageFileName = self.moduleImageFileNameFor(modulePath)
+        temporaryImageFileName = imageFileName + '.%d.tmp' % os.getpid()
+        try:
+            os.makedirs(os.path.dirname(imageFileName), exist_ok = True)
+            with open(temporaryImageFileName, 'wb') as f:
+                f.write(data)
+            os.replace(temporaryImageFileName, imageFileName)
+        except OSError:
+            pass
+
+    def compileModuleFileNamed(self, modulePath: str) -> ASGNodeWithInterpretableInstructions:
+        from .syntax import parseFileNamedIntoSyntax
+        from .analysis import expandAndAnalyze
+        from .optimization import optimizeTopLevelScript
+        from .environment import makeScriptAnalysisEnvironment
+        from .gcm import topLevelScriptGCM
+
+        asgSyntax, syntaxErrors = parseFileNamedIntoSyntax(modulePath)
+        if len(syntaxErrors) != 0:
+            raise ModuleLoadingError('\n'.join(map(lambda errorNode: errorNode.prettyPrintError(), syntaxErrors)))
+
+        asgAnalyzed, asgAnalysisErrors = expandAndAnalyze(makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), modulePath), asgSyntax)
+        if len(asgAnalysisErrors) != 0:
+            raise ModuleLoadingError('\n'.join(map(lambda error: error.prettyPrintError(), asgAnalysisErrors)))
+
+        asgOptimized, removedNodeCount = optimizeTopLevelScript(asgAnalyzed)
+        self.analyzedModuleCount += 1
+        return topLevelScriptGCM(asgOptimized).asInterpretableInstructions()
+
+def requireModuleNamed(name: str):
+    return ASGModuleLoader.uniqueInstance().requireModuleNamed(name)
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from .modules import *
+from .testing import ASGCompilationTestMixin
+
+class TestModuleLoader(ASGCompilationTestMixin, unittest.TestCase):
+    def setUp(self) -> None:
+        self.moduleDirectory = tempfile.TemporaryDirectory()
+        self.writeModule('pair', '[:first :second | {first. second}]')
+        self.writeModule('swappedPair', '[:first :second | (require: #pair) value: second value: first]')
+
+    def tearDown(self) -> None:
+        self.moduleDirectory.cleanup()
+
+    def writeModule(self, name: str, source: str):
+        with open(os.path.join(self.moduleDirectory.name, name + '.st'), 'w') as f:
+            f.write(source)
+
+    def makeLoader(self) -> ASGModuleLoader:
+        return ASGModuleLoader([self.moduleDirectory.name])
+
+    def testModuleIsAnalyzedOnce(self):
+        loader = self.makeLoader()
+        pair = loader.requireModuleNamed('pair')
+        self.assertEqual(pair(1, 2), [1, 2])
+        self.assertIs(loader.requireModuleNamed('pair'), pair)
+        self.assertEqual(loader.analyzedModuleCount, 1)
+
+    def testModuleImageIsLoaded(self):
+        self.makeLoader().requireModuleNamed('pair')
+        self.assertTrue(os.path.isfile(os.path.join(self.moduleDirectory.name, ModuleImageCacheDirectoryName, 'pair' + ImageExtension)))
+
+        loader = self.makeLoader()
+        self.assertEqual(loader.requireModuleNamed('pair')(3, 4), [3, 4])
+        self.assertEqual(loader.analyzedModuleCount, 0)
+        self.assertEqual(loader.loadedModuleImageCount, 1)
+
+    def testOutdatedModuleImageIsIgnored(self):
+        self.makeLoader().requireModuleNamed('pair')
+        self.writeModule('pair', '[:first :second | {second. first}]')
+        modulePath = os.path.join(self.moduleDirectory.name, 'pair.st')
+        sourceStat = os.stat(modulePath)
+        os.utime(modulePath, ns = (sourceStat.st_atime_ns, sourceStat.st_mtime_ns + 1000000000))
+
+        loader = self.makeLoader()
+        self.assertEqual(loader.requireModuleNamed('pair')(1, 2), [2, 1])
+        self.assertEqual(loader.analyzedModuleCount, 1)
+
+    def testMissingModule(self):
+        self.assertRaises(ModuleLoadingError, self.makeLoader().requireModuleNamed, 'missing')
+
+    def testRequireFromScript(self):
+        loader = self.makeLoader()
+        ASGModuleLoader.uniqueInstance_, previousLoader = loader, ASGModuleLoader.uniqueInstance_
+        try:
+            self.assertEqual(self.compileSourceString('(require: #swappedPair) value: 1 value: 2').evaluateWithArguments(), [2, 1])
+            self.assertEqual(loader.analyzedModuleCount, 2)
+        finally:
+            ASGModuleLoader.uniqueInstance_ = previousLoader
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,8 @@ import copy
 import struct
 
 class ASGNodeDerivation(ABC):
+    recordsProvenance = True
+
     @abstractmethod
     def getSourcePosition(self) -> SourcePosition:
         pass
@@ -12,6 +14,9 @@ class ASGNodeDerivation(ABC):
     def getSourceNodeDerivations(self):
         return ()
 
+    def asRecordedDerivation(self):
+        return self
+
 class ASGNodeSourceCodeDerivation(ASGNodeDerivation):
     def __init__(self, sourcePosition: SourcePosition) -> None:
         super().__init__()
@@ -36,6 +41,12 @@ class ASGNodeExpansionDerivation(ASGNodeDerivation):
     def getSourceNodeDerivations(self):
         return (self.sourceNode,)
 
+    def asRecordedDerivation(self):
+        # Without provenance, the node shares the source position derivation of its source node instead of referencing it.
+        if ASGNodeDerivation.recordsProvenance:
+            return self
+        return self.sourceNode.sourceDerivation.asRecordedDerivation()
+
 class ASGNodeUnificationDerivation(ASGNodeDerivation):
     def __init__(self, originalNode, unifiedNode) -> None:
         super().__init__()
@@ -52,6 +63,11 @@ class ASGNodeUnificationDerivation(ASGNodeDerivation):
     def getSourceNodeDerivations(self):
         return (self.originalNode,)
 
+    def asRecordedDerivation(self):
+        if ASGNodeDerivation.recordsProvenance:
+            return self
+        return self.originalNode.sourceDerivation.asRecordedDerivation()
+
 class ASGNodeSyntaxExpansionDerivation(ASGNodeExpansionDerivation):
     pass
 
@@ -183,10 +199,11 @@ class ASGNodeConstructionAttributeWithSourceDerivation(ASGNodeConstructionAttrib
         self.sourceDerivationStorageName = '_' + name + '_sourceDerivation'
 
     def loadSourceDerivationFrom(self, instance):
-        return getattr(instance, self.sourceDerivationStorageName)
+        return getattr(instance, self.sourceDerivationStorageName, None)
 
     def storeSourceDerivationIn(self, sourceDerivation, instance):
-        return setattr(instance, self.sourceDerivationStorageName, sourceDerivation)
+        if ASGNodeDerivation.recordsProvenance:
+            setattr(instance, self.sourceDerivationStorageName, sourceDerivation)
 
     def initializeWithConstructorValueOn(self, constructorValue, instance):
         self.storeValueIn(constructorValue.asASGNode(), instance)
@@ -238,6 +255,9 @@ class ASGNodeSourceDerivationAttribute(ASGNodeConstructionAttribute):
     def isComparedForUnification(self) -> bool:
         return False
 
+    def initializeWithConstructorValueOn(self, constructorValue, instance):
+        self.storeValueIn(constructorValue.asRecordedDerivation(), instance)
+
     def getNodeDerivationsOf(self, instance):
         return self.loadValueFrom(instance).getSourceNodeDerivations()
     
@@ -445,6 +465,9 @@ class ASGNodeDataAndSequencingInputPorts(ASGNodeConstructionAttributeWithSourceD
 
         return True
     
+def setProvenanceRecordingEnabled(enabled: bool):
+    ASGNodeDerivation.recordsProvenance = enabled
+
 class ASGNodeMetaclass(type):
     def __new__(cls, name, bases, attributes):
         descriptors = []
@@ -491,11 +514,14 @@ class ASGNodeMetaclass(type):
         return nodeClass
 
 class ASGNode(metaclass = ASGNodeMetaclass):
+    betaReplaceableDependencyMaskTable = {}
+    betaReplaceableDependencyMaskTableLimit = 4096
+
     def __init__(self, *positionalArguments, **kwArguments) -> None:
         super().__init__()
 
         self.__hashValueCache__ = None
-        self.__betaReplaceableDependencies__ = None
+        self.__betaReplaceableDependencyMask__ = None
         self.__dominanceTreeDepth__ = None
         self.__constantDataNodeCache__ = None
 
@@ -728,19 +754,28 @@ class ASGNode(metaclass = ASGNodeMetaclass):
     def isKindOf(self, kind):
         return isinstance(self, kind)
 
-    def betaReplaceableDependencies(self):
-        if self.__betaReplaceableDependencies__ is not None:
-            return self.__betaReplaceableDependencies__
-        
-        self.__betaReplaceableDependencies__ = set()
-        if self.isBetaReplaceableNode():
-            self.__betaReplaceableDependencies__.add(self)
+    def betaReplaceableBit(self) -> int:
+        return 0
 
+    def betaReplaceableDependencyMask(self) -> int:
+        if self.__betaReplaceableDependencyMask__ is not None:
+            return self.__betaReplaceableDependencyMask__
+
+        mask = self.betaReplaceableBit()
         for dependency in self.allDependencies():
-            if dependency not in self.__betaReplaceableDependencies__:
-                for element in dependency.betaReplaceableDependencies():
-                    self.__betaReplaceableDependencies__.add(element)
-        return self.__betaReplaceableDependencies__
+            mask |= dependency.betaReplaceableDependencyMask()
+
+        # Identical masks are shared between the nodes. The sharing table is bounded, so that it does not grow across the compilations of a long-lived process.
+        maskTable = ASGNode.betaReplaceableDependencyMaskTable
+        sharedMask = maskTable.get(mask, None)
+        if sharedMask is None:
+            if len(maskTable) >= ASGNode.betaReplaceableDependencyMaskTableLimit:
+                maskTable.clear()
+            maskTable[mask] = mask
+            sharedMask = mask
+
+        self.__betaReplaceableDependencyMask__ = sharedMask
+        return sharedMask
 
     def appendInFlattenedList(self, list: list):
         list.append(self)
@@ -763,6 +798,12 @@ class ASGNode(metaclass = ASGNodeMetaclass):
 
     def isBlockInstanceNode(self) -> bool:
         return False
+
+    def isLiteralPrimitiveFunction(self) -> bool:
+        return False
+
+    def isBlockDefinitionNode(self) -> bool:
+        return False
     
     def isConstructionDataNode(self):
         return False
@@ -783,8 +824,9 @@ class ASGNode(metaclass = ASGNodeMetaclass):
 
         return self.__constantDataNodeCache__
 
-    def interpretInContext(self, context, parameters):
-        raise Exception('Cannot interpret %s.' % self.printNameWithDataAttributes())
+    def asInterpretableInstruction(self):
+        from .interpreter import ASGUninterpretableInstruction
+        return ASGUninterpretableInstruction(self.printNameWithDataAttributes())
 
 class ASGUnificationComparisonNode:
     def __init__(self, node) -> None:
@@ -931,10 +973,18 @@ class ASGDynamicProgrammingAlgorithmNodeExpansionResult:
         return resultValue
     
 class ASGBuilderWithGVN:
+    """
+    Unifies the pure data nodes with the equal nodes built by itself or by its parent builders.
+    Each builder only keeps the nodes that it built, keyed by nodes whose inputs were unified in the same scope chain, so the probes compare them shallowly.
+    """
+    builtNodeCount = 0
+    unificationHitCount = 0
+
     def __init__(self, parentBuilder) -> None:
         self.parentBuilder: ASGBuilderWithGVN = parentBuilder
         self.builtNodes = {}
         self.currentPredecessor = None
+        self.scopeDepth = parentBuilder.scopeDepth + 1 if parentBuilder is not None else 0
 
     def memento(self):
         return self.currentPredecessor
@@ -952,18 +1002,19 @@ class ASGBuilderWithGVN:
         comparisonNode = ASGUnificationComparisonNode(node)
         unifiedNode = self.unifyChildNode(comparisonNode)
         if unifiedNode is not None:
+            ASGBuilderWithGVN.unificationHitCount += 1
             return ASGUnifiedNodeValue(unifiedNode.node, ASGNodeUnificationDerivation(node, unifiedNode.node))
         
         self.builtNodes[comparisonNode] = comparisonNode
         return node
     
     def unifyChildNode(self, node: ASGNode):
-        unified = self.builtNodes.get(node, None)
-        if unified is not None:
-            return unified
-
-        if self.parentBuilder is not None:
-            return self.parentBuilder.unifyChildNode(node)
+        builder = self
+        while builder is not None:
+            unified = builder.builtNodes.get(node, None)
+            if unified is not None:
+                return unified
+            builder = builder.parentBuilder
         return None
     
     def updatePredecessorWith(self, node: ASGNode):
@@ -973,6 +1024,7 @@ class ASGBuilderWithGVN:
 
     def build(self, kind, *arguments, **kwArguments) -> ASGNode | ASGUnifiedNodeValue:
         builtNode = kind(*arguments, **kwArguments)
+        ASGBuilderWithGVN.builtNodeCount += 1
         return self.updatePredecessorWith(self.unifyWithPreviousBuiltNode(builtNode))
     
     def forSyntaxExpansionBuild(self, expansionAlgorithm, syntaxNode, kind, *arguments, **kwArguments):
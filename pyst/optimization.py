@@ -0,0 +1,353 @@
+from .mop import *
+from .asg import *
+from .analysis import ASGBetaSubstitutionContext, ASGBetaSubstitutionAlgorithm
+from .environment import ValueSelectors
+from enum import Enum
+
+class ASGInlinedApplicationValue:
+    def __init__(self, value: ASGNode, exitPredecessor: ASGNode) -> None:
+        self.value = value
+        self.exitPredecessor = exitPredecessor
+
+    def asASGNode(self) -> ASGNode:
+        return self.value
+
+    def asASGNodeDerivation(self) -> ASGNodeDerivation:
+        return self.value.asASGNodeDerivation()
+
+    def asASGDataNode(self):
+        return self.value.asASGDataNode()
+
+    def asASGDataNodeDerivation(self):
+        return self.value.asASGDataNodeDerivation()
+
+    def asASGSequencingNode(self):
+        if self.exitPredecessor is None:
+            return None
+        return self.exitPredecessor.asASGSequencingNode()
+
+    def asASGSequencingNodeDerivation(self):
+        if self.exitPredecessor is None:
+            return None
+        return self.exitPredecessor.asASGSequencingNodeDerivation()
+
+    def isSequencingNode(self):
+        return self.exitPredecessor is not None
+
+class ASGGraphRewritingAlgorithm(ASGDynamicProgrammingAlgorithm):
+    """
+    Base class for the passes that rebuild an analyzed graph, sharing the unchanged nodes.
+    """
+    def markAsProcessed(self, node):
+        if node is not None and node not in self.processedNodes:
+            self.setValueForNodeExpansion(node, node)
+
+    def postProcessResult(self, result):
+        # The result of a pattern is already in its rewritten form.
+        if isinstance(result, ASGInlinedApplicationValue):
+            self.markAsProcessed(result.value)
+            self.markAsProcessed(result.exitPredecessor)
+        else:
+            self.markAsProcessed(result)
+        return result
+
+    def rewriteAttribute(self, attribute):
+        if isinstance(attribute, ASGNode):
+            return self(attribute)
+        elif isinstance(attribute, tuple):
+            return tuple(map(self.rewriteAttribute, attribute))
+        else:
+            return attribute
+
+    def rewriteGenericNodeRecursively(self, node: ASGNode):
+        nodeAttributes = node.getAllConstructionAttributes()
+        rewrittenAttributes = []
+        hasRewrittenAttribute = False
+        for attribute in nodeAttributes:
+            rewrittenAttribute = self.rewriteAttribute(attribute)
+            hasRewrittenAttribute = hasRewrittenAttribute or rewrittenAttribute is not attribute
+            rewrittenAttributes.append(rewrittenAttribute)
+
+        if hasRewrittenAttribute:
+            return node.__class__(*rewrittenAttributes)
+        else:
+            return node
+
+    def rewriteRegionsOf(self, exitPoint: ASGNode):
+        # Visit the regions in order to avoid recursing through the whole sequencing chain.
+        for region in asgPredecessorTopo(exitPoint):
+            self(region)
+
+    @asgPatternMatchingOnNodeKind(ASGBlockDefinitionNode)
+    def rewriteBlockDefinitionNode(self, node: ASGBlockDefinitionNode):
+        self.rewriteRegionsOf(node.exitPoint)
+        return self.rewriteGenericNodeRecursively(node)
+
+    @asgPatternMatchingOnNodeKind(ASGTopLevelScriptNode)
+    def rewriteTopLevelScriptNode(self, node: ASGTopLevelScriptNode):
+        self.rewriteRegionsOf(node.exitPoint)
+        return self.rewriteGenericNodeRecursively(node)
+
+    @asgPatternMatchingOnNodeKind(ASGNode)
+    def rewriteGenericNode(self, node: ASGNode):
+        return self.rewriteGenericNodeRecursively(node)
+
+class ASGBlockInliningAlgorithm(ASGGraphRewritingAlgorithm):
+    """
+    Replaces the applications of literal blocks by the beta substitution of their bodies at the call site.
+    """
+    def __init__(self, maxInlinedBodySize: int = 64, maxInliningDepth: int = 4, inliningDepth: int = 0, processedNodes: dict = None) -> None:
+        super().__init__()
+        self.maxInlinedBodySize = maxInlinedBodySize
+        self.maxInliningDepth = maxInliningDepth
+        self.inliningDepth = inliningDepth
+        if processedNodes is not None:
+            self.processedNodes = processedNodes
+
+    def withIncrementedInliningDepth(self):
+        return ASGBlockInliningAlgorithm(self.maxInlinedBodySize, self.maxInliningDepth, self.inliningDepth + 1, self.processedNodes)
+
+    def canInlineApplicationOf(self, functional: ASGNode, argumentCount: int) -> bool:
+        if self.inliningDepth >= self.maxInliningDepth:
+            return False
+        if not functional.isBlockInstanceNode() or not functional.definition.isBlockDefinitionNode():
+            return False
+
+        definition: ASGBlockDefinitionNode = functional.definition
+        return len(definition.arguments) == argumentCount and definition.bodySize() <= self.maxInlinedBodySize
+
+    def inlineApplicationOf(self, blockInstance: ASGBlockInstanceNode, arguments, predecessor) -> ASGInlinedApplicationValue:
+        definition: ASGBlockDefinitionNode = blockInstance.definition
+        substitutionContext = ASGBetaSubstitutionContext()
+        substitutionContext.setSubstitutionForNode(definition.entryPoint, predecessor)
+        for i in range(len(definition.arguments)):
+            substitutionContext.setSubstitutionForNode(definition.arguments[i], arguments[i])
+        for i in range(len(definition.captures)):
+            substitutionContext.setSubstitutionForNode(definition.captures[i], blockInstance.captures[i])
+
+        substitutedReturn = ASGBetaSubstitutionAlgorithm(substitutionContext, ASGBuilderWithGVN(None))(definition.exitPoint)
+        inlinedReturn: ASGSequenceReturnNode = self.withIncrementedInliningDepth()(substitutedReturn)
+        return ASGInlinedApplicationValue(inlinedReturn.value, inlinedReturn.predecessor)
+
+    def attemptToInlineApplication(self, node: ASGNode, functional: ASGNode, arguments: list[ASGNode]):
+        if not self.canInlineApplicationOf(functional, len(arguments)):
+            return None
+
+        predecessor = self(node.predecessor) if node.predecessor is not None else None
+        if predecessor is not None:
+            predecessor = predecessor.asASGSequencingNode()
+        return self.inlineApplicationOf(functional, arguments, predecessor)
+
+    @asgPatternMatchingOnNodeKind(ASGFxApplicationNode)
+    def inlineFxApplicationNode(self, node: ASGFxApplicationNode):
+        functional = self(node.functional).asASGDataNode()
+        arguments = list(map(lambda argument: self(argument).asASGDataNode(), node.arguments))
+        inlinedApplication = self.attemptToInlineApplication(node, functional, arguments)
+        if inlinedApplication is not None:
+            return inlinedApplication
+        return self.rewriteGenericNodeRecursively(node)
+
+    @asgPatternMatchingOnNodeKind(ASGFxMessageSendNode)
+    def inlineFxMessageSendNode(self, node: ASGFxMessageSendNode):
+        selector = self(node.selector).asASGDataNode()
+        if selector.isLiteralSymbolNode() and selector.value in ValueSelectors:
+            receiver = self(node.receiver).asASGDataNode()
+            arguments = list(map(lambda argument: self(argument).asASGDataNode(), node.arguments))
+            inlinedApplication = self.attemptToInlineApplication(node, receiver, arguments)
+            if inlinedApplication is not None:
+                return inlinedApplication
+        return self.rewriteGenericNodeRecursively(node)
+
+ASGBlockEscapeKind = Enum('ASGBlockEscapeKind', ['NON_ESCAPING', 'LOCALLY_INVOKED', 'ESCAPING'])
+
+class ASGBlockEscapeAnalysis:
+    """
+    Classifies the block instances according to the uses of their closures.
+    """
+    def __init__(self) -> None:
+        self.blockInstanceUsers = {}
+        self.escapeKinds = {}
+
+    def analyzeNode(self, node: ASGNode):
+        visited = set()
+        pendingNodes = [node]
+        while len(pendingNodes) != 0:
+            node = pendingNodes.pop()
+            if node in visited:
+                continue
+
+            visited.add(node)
+            for dependency in node.dataDependencies():
+                if dependency.isBlockInstanceNode():
+                    self.blockInstanceUsers.setdefault(dependency, set()).add(node)
+            pendingNodes += node.allDependencies()
+        return self
+
+    def isDirectInvocationOf(self, user: ASGNode, blockInstance: ASGBlockInstanceNode) -> bool:
+        if user.isKindOf(ASGFxApplicationNode):
+            functional = user.functional
+        elif user.isKindOf(ASGFxMessageSendNode) and user.selector.isLiteralSymbolNode() and user.selector.value in ValueSelectors:
+            functional = user.receiver
+        else:
+            return False
+
+        if functional is not blockInstance or blockInstance in user.arguments:
+            return False
+        return blockInstance.definition.isBlockDefinitionNode() and len(blockInstance.definition.arguments) == len(user.arguments)
+
+    def escapeKindOf(self, blockInstance: ASGBlockInstanceNode) -> ASGBlockEscapeKind:
+        if blockInstance in self.escapeKinds:
+            return self.escapeKinds[blockInstance]
+
+        users = self.blockInstanceUsers.get(blockInstance, ())
+        if len(users) == 0:
+            escapeKind = ASGBlockEscapeKind.NON_ESCAPING
+        elif all(self.isDirectInvocationOf(user, blockInstance) for user in users):
+            escapeKind = ASGBlockEscapeKind.LOCALLY_INVOKED
+        else:
+            escapeKind = ASGBlockEscapeKind.ESCAPING
+        self.escapeKinds[blockInstance] = escapeKind
+        return escapeKind
+
+class ASGNonEscapingBlockApplicationAlgorithm(ASGGraphRewritingAlgorithm):
+    """
+    Replaces the applications of locally invoked blocks by direct applications of their definitions, without materializing closures.
+    """
+    def __init__(self, escapeAnalysis: ASGBlockEscapeAnalysis) -> None:
+        super().__init__()
+        self.escapeAnalysis = escapeAnalysis
+
+    def attemptToApplyDirectly(self, node: ASGNode, functional: ASGNode):
+        if not functional.isBlockInstanceNode() or self.escapeAnalysis.escapeKindOf(functional) != ASGBlockEscapeKind.LOCALLY_INVOKED:
+            return None
+
+        definition = self(functional.definition)
+        captures = tuple(map(self, functional.captures))
+        arguments = tuple(map(self, node.arguments))
+        predecessor = self(node.predecessor) if node.predecessor is not None else None
+        return ASGFxBlockApplicationNode(node.sourceDerivation, definition, captures, arguments, predecessor = predecessor)
+
+    @asgPatternMatchingOnNodeKind(ASGFxApplicationNode)
+    def rewriteFxApplicationNode(self, node: ASGFxApplicationNode):
+        directApplication = self.attemptToApplyDirectly(node, node.functional)
+        if directApplication is not None:
+            return directApplication
+        return self.rewriteGenericNodeRecursively(node)
+
+    @asgPatternMatchingOnNodeKind(ASGFxMessageSendNode)
+    def rewriteFxMessageSendNode(self, node: ASGFxMessageSendNode):
+        directApplication = self.attemptToApplyDirectly(node, node.receiver)
+        if directApplication is not None:
+            return directApplication
+        return self.rewriteGenericNodeRecursively(node)
+
+class ASGDeadCodeEliminationAlgorithm(ASGGraphRewritingAlgorithm):
+    """
+    Removes the applications of pure functionals whose results are not used. The unused data nodes are dropped with them.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.reachedNodes = set()
+        self.liveNodes = set()
+        self.pureBlockDefinitions = {}
+
+    def isPureBlockDefinition(self, definition: ASGBlockDefinitionNode) -> bool:
+        if definition in self.pureBlockDefinitions:
+            return self.pureBlockDefinitions[definition]
+
+        isPure = True
+        visited = set()
+        pendingNodes = [definition.exitPoint]
+        while isPure and len(pendingNodes) != 0:
+            node = pendingNodes.pop()
+            if node in visited:
+                continue
+
+            visited.add(node)
+            if node.isKindOf(ASGSequencingAndDataNode):
+                isPure = False
+            pendingNodes += node.sequencingDependencies()
+        self.pureBlockDefinitions[definition] = isPure
+        return isPure
+
+    def isPureFunctional(self, functional: ASGNode, argumentCount: int) -> bool:
+        if functional.isLiteralPrimitiveFunction():
+            return functional.pure
+        if functional.isBlockInstanceNode():
+            functional = functional.definition
+        if not functional.isBlockDefinitionNode():
+            return False
+        return len(functional.arguments) == argumentCount and self.isPureBlockDefinition(functional)
+
+    def isRemovableNode(self, node: ASGNode) -> bool:
+        if node.isKindOf(ASGFxApplicationNode):
+            return self.isPureFunctional(node.functional, len(node.arguments))
+        elif node.isKindOf(ASGFxMessageSendNode):
+            return node.selector.isLiteralSymbolNode() and node.selector.value in ValueSelectors and self.isPureFunctional(node.receiver, len(node.arguments))
+        elif node.isKindOf(ASGFxBlockApplicationNode):
+            return self.isPureFunctional(node.definition, len(node.arguments))
+        return False
+
+    def computeLiveNodes(self, node: ASGNode):
+        # Nodes are reached through the sequencing chains, and they are live when their values are used or when they have effects.
+        pendingNodes = [(node, False)]
+        while len(pendingNodes) != 0:
+            node, isUsed = pendingNodes.pop()
+            if node not in self.reachedNodes:
+                self.reachedNodes.add(node)
+                for dependency in node.sequencingDependencies():
+                    pendingNodes.append((dependency, False))
+                isUsed = isUsed or (node.isSequencingNode() and not self.isRemovableNode(node))
+
+            if isUsed and node not in self.liveNodes:
+                self.liveNodes.add(node)
+                for dependency in node.dataDependencies():
+                    pendingNodes.append((dependency, True))
+
+    def isDeadNode(self, node: ASGNode) -> bool:
+        return node not in self.liveNodes and node.predecessor is not None and self.isRemovableNode(node)
+
+    def removeDeadNode(self, node: ASGNode):
+        if self.isDeadNode(node):
+            return self(node.predecessor)
+        return self.rewriteGenericNodeRecursively(node)
+
+    @asgPatternMatchingOnNodeKind(ASGFxApplicationNode)
+    def removeDeadFxApplicationNode(self, node: ASGFxApplicationNode):
+        return self.removeDeadNode(node)
+
+    @asgPatternMatchingOnNodeKind(ASGFxMessageSendNode)
+    def removeDeadFxMessageSendNode(self, node: ASGFxMessageSendNode):
+        return self.removeDeadNode(node)
+
+    @asgPatternMatchingOnNodeKind(ASGFxBlockApplicationNode)
+    def removeDeadFxBlockApplicationNode(self, node: ASGFxBlockApplicationNode):
+        return self.removeDeadNode(node)
+
+def countReachableNodes(node: ASGNode) -> int:
+    visited = set()
+    pendingNodes = [node]
+    while len(pendingNodes) != 0:
+        node = pendingNodes.pop()
+        if node in visited:
+            continue
+
+        visited.add(node)
+        pendingNodes += node.allDependencies()
+    return len(visited)
+
+def inlineBlockApplications(node: ASGTopLevelScriptNode) -> ASGTopLevelScriptNode:
+    return ASGBlockInliningAlgorithm()(node)
+
+def applyNonEscapingBlocksDirectly(node: ASGTopLevelScriptNode) -> ASGTopLevelScriptNode:
+    return ASGNonEscapingBlockApplicationAlgorithm(ASGBlockEscapeAnalysis().analyzeNode(node))(node)
+
+def eliminateDeadCode(node: ASGTopLevelScriptNode) -> tuple[ASGTopLevelScriptNode, int]:
+    algorithm = ASGDeadCodeEliminationAlgorithm()
+    algorithm.computeLiveNodes(node)
+    result = algorithm(node)
+    return result, countReachableNodes(node) - countReachableNodes(result)
+
+def optimizeTopLevelScript(node: ASGTopLevelScriptNode) -> tuple[ASGTopLevelScriptNode, int]:
+    result, removedNodeCount = eliminateDeadCode(inlineBlockApplications(node))
+    return applyNonEscapingBlocksDirectly(result), removedNodeCount
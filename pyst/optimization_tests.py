@@ -0,0 +1,158 @@
+import unittest
+from .visualizations import asgTopoSort
+from .optimization import *
+from .testing import ASGCompilationTestMixin
+
+class OptimizationTestCase(ASGCompilationTestMixin, unittest.TestCase):
+    def evaluateScript(self, script: ASGTopLevelScriptNode):
+        return self.compileAnalyzedScript(script).evaluateWithArguments()
+
+    def countNodesOfKind(self, script: ASGTopLevelScriptNode, kind) -> int:
+        return len(list(filter(lambda node: node.isKindOf(kind), asgTopoSort(script))))
+
+class TestBuilderScopedTable(unittest.TestCase):
+    def buildSymbol(self, builder: ASGBuilderWithGVN, value: str):
+        return builder.build(ASGLiteralSymbolNode, ASGNodeNoDerivation.getSingleton(), value).asASGNode()
+
+    def testParentNodesAreVisibleInChildren(self):
+        rootBuilder = ASGBuilderWithGVN(None)
+        childBuilder = ASGBuilderWithGVN(ASGBuilderWithGVN(rootBuilder))
+        rootSymbol = self.buildSymbol(rootBuilder, 'a')
+        self.assertIs(self.buildSymbol(childBuilder, 'a'), rootSymbol)
+
+        laterRootSymbol = self.buildSymbol(rootBuilder, 'b')
+        self.assertIs(self.buildSymbol(childBuilder, 'b'), laterRootSymbol)
+
+    def testChildNodesAreNotVisibleOutside(self):
+        rootBuilder = ASGBuilderWithGVN(None)
+        firstChildBuilder = ASGBuilderWithGVN(rootBuilder)
+        secondChildBuilder = ASGBuilderWithGVN(rootBuilder)
+        childSymbol = self.buildSymbol(firstChildBuilder, 'a')
+        self.assertIsNot(self.buildSymbol(secondChildBuilder, 'a'), childSymbol)
+        self.assertIsNot(self.buildSymbol(rootBuilder, 'a'), childSymbol)
+
+        self.assertIs(self.buildSymbol(firstChildBuilder, 'a'), childSymbol)
+        self.assertIs(self.buildSymbol(ASGBuilderWithGVN(firstChildBuilder), 'a'), childSymbol)
+
+    def testAlternatingBetweenSiblingScopes(self):
+        rootBuilder = ASGBuilderWithGVN(None)
+        firstChildBuilder = ASGBuilderWithGVN(rootBuilder)
+        secondChildBuilder = ASGBuilderWithGVN(rootBuilder)
+        firstChildSymbols = list(map(lambda i: self.buildSymbol(firstChildBuilder, 'a%d' % i), range(100)))
+
+        for i in range(100):
+            secondChildSymbol = self.buildSymbol(secondChildBuilder, 'a%d' % i)
+            self.assertIsNot(secondChildSymbol, firstChildSymbols[i])
+            self.assertIs(self.buildSymbol(firstChildBuilder, 'a%d' % i), firstChildSymbols[i])
+            self.assertIs(self.buildSymbol(secondChildBuilder, 'a%d' % i), secondChildSymbol)
+
+        # Switching between the siblings does not copy their nodes into a shared table.
+        self.assertEqual((len(rootBuilder.builtNodes), len(firstChildBuilder.builtNodes), len(secondChildBuilder.builtNodes)), (0, 100, 100))
+
+class TestBetaReplaceableDependencyMask(OptimizationTestCase):
+    def testMaskOfBlockBody(self):
+        script = self.analyzeSourceString('[:a :b | {a. {a}}]')
+        definition = next(filter(lambda node: node.isBlockDefinitionNode(), asgTopoSort(script)))
+        firstArgument, secondArgument = definition.arguments
+        outerArray = definition.exitPoint.value
+        innerArray = outerArray.elements[1]
+
+        self.assertNotEqual(outerArray.betaReplaceableDependencyMask() & firstArgument.betaReplaceableBit(), 0)
+        self.assertEqual(outerArray.betaReplaceableDependencyMask() & secondArgument.betaReplaceableBit(), 0)
+        self.assertIs(innerArray.betaReplaceableDependencyMask(), outerArray.betaReplaceableDependencyMask())
+
+        substitutionContext = ASGBetaSubstitutionContext()
+        substitutionContext.setSubstitutionForNode(secondArgument, firstArgument)
+        self.assertFalse(substitutionContext.mayIncludeAnyOfMask(outerArray.betaReplaceableDependencyMask()))
+        substitutionContext.setSubstitutionForNode(firstArgument, secondArgument)
+        self.assertTrue(substitutionContext.mayIncludeAnyOfMask(outerArray.betaReplaceableDependencyMask()))
+
+    def testMaskTableIsBounded(self):
+        maskTableLimit = ASGNode.betaReplaceableDependencyMaskTableLimit
+        ASGNode.betaReplaceableDependencyMaskTableLimit = 2
+        try:
+            script = self.analyzeSourceString('[:a :b :c | {a. {b}. {c}. {a. b. c}}]')
+            for node in asgTopoSort(script):
+                node.betaReplaceableDependencyMask()
+                self.assertLessEqual(len(ASGNode.betaReplaceableDependencyMaskTable), 2)
+            self.assertEqual(self.evaluateScript(script)(1, 2, 3), [1, [2], [3], [1, 2, 3]])
+        finally:
+            ASGNode.betaReplaceableDependencyMaskTableLimit = maskTableLimit
+
+class TestBlockInlining(OptimizationTestCase):
+    def assertInlinesCompletely(self, string: str, expectedResult):
+        script = self.analyzeSourceString(string)
+        self.assertEqual(self.evaluateScript(script), expectedResult)
+
+        inlinedScript = inlineBlockApplications(script)
+        self.assertEqual(self.countNodesOfKind(inlinedScript, ASGFxApplicationNode), 0)
+        self.assertEqual(self.countNodesOfKind(inlinedScript, ASGBlockInstanceNode), 0)
+        self.assertEqual(self.evaluateScript(inlinedScript), expectedResult)
+
+    def testBlockApplication(self):
+        self.assertInlinesCompletely('[:x | x](42)', 42)
+
+    def testBlockValueMessage(self):
+        self.assertInlinesCompletely('[:x | x] value: 42', 42)
+
+    def testInnerBlockApplication(self):
+        self.assertInlinesCompletely('[:x | [x]] (42)()', 42)
+        self.assertInlinesCompletely('([:x | [x]] value: 42) value', 42)
+
+    def testBlockWithCapturesAndArguments(self):
+        self.assertInlinesCompletely('[:a :b | [:c | b]](1. 2)(3)', 2)
+
+    def testHigherOrderBlockApplication(self):
+        self.assertInlinesCompletely('[:f | f value: 3] value: [:y | {y. y}]', [3, 3])
+
+    def testBlockArityMismatchIsNotInlined(self):
+        script = inlineBlockApplications(self.analyzeSourceString('[:x | x] value: 1 value: 2'))
+        self.assertEqual(self.countNodesOfKind(script, ASGFxApplicationNode), 1)
+
+    def testInliningDepthIsBounded(self):
+        script = inlineBlockApplications(self.analyzeSourceString('[:f | f value: f] value: [:f | f value: f]'))
+        self.assertTrue(script.exitPoint.value.isKindOf(ASGFxMessageSendNode))
+
+class TestBlockEscapeAnalysis(OptimizationTestCase):
+    def escapeKindOfReturnedBlock(self, string: str) -> ASGBlockEscapeKind:
+        script = self.analyzeSourceString(string)
+        escapeAnalysis = ASGBlockEscapeAnalysis().analyzeNode(script)
+        blockInstance = next(filter(lambda node: node.isBlockInstanceNode() and len(node.captures) != 0, asgTopoSort(script)))
+        return escapeAnalysis.escapeKindOf(blockInstance)
+
+    def testLocallyInvokedBlock(self):
+        self.assertEqual(self.escapeKindOfReturnedBlock('[:a | [:b | {a. b}] value: 2] value: 1'), ASGBlockEscapeKind.LOCALLY_INVOKED)
+        self.assertEqual(self.escapeKindOfReturnedBlock('[:a | [:b | {a. b}](2)] value: 1'), ASGBlockEscapeKind.LOCALLY_INVOKED)
+
+    def testEscapingBlock(self):
+        self.assertEqual(self.escapeKindOfReturnedBlock('[:a | [:b | {a. b}]] value: 1'), ASGBlockEscapeKind.ESCAPING)
+        self.assertEqual(self.escapeKindOfReturnedBlock('[:a | {[:b | a]}] value: 1'), ASGBlockEscapeKind.ESCAPING)
+        self.assertEqual(self.escapeKindOfReturnedBlock('[:a | [:b | a] value: 1 value: 2] value: 1'), ASGBlockEscapeKind.ESCAPING)
+
+    def testNonEscapingBlockIsAppliedDirectly(self):
+        script = ASGBlockInliningAlgorithm(maxInlinedBodySize = 0)(self.analyzeSourceString('[:a :b | [:c | {a. b. c}] value: 3] value: 1 value: 2'))
+        directScript = applyNonEscapingBlocksDirectly(script)
+        self.assertEqual(self.countNodesOfKind(directScript, ASGFxBlockApplicationNode), 2)
+        self.assertEqual(self.countNodesOfKind(directScript, ASGBlockInstanceNode), 0)
+        self.assertEqual(self.evaluateScript(directScript), [1, 2, 3])
+
+class TestDeadCodeElimination(OptimizationTestCase):
+    def testUnusedPureApplicationIsRemoved(self):
+        script, removedNodeCount = eliminateDeadCode(self.analyzeSourceString('([:x | {x. x}] value: 1). [:x | x] value: 2'))
+        self.assertEqual(self.countNodesOfKind(script, ASGFxApplicationNode), 1)
+        self.assertEqual(self.countNodesOfKind(script, ASGMutableArrayNode), 0)
+        self.assertTrue(removedNodeCount > 0)
+        self.assertEqual(self.evaluateScript(script), 2)
+
+    def testUsedApplicationIsKept(self):
+        script, removedNodeCount = eliminateDeadCode(self.analyzeSourceString('[:x | {x. x}] value: 1'))
+        self.assertEqual(removedNodeCount, 0)
+        self.assertEqual(self.evaluateScript(script), [1, 1])
+
+    def testApplicationWithEffectsIsKept(self):
+        script, removedNodeCount = eliminateDeadCode(self.analyzeSourceString('([:x | x printString] value: 1). 2'))
+        self.assertEqual(removedNodeCount, 0)
+        self.assertEqual(self.countNodesOfKind(script, ASGFxApplicationNode), 1)
+
+if __name__ == '__main__':
+    unittest.main()
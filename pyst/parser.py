@@ -1,11 +1,19 @@
-from .scanner import Token, TokenKind, scanFileNamed, scanSourceString
+from .scanner import Token, TokenKind, ScannerState, scanFileNamed, scanSourceString, scanSourceCode, scanSourceCodeUntil, findTopLevelStatementEnds
 from .parsetree import *
+import concurrent.futures
 import copy
+import gc
+import io
+import os
+import pickle
+import sys
 
 class ParserState:
-    def __init__(self, sourceCode: SourceCode, tokens: list[Token]) -> None:
+    def __init__(self, sourceCode: SourceCode, tokens: list[Token], builder = None) -> None:
         self.sourceCode = sourceCode
         self.tokens = tokens
+        self.builder = builder if builder is not None else ParseTreeBuilder()
+        self.errorNodes = []
         self.position = 0
 
     def atEnd(self) -> bool:
@@ -34,14 +42,19 @@ class ParserState:
         self.position += 1
         return token
 
-    def expectAddingErrorToNode(self, expectedKind: TokenKind, node: ParseTreeNode) -> ParseTreeNode:
+    def makeErrorNode(self, sourcePosition: SourcePosition, message: str, innerNodes: list = []):
+        errorNode = self.builder.errorNode(sourcePosition, message, innerNodes)
+        self.errorNodes.append(errorNode)
+        return errorNode
+
+    def expectAddingErrorToNode(self, expectedKind: TokenKind, node):
         if self.peekKind() == expectedKind:
             self.advance()
             return node
         
         errorPosition = self.currentSourcePosition()
-        errorNode = ParseTreeErrorNode(errorPosition, "Expected token of kind %s." % str(expectedKind))
-        return ParseTreeSequenceNode(node.sourcePosition.to(errorPosition), [node, errorNode])
+        errorNode = self.makeErrorNode(errorPosition, "Expected token of kind %s." % str(expectedKind))
+        return self.builder.sequenceNode(self.builder.sourcePositionOf(node).to(errorPosition), [node, errorNode])
 
     def currentSourcePosition(self) -> SourcePosition:
         if self.position < len(self.tokens):
@@ -67,69 +80,38 @@ class ParserState:
     def advanceWithExpectedError(self, message: str):
         if self.peekKind() == TokenKind.ERROR:
             errorToken = self.next()
-            return self, ParseTreeErrorNode(errorToken.sourcePosition, errorToken.errorMessage)
+            return self, self.makeErrorNode(errorToken.sourcePosition, errorToken.errorMessage)
         elif self.atEnd():
-            return self, ParseTreeErrorNode(self.currentSourcePosition(), message)
+            return self, self.makeErrorNode(self.currentSourcePosition(), message)
         else:
             errorPosition = self.currentSourcePosition()
             self.advance()
-            return self, ParseTreeErrorNode(errorPosition, message, [])
-
-def parseEscapedString(string: str) -> str:
-    unescaped = ''
-    i = 0
-    stringLength = len(string)
-    while i < len(string):
-        c = string[i]
-        if c == "'" and i + 1 < stringLength and string[i + 1] == "'":
-            i += 1
-        unescaped += c
-        i += 1
-    return unescaped
-
-def parseIntegerConstant(string: str) -> str:
-    if b'r' in string:
-        radixIndex = string.index(b'r')
-    elif b'R' in string:
-        radixIndex = string.index(b'R')
-    else:
-        return int(string)
-    
-    radix = int(string[0:radixIndex])
-    radixedInteger = int(string[radixIndex + 1:], abs(radix))
-    if radix < 0:
-        return -radixedInteger
-    else:
-        return radixedInteger
+            return self, self.makeErrorNode(errorPosition, message, [])
 
 def parseLiteralInteger(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.INTEGER
-    return state, ParseTreeLiteralIntegerNode(token.sourcePosition, parseIntegerConstant(token.getValue()))
+    return state, state.builder.literalIntegerNode(token.sourcePosition, token.value)
 
 def parseLiteralFloat(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.FLOAT
-    return state, ParseTreeLiteralFloatNode(token.sourcePosition, float(token.getValue()))
+    return state, state.builder.literalFloatNode(token.sourcePosition, token.value)
 
 def parseLiteralString(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.STRING
-    return state, ParseTreeLiteralStringNode(token.sourcePosition, parseEscapedString(token.getStringValue()[1:-1]))
+    return state, state.builder.literalStringNode(token.sourcePosition, token.value)
 
 def parseLiteralCharacter(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.CHARACTER
-    return state, ParseTreeLiteralCharacterNode(token.sourcePosition, ord(token.getStringValue()[1]))
+    return state, state.builder.literalCharacterNode(token.sourcePosition, token.value)
 
 def parseLiteralSymbol(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.SYMBOL
-    symbolValue = token.getStringValue()[1:]
-    if symbolValue[0] == "'":
-        assert symbolValue[0] == "'" and symbolValue[-1] == "'"
-        symbolValue = parseEscapedString(symbolValue[1:-1])
-    return state, ParseTreeLiteralSymbolNode(token.sourcePosition, symbolValue)
+    return state, state.builder.literalSymbolNode(token.sourcePosition, token.value)
 
 def parseLiteral(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if   state.peekKind() == TokenKind.INTEGER: return parseLiteralInteger(state)
@@ -142,20 +124,20 @@ def parseLiteral(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
 def parseIdentifier(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.IDENTIFIER
-    return state, ParseTreeIdentifierReferenceNode(token.sourcePosition, token.getStringValue())
+    return state, state.builder.identifierReferenceNode(token.sourcePosition, token.value)
 
 def parseLiteralArrayIdentifier(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
     assert token.kind == TokenKind.IDENTIFIER
-    tokenValue = token.getStringValue()
+    tokenValue = token.value
     if tokenValue in ['nil', 'false', 'true']:
-        return state, ParseTreeIdentifierReferenceNode(token.sourcePosition, tokenValue)
+        return state, state.builder.identifierReferenceNode(token.sourcePosition, tokenValue)
     else:
-        return state, ParseTreeLiteralSymbolNode(token.sourcePosition, tokenValue)
+        return state, state.builder.literalSymbolNode(token.sourcePosition, tokenValue)
 
 def parseTokenAsSymbol(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     token = state.next()
-    return state, ParseTreeLiteralSymbolNode(token.sourcePosition, token.getStringValue())
+    return state, state.builder.literalSymbolNode(token.sourcePosition, token.value if token.value is not None else token.getStringValue())
 
 def parseTerm(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if state.peekKind() == TokenKind.IDENTIFIER: return parseIdentifier(state)
@@ -190,7 +172,7 @@ def parseParenthesis(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if isBinaryExpressionOperator(state.peekKind()) and state.peekKind(1) == TokenKind.RIGHT_PARENT:
         token = state.next()
         state.advance()
-        return state, ParseTreeIdentifierReferenceNode(token.sourcePosition, token.getStringValue())
+        return state, state.builder.identifierReferenceNode(token.sourcePosition, token.value)
 
     state, expression = parseSequenceUntilEndOrDelimiter(state, TokenKind.RIGHT_PARENT)
 
@@ -210,9 +192,9 @@ def parseArray(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if state.peekKind() == TokenKind.RIGHT_CURLY_BRACKET:
         state.advance()
     else:
-        elements.append(ParseTreeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
+        elements.append(state.makeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
 
-    return state, ParseTreeArrayNode(state.sourcePositionFrom(startPosition), elements)
+    return state, state.builder.arrayNode(state.sourcePositionFrom(startPosition), elements)
 
 def parseLiteralArray(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     # #( | ()
@@ -229,9 +211,9 @@ def parseLiteralArray(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if state.peekKind() == TokenKind.RIGHT_PARENT:
         state.advance()
     else:
-        elements.append(ParseTreeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
+        elements.append(state.makeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
 
-    return state, ParseTreeLiteralArrayNode(state.sourcePositionFrom(startPosition), elements)
+    return state, state.builder.literalArrayNode(state.sourcePositionFrom(startPosition), elements)
 
 def parseReturn(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     # ^
@@ -240,13 +222,15 @@ def parseReturn(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     state.advance()
 
     state, expression = parseExpression(state)
-    return state, ParseTreeReturnNode(state.sourcePositionFrom(startPosition), expression)
+    if not state.builder.supportsReturnNodes:
+        return state, state.makeErrorNode(state.sourcePositionFrom(startPosition), 'Non-local returns are not supported.', [expression])
+    return state, state.builder.returnNode(state.sourcePositionFrom(startPosition), expression)
 
 def parseLocalVariable(state: ParserState) -> tuple[ParserState, list[ParseTreeNode]]:
     if state.peekKind() == TokenKind.IDENTIFIER:
         sourcePosition = state.currentSourcePosition()
         token = state.next()
-        return state, ParseTreeLocalVariableNode(sourcePosition, token.getStringValue())
+        return state, state.builder.localVariableNode(sourcePosition, token.value)
     else: return state.advanceWithExpectedError("Local variable")
 
 def parseLocalVariables(state: ParserState) -> tuple[ParserState, list[ParseTreeNode]]:
@@ -263,7 +247,7 @@ def parseLocalVariables(state: ParserState) -> tuple[ParserState, list[ParseTree
     if state.peekKind() == TokenKind.BAR:
         state.advance()
     else:
-        locals.append(ParseTreeErrorNode(state.currentSourcePosition(), 'Expected a bar after the local variable declarations.'))
+        locals.append(state.makeErrorNode(state.currentSourcePosition(), 'Expected a bar after the local variable declarations.'))
     return state, locals
 
 def parseArgument(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
@@ -272,9 +256,9 @@ def parseArgument(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     state.advance()
     if state.peekKind() == TokenKind.IDENTIFIER:
         nameToken = state.next()
-        return state, ParseTreeArgumentNode(state.sourcePositionFrom(startPosition), nameToken.getStringValue())
+        return state, state.builder.argumentNode(state.sourcePositionFrom(startPosition), nameToken.value)
     else:
-        return state, ParseTreeErrorNode(state.currentSourcePosition(), 'Expected an argument name.')
+        return state, state.makeErrorNode(state.currentSourcePosition(), 'Expected an argument name.')
 
 def parseBlock(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     # {
@@ -298,7 +282,7 @@ def parseBlock(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
 
     # }
     body = state.expectAddingErrorToNode(TokenKind.RIGHT_BRACKET, body)
-    return state, ParseTreeBlockNode(state.sourcePositionFrom(startPosition), arguments, body)
+    return state, state.builder.blockNode(state.sourcePositionFrom(startPosition), arguments, body)
 
 def parseUnaryPostfixExpression(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     startPosition = state.position
@@ -307,16 +291,16 @@ def parseUnaryPostfixExpression(state: ParserState) -> tuple[ParserState, ParseT
         token = state.peek()
         if token.kind == TokenKind.IDENTIFIER:
             state.advance()
-            selector = ParseTreeLiteralSymbolNode(token.sourcePosition, token.getStringValue())
-            receiver = ParseTreeMessageSendNode(receiver.sourcePosition.to(selector.sourcePosition), receiver, selector, [])
+            selector = state.builder.literalSymbolNode(token.sourcePosition, token.value)
+            receiver = state.builder.messageSendNode(state.builder.sourcePositionOf(receiver).to(token.sourcePosition), receiver, selector, [])
         elif token.kind == TokenKind.LEFT_PARENT:
             state.advance()
             state, arguments = parseExpressionListUntilEndOrDelimiter(state, TokenKind.RIGHT_PARENT)
             if state.peekKind() == TokenKind.RIGHT_PARENT:
                 state.advance()
             else:
-                arguments.append(ParseTreeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
-            receiver = ParseTreeApplicationNode(state.sourcePositionFrom(startPosition), receiver, arguments)
+                arguments.append(state.makeErrorNode(state.currentSourcePosition(), "Expected right parenthesis."))
+            receiver = state.builder.applicationNode(state.sourcePositionFrom(startPosition), receiver, arguments)
     return state, receiver
 
 def isBinaryExpressionOperator(kind: TokenKind) -> bool:
@@ -331,13 +315,13 @@ def parseBinaryExpressionSequence(state: ParserState) -> tuple[ParserState, Pars
     elements = [operand]
     while isBinaryExpressionOperator(state.peekKind()):
         operatorToken = state.next()
-        operator = ParseTreeLiteralSymbolNode(operatorToken.sourcePosition, operatorToken.getStringValue())
+        operator = state.builder.literalSymbolNode(operatorToken.sourcePosition, operatorToken.value)
         elements.append(operator)
 
         state, operand = parseUnaryPostfixExpression(state)
         elements.append(operand)
 
-    return state, ParseTreeBinaryExpressionSequenceNode(state.sourcePositionFrom(startPosition), elements)
+    return state, state.builder.binaryExpressionSequenceNode(state.sourcePositionFrom(startPosition), elements)
     
 def parseKeywordApplication(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     assert state.peekKind() == TokenKind.KEYWORD
@@ -350,13 +334,13 @@ def parseKeywordApplication(state: ParserState) -> tuple[ParserState, ParseTreeN
     while state.peekKind() == TokenKind.KEYWORD:
         keywordToken = state.next()
         lastKeywordSourcePosition = keywordToken.sourcePosition
-        symbolValue += keywordToken.getStringValue()
+        symbolValue += keywordToken.value
         
         state, argument = parseBinaryExpressionSequence(state)
         arguments.append(argument)
 
-    functionIdentifier = ParseTreeLiteralSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), symbolValue)
-    return state, ParseTreeMessageSendNode(state.sourcePositionFrom(startPosition), None, functionIdentifier, arguments)
+    functionIdentifier = state.builder.literalSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), sys.intern(symbolValue))
+    return state, state.builder.messageSendNode(state.sourcePositionFrom(startPosition), None, functionIdentifier, arguments)
 
 def parseKeywordMessageSend(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     startPosition = state.position
@@ -371,13 +355,13 @@ def parseKeywordMessageSend(state: ParserState) -> tuple[ParserState, ParseTreeN
     while state.peekKind() == TokenKind.KEYWORD:
         keywordToken = state.next()
         lastKeywordSourcePosition = keywordToken.sourcePosition
-        symbolValue += keywordToken.getStringValue()
+        symbolValue += keywordToken.value
         
         state, argument = parseBinaryExpressionSequence(state)
         arguments.append(argument)
 
-    selector = ParseTreeLiteralSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), symbolValue)
-    return state, ParseTreeMessageSendNode(state.sourcePositionFrom(startPosition), receiver, selector, arguments)
+    selector = state.builder.literalSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), sys.intern(symbolValue))
+    return state, state.builder.messageSendNode(state.sourcePositionFrom(startPosition), receiver, selector, arguments)
 
 def parsePragma(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     startPosition = state.position
@@ -388,7 +372,7 @@ def parsePragma(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if state.peekKind() == TokenKind.IDENTIFIER:
         selectorStartPosition = state.position
         token = state.next()
-        selector = ParseTreeLiteralSymbolNode(state.sourcePositionFrom(selectorStartPosition), token.getStringValue())
+        selector = state.builder.literalSymbolNode(state.sourcePositionFrom(selectorStartPosition), token.value)
     elif state.peekKind() == TokenKind.KEYWORD:
         symbolValue = ""
         firstKeywordSourcePosition = state.peek(0).sourcePosition
@@ -396,20 +380,20 @@ def parsePragma(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
         while state.peekKind() == TokenKind.KEYWORD:
             keywordToken = state.next()
             lastKeywordSourcePosition = keywordToken.sourcePosition
-            symbolValue += keywordToken.getStringValue()
+            symbolValue += keywordToken.value
             
             state, argument = parseUnaryPostfixExpression(state)
             arguments.append(argument)
 
-        selector = ParseTreeLiteralSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), symbolValue)
+        selector = state.builder.literalSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), sys.intern(symbolValue))
     else:
-        return state, ParseTreeErrorNode(state.sourcePositionFrom(startPosition), 'Expected a pragma.')
+        return state, state.makeErrorNode(state.sourcePositionFrom(startPosition), 'Expected a pragma.')
     
     if state.peekKind() == TokenKind.GREATER_THAN:
         state.advance()
-        return state, ParseTreePragmaNode(state.sourcePositionFrom(startPosition), selector, arguments)
+        return state, state.builder.pragmaNode(state.sourcePositionFrom(startPosition), selector, arguments)
     else:
-        pragma = ParseTreePragmaNode(state.sourcePositionFrom(startPosition), selector, arguments)
+        pragma = state.builder.pragmaNode(state.sourcePositionFrom(startPosition), selector, arguments)
         return state, state.expectAddingErrorToNode(TokenKind.GREATER_THAN, pragma)
 
 def parsePragmas(state: ParserState) -> tuple[ParserState, list[ParseTreeNode]]:
@@ -424,8 +408,8 @@ def parseCascadedMessage(state: ParserState) -> tuple[ParserState, ParseTreeNode
     token = state.peek()
     if state.peekKind() == TokenKind.IDENTIFIER:
         state.advance()
-        selector = ParseTreeLiteralSymbolNode(token.sourcePosition, token.getStringValue())
-        return state, ParseTreeCascadeMessageNode(state.sourcePositionFrom(startPosition), selector, [])
+        selector = state.builder.literalSymbolNode(token.sourcePosition, token.value)
+        return state, state.builder.cascadeMessageNode(state.sourcePositionFrom(startPosition), selector, [])
     elif state.peekKind() == TokenKind.KEYWORD:
         symbolValue = ""
         arguments = []
@@ -434,20 +418,20 @@ def parseCascadedMessage(state: ParserState) -> tuple[ParserState, ParseTreeNode
         while state.peekKind() == TokenKind.KEYWORD:
             keywordToken = state.next()
             lastKeywordSourcePosition = keywordToken.sourcePosition
-            symbolValue += keywordToken.getStringValue()
+            symbolValue += keywordToken.value
             
             state, argument = parseBinaryExpressionSequence(state)
             arguments.append(argument)
 
-        selector = ParseTreeLiteralSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), symbolValue)
-        return state, ParseTreeCascadeMessageNode(state.sourcePositionFrom(startPosition), selector, arguments)
+        selector = state.builder.literalSymbolNode(firstKeywordSourcePosition.to(lastKeywordSourcePosition), sys.intern(symbolValue))
+        return state, state.builder.cascadeMessageNode(state.sourcePositionFrom(startPosition), selector, arguments)
     elif isBinaryExpressionOperator(state.peekKind()):
         state.advance()
-        selector = ParseTreeLiteralSymbolNode(token.sourcePosition, token.getStringValue())
+        selector = state.builder.literalSymbolNode(token.sourcePosition, token.value)
         state, argument = parseUnaryPostfixExpression(state)
-        return state, ParseTreeCascadeMessageNode(state.sourcePositionFrom(startPosition), selector, [argument])
+        return state, state.builder.cascadeMessageNode(state.sourcePositionFrom(startPosition), selector, [argument])
     else:
-        return state, ParseTreeErrorNode(state.currentSourcePosition(), 'Expected a cascaded message send.')
+        return state, state.makeErrorNode(state.currentSourcePosition(), 'Expected a cascaded message send.')
 
 def parseMessageSendCascade(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     startPosition = state.position
@@ -455,7 +439,7 @@ def parseMessageSendCascade(state: ParserState) -> tuple[ParserState, ParseTreeN
     if state.peekKind() != TokenKind.SEMICOLON:
         return state, firstMessage
     
-    cascadeReceiver, firstCascadedMessage  = firstMessage.asMessageSendCascadeReceiverAndFirstMessage()
+    cascadeReceiver, firstCascadedMessage = state.builder.messageSendCascadeReceiverAndFirstMessage(firstMessage)
     cascadedMessages = []
     if firstCascadedMessage is not None:
         cascadedMessages.append(firstCascadedMessage)
@@ -464,7 +448,7 @@ def parseMessageSendCascade(state: ParserState) -> tuple[ParserState, ParseTreeN
         state.advance()
         state, cascadedMessage = parseCascadedMessage(state)
         cascadedMessages.append(cascadedMessage)
-    return state, ParseTreeMessageCascadeNode(state.sourcePositionFrom(startPosition), cascadeReceiver, cascadedMessages)
+    return state, state.builder.messageCascadeNode(state.sourcePositionFrom(startPosition), cascadeReceiver, cascadedMessages)
 
 def parseLowPrecedenceExpression(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
     if state.peekKind() == TokenKind.KEYWORD:
@@ -477,7 +461,7 @@ def parseAssignmentExpression(state: ParserState) -> tuple[ParserState, ParseTre
     if state.peekKind() == TokenKind.ASSIGNMENT:
         operatorToken = state.next()
         state, assignedValue = parseAssignmentExpression(state)
-        return state, ParseTreeAssignmentNode(state.sourcePositionFrom(startPosition), assignedStore, assignedValue)
+        return state, state.builder.assignmentNode(state.sourcePositionFrom(startPosition), assignedStore, assignedValue)
     else:
         return state, assignedStore
 
@@ -495,7 +479,7 @@ def parseExpressionListUntilEndOrDelimiter(state: ParserState, delimiter: TokenK
     expectsExpression = True
     while not state.atEnd() and state.peekKind() != delimiter:
         if not expectsExpression:
-            elements.append(ParseTreeErrorNode(state.currentSourcePosition(), "Expected dot before expression.", []))
+            elements.append(state.makeErrorNode(state.currentSourcePosition(), "Expected dot before expression.", []))
 
         state, expression = parseExpression(state)
         elements.append(expression)
@@ -513,10 +497,9 @@ def parseSequenceUntilEndOrDelimiter(state: ParserState, delimiter: TokenKind) -
     state, elements = parseExpressionListUntilEndOrDelimiter(state, delimiter)
     if len(elements) == 1:
         return state, elements[0]
-    return state, ParseTreeSequenceNode(state.sourcePositionFrom(initialPosition), elements)
+    return state, state.builder.sequenceNode(state.sourcePositionFrom(initialPosition), elements)
 
-def parseLexicalSequenceUntilEndOrDelimiter(state: ParserState, delimiter: TokenKind) -> tuple[ParserState, ParseTreeNode]:
-    initialPosition = state.position
+def parseLexicalSequenceComponentsUntilEndOrDelimiter(state: ParserState, delimiter: TokenKind) -> tuple[ParserState, list[ParseTreeNode], list[ParseTreeNode], list[ParseTreeNode]]:
     locals = []
     state, pragmas = parsePragmas(state)
 
@@ -527,21 +510,167 @@ def parseLexicalSequenceUntilEndOrDelimiter(state: ParserState, delimiter: Token
     pragmas += morePragmas
 
     state, elements = parseExpressionListUntilEndOrDelimiter(state, delimiter)
+    return state, locals, pragmas, elements
+
+def parseLexicalSequenceUntilEndOrDelimiter(state: ParserState, delimiter: TokenKind) -> tuple[ParserState, ParseTreeNode]:
+    initialPosition = state.position
+    state, locals, pragmas, elements = parseLexicalSequenceComponentsUntilEndOrDelimiter(state, delimiter)
     if len(locals) == 0 and len(pragmas) == 0 and len(elements) == 1:
         return state, elements[0]
-    return state, ParseTreeLexicalSequenceNode(state.sourcePositionFrom(initialPosition), locals, pragmas, elements)
+    return state, state.builder.lexicalSequenceNode(state.sourcePositionFrom(initialPosition), locals, pragmas, elements)
 
-def parseTopLevelExpression(state: ParserState) -> tuple[ParserState, ParseTreeNode]:
+def parseTopLevelExpression(state: ParserState) -> ParseTreeNode:
     state, node = parseLexicalSequenceUntilEndOrDelimiter(state, TokenKind.END_OF_SOURCE)
     return node
 
+def parseTopLevelExpressionWithErrors(state: ParserState) -> tuple[ParseTreeNode, list[ParseTreeNode]]:
+    node = parseTopLevelExpression(state)
+    return node, state.errorNodes
+
 def parseSourceString(sourceText: str, sourceName: str = '<string>') -> ParseTreeNode:
     sourceCode, tokens = scanSourceString(sourceText, sourceName)
     state = ParserState(sourceCode, tokens)
     return parseTopLevelExpression(state)
 
+def parseSourceStringWithErrors(sourceText: str, sourceName: str = '<string>') -> tuple[ParseTreeNode, list[ParseTreeErrorNode]]:
+    sourceCode, tokens = scanSourceString(sourceText, sourceName)
+    return parseTopLevelExpressionWithErrors(ParserState(sourceCode, tokens))
+
 def parseFileNamed(fileName: str) -> ParseTreeNode:
     sourceCode, tokens = scanFileNamed(fileName)
     state = ParserState(sourceCode, tokens)
     return parseTopLevelExpression(state)
-    
\ No newline at end of file
+    
+ParallelParsingMinimumChunkSize = 64*1024
+ParallelParsingChunksPerProcess = 4
+ParallelParsingSourceCode = None
+
+def getParallelParsingSourceCode() -> SourceCode:
+    return ParallelParsingSourceCode
+
+def reduceParallelParsingSourceCode(sourceCode: SourceCode):
+    # The parsed nodes refer to the source code of the receiving process instead of carrying a copy of the whole text.
+    return getParallelParsingSourceCode, ()
+
+def setParallelParsingSourceCode(sourceCode: SourceCode):
+    global ParallelParsingSourceCode
+    ParallelParsingSourceCode = sourceCode
+
+def parseTopLevelStatementsChunk(builderClass, startIndex: int, endIndex: int, line: int, column: int, isPreviousCR: bool) -> bytes:
+    sourceCode = getParallelParsingSourceCode()
+    scannerState = ScannerState(sourceCode)
+    scannerState.position = startIndex
+    scannerState.line = line
+    scannerState.column = column
+    scannerState.isPreviousCR = isPreviousCR
+    tokens = scanSourceCodeUntil(scannerState, endIndex)
+
+    state = ParserState(sourceCode, tokens, builderClass())
+    if startIndex == 0:
+        state, locals, pragmas, elements = parseLexicalSequenceComponentsUntilEndOrDelimiter(state, TokenKind.END_OF_SOURCE)
+    else:
+        locals, pragmas = [], []
+        state, elements = parseExpressionListUntilEndOrDelimiter(state, TokenKind.END_OF_SOURCE)
+
+    firstSourcePosition = None
+    lastSourcePosition = None
+    if state.position > 0:
+        firstSourcePosition = tokens[0].sourcePosition
+        lastSourcePosition = state.previousSourcePosition()
+
+    output = io.BytesIO()
+    pickler = pickle.Pickler(output, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {SourceCode: reduceParallelParsingSourceCode}
+    # The end of source token of each chunk is not counted, because the whole script only has one.
+    builtNodeCount = getattr(state.builder, 'builtNodeCount', 0)
+    pickler.dump((locals, pragmas, elements, len(state.errorNodes), firstSourcePosition, lastSourcePosition, len(tokens) - 1, builtNodeCount))
+    return output.getvalue()
+
+def splitTopLevelStatementChunks(sourceCode: SourceCode, chunkCount: int) -> list[tuple[int, int, int, int, bool]] | None:
+    statementEnds = findTopLevelStatementEnds(sourceCode)
+    if statementEnds is None:
+        return None
+
+    sourceSize = len(sourceCode.text)
+    chunkSize = max(ParallelParsingMinimumChunkSize, sourceSize // chunkCount)
+    scannerState = ScannerState(sourceCode)
+    chunks = []
+    chunkStartIndex = 0
+    for statementEnd in statementEnds + [sourceSize]:
+        if statementEnd - chunkStartIndex < chunkSize and statementEnd != sourceSize:
+            continue
+        if statementEnd == chunkStartIndex:
+            break
+
+        scannerState.advanceTo(chunkStartIndex)
+        chunks.append((chunkStartIndex, statementEnd, scannerState.line, scannerState.column, scannerState.isPreviousCR))
+        chunkStartIndex = statementEnd
+    return chunks
+
+def parseTopLevelStatementsInParallelWithCounts(sourceCode: SourceCode, processCount: int | None = None, builderClass = ParseTreeBuilder) -> tuple[ParseTreeNode, int, int] | None:
+    """
+    Parses the top-level statements of a single big script in chunks in a process pool, with a builder of the given class in each chunk.
+    Returns the node, the scanned token count and the node count of the builders that count their built nodes.
+    Returns None when the script is too small, is not balanced or has syntax errors, so that it is parsed serially instead.
+    """
+    if processCount is None:
+        processCount = os.cpu_count() or 1
+    if processCount < 2:
+        return None
+
+    chunks = splitTopLevelStatementChunks(sourceCode, processCount*ParallelParsingChunksPerProcess)
+    if chunks is None or len(chunks) < 2:
+        return None
+
+    with concurrent.futures.ProcessPoolExecutor(min(processCount, len(chunks)), initializer = setParallelParsingSourceCode, initargs = (sourceCode,)) as executor:
+        chunkResults = list(executor.map(parseTopLevelStatementsChunk, [builderClass] * len(chunks), *zip(*chunks)))
+
+    # The loaded nodes do not form cycles, so collecting them while loading is wasted time.
+    previousSourceCode = getParallelParsingSourceCode()
+    wasGarbageCollectorEnabled = gc.isenabled()
+    setParallelParsingSourceCode(sourceCode)
+    gc.disable()
+    try:
+        chunkResults = list(map(pickle.loads, chunkResults))
+    finally:
+        setParallelParsingSourceCode(previousSourceCode)
+        if wasGarbageCollectorEnabled:
+            gc.enable()
+
+    locals, pragmas, elements = [], [], []
+    firstSourcePosition = None
+    lastSourcePosition = None
+    tokenCount = 1
+    builtNodeCount = 0
+    for chunkLocals, chunkPragmas, chunkElements, chunkErrorCount, chunkFirstSourcePosition, chunkLastSourcePosition, chunkTokenCount, chunkBuiltNodeCount in chunkResults:
+        if chunkErrorCount != 0:
+            return None
+
+        tokenCount += chunkTokenCount
+        builtNodeCount += chunkBuiltNodeCount
+
+        locals += chunkLocals
+        pragmas += chunkPragmas
+        elements += chunkElements
+        if chunkLastSourcePosition is not None:
+            firstSourcePosition = firstSourcePosition or chunkFirstSourcePosition
+            lastSourcePosition = chunkLastSourcePosition
+
+    if len(locals) == 0 and len(pragmas) == 0 and len(elements) == 1:
+        return elements[0], tokenCount, builtNodeCount
+
+    builder = builderClass()
+    node = builder.lexicalSequenceNode(firstSourcePosition.to(lastSourcePosition), locals, pragmas, elements)
+    return node, tokenCount, builtNodeCount + getattr(builder, 'builtNodeCount', 0)
+
+def parseTopLevelStatementsInParallel(sourceCode: SourceCode, processCount: int | None = None, builderClass = ParseTreeBuilder) -> ParseTreeNode | None:
+    result = parseTopLevelStatementsInParallelWithCounts(sourceCode, processCount, builderClass)
+    if result is None:
+        return None
+    return result[0]
+
+def parseSourceCodeInParallelWithErrors(sourceCode: SourceCode, processCount: int | None = None, builderClass = ParseTreeBuilder) -> tuple[ParseTreeNode, list[ParseTreeErrorNode]]:
+    node = parseTopLevelStatementsInParallel(sourceCode, processCount, builderClass)
+    if node is not None:
+        return node, []
+    return parseTopLevelExpressionWithErrors(ParserState(sourceCode, scanSourceCode(sourceCode), builderClass()))
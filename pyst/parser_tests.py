@@ -1,11 +1,14 @@
 import unittest
 from .parsetree import *
-from .parser import parseSourceString
+from .parser import ParserState, parseSourceString, parseSourceStringWithErrors, parseTopLevelExpressionWithErrors, parseTopLevelStatementsInParallel, parseTopLevelStatementsInParallelWithCounts, parseSourceCodeInParallelWithErrors
+from .scanner import scanSourceCode
+from . import parser
+from .syntax import ASGNode, ASGSyntaxErrorNode, ASGParseTreeFrontEnd, ASGSyntaxBuilder, parseSourceStringIntoSyntax
 
 class TestParser(unittest.TestCase):
     def parseSourceStringWithoutErrors(self, string: str) -> ParseTreeNode:
-        ast = parseSourceString(string)
-        self.assertTrue(ParseTreeErrorVisitor().checkAndPrintErrors(ast))
+        ast, errorNodes = parseSourceStringWithErrors(string)
+        self.assertEqual(errorNodes, [])
         return ast
 
     def testEmpty(self):
@@ -438,5 +441,89 @@ class TestParser(unittest.TestCase):
         self.assertTrue(node.expression.isLiteralIntegerNode())
         self.assertEqual(node.expression.value, 42)
 
+    def testErrorsAreRecorded(self):
+        ast, errorNodes = parseSourceStringWithErrors('{1 2. (3')
+        self.assertEqual(len(errorNodes), 3)
+        visitor = ParseTreeErrorVisitor()
+        visitor.visitNode(ast)
+        self.assertEqual(set(errorNodes), set(visitor.errorNodes))
+
+    def testNodesHaveNoInstanceDictionary(self):
+        pendingClasses = [ParseTreeNode]
+        while len(pendingClasses) != 0:
+            nodeClass = pendingClasses.pop()
+            self.assertEqual(nodeClass.__dictoffset__, 0, nodeClass.__name__)
+            pendingClasses += nodeClass.__subclasses__()
+
+class TestSyntaxBuilder(unittest.TestCase):
+    def assertSameSyntax(self, expected, actual):
+        self.assertIs(actual.__class__, expected.__class__)
+        if isinstance(expected, (list, tuple)):
+            self.assertEqual(len(actual), len(expected))
+            for expectedElement, actualElement in zip(expected, actual):
+                self.assertSameSyntax(expectedElement, actualElement)
+            return
+        if not isinstance(expected, ASGNode):
+            self.assertEqual(actual, expected)
+            return
+
+        self.assertEqual(str(actual.sourceDerivation.getSourcePosition()), str(expected.sourceDerivation.getSourcePosition()))
+        for expectedAttribute, actualAttribute in zip(expected.getAllConstructionAttributes()[1:], actual.getAllConstructionAttributes()[1:]):
+            self.assertSameSyntax(expectedAttribute, actualAttribute)
+
+    def testSameSyntaxAsParseTreeFrontEnd(self):
+        for source in ['', 'a()', "{42. 'hello'. #sym. $a}", '[:x :y | | a | x foo: y bar: 3 + 4]', 'a b; c: 1; + 2', '#(a nil (1 2) #b)', '(a) b', '<pragma> | a | a := 1. a', '3 + 4; * 10', 'a + b * c; - d']:
+            syntax, errorNodes = parseSourceStringIntoSyntax(source)
+            self.assertEqual(errorNodes, [])
+            self.assertSameSyntax(ASGParseTreeFrontEnd().visitNode(parseSourceString(source)), syntax)
+
+    def testErrorsAreCollected(self):
+        syntax, errorNodes = parseSourceStringIntoSyntax('{1 2. (3')
+        self.assertEqual(len(errorNodes), 3)
+        self.assertTrue(all(map(lambda errorNode: isinstance(errorNode, ASGSyntaxErrorNode), errorNodes)))
+
+class TestParallelParser(unittest.TestCase):
+    assertSameSyntax = TestSyntaxBuilder.assertSameSyntax
+
+    def setUp(self):
+        self.minimumChunkSize = parser.ParallelParsingMinimumChunkSize
+        parser.ParallelParsingMinimumChunkSize = 1
+
+    def tearDown(self):
+        parser.ParallelParsingMinimumChunkSize = self.minimumChunkSize
+
+    def makeSourceCode(self, sourceText: str) -> SourceCode:
+        return SourceCode(None, '<string>', 'smalltalk', sourceText.encode('utf-8'))
+
+    def testSameTreeAsSerialParsing(self):
+        sourceText = "| a |\n<pragma>\na := 1.5 + (2 . 3).\r\n\t'it''s. ok' size. \"a. comment\" $. value.\n[:x | x. a] value: #(1 . 2); yourself.\n{1. 2} first.\n"
+        parseTree = parseTopLevelStatementsInParallel(self.makeSourceCode(sourceText), 2)
+        self.assertIsNotNone(parseTree)
+        self.assertSameSyntax(ASGParseTreeFrontEnd().visitNode(parseSourceString(sourceText)), ASGParseTreeFrontEnd().visitNode(parseTree))
+
+    def testSameSyntaxAsSerialSyntaxBuilding(self):
+        sourceText = "| a |\n<pragma>\na := 1.5 + (2 . 3).\r\n\t'it''s. ok' size. \"a. comment\" $. value.\n[:x | x. a] value: #(1 . 2); yourself.\n3 + 4; * 10.\na + b * c; - d.\n"
+        sourceCode = self.makeSourceCode(sourceText)
+        tokens = scanSourceCode(sourceCode)
+        syntaxBuilder = ASGSyntaxBuilder()
+        serialSyntax, serialErrors = parseTopLevelExpressionWithErrors(ParserState(sourceCode, tokens, syntaxBuilder))
+        self.assertEqual(serialErrors, [])
+
+        result = parseTopLevelStatementsInParallelWithCounts(sourceCode, 2, ASGSyntaxBuilder)
+        self.assertIsNotNone(result)
+        parallelSyntax, tokenCount, builtNodeCount = result
+        self.assertSameSyntax(serialSyntax, parallelSyntax)
+        self.assertEqual(tokenCount, len(tokens))
+        self.assertEqual(builtNodeCount, syntaxBuilder.builtNodeCount)
+
+    def testUnbalancedSourceIsNotSplit(self):
+        self.assertIsNone(parseTopLevelStatementsInParallel(self.makeSourceCode('a. (b. c'), 2))
+
+    def testErrorsAreReportedSerially(self):
+        sourceCode = self.makeSourceCode('a. 1 2. b')
+        self.assertIsNone(parseTopLevelStatementsInParallel(sourceCode, 2))
+        parseTree, errorNodes = parseSourceCodeInParallelWithErrors(sourceCode, 2)
+        self.assertEqual(list(map(lambda errorNode: errorNode.message, errorNodes)), ['Expected dot before expression.'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
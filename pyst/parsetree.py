@@ -16,6 +16,8 @@ class SourceCode:
         return os.path.join(self.directory, self.name)
 
 class SourcePosition:
+    __slots__ = ('sourceCode', 'startIndex', 'endIndex', 'startLine', 'startColumn', 'endLine', 'endColumn')
+
     def __init__(self, sourceCode: SourceCode, startIndex: int, endIndex: int, startLine: int, startColumn: int, endLine: int, endColumn: int) -> None:
         self.sourceCode = sourceCode
         self.startIndex = startIndex
@@ -155,6 +157,8 @@ class ParseTreeVisitor(ABC):
         pass
 
 class ParseTreeNode(ABC):
+    __slots__ = ('sourcePosition',)
+
     def __init__(self, sourcePosition: SourcePosition) -> None:
         self.sourcePosition = sourcePosition
 
@@ -232,6 +236,8 @@ class ParseTreeNode(ABC):
         return False
 
 class ParseTreeErrorNode(ParseTreeNode):
+    __slots__ = ('message', 'innerNodes')
+
     def __init__(self, sourcePosition: SourcePosition, message: str, innerNodes: list[ParseTreeNode] = []) -> None:
         super().__init__(sourcePosition)
         self.message = message
@@ -244,6 +250,8 @@ class ParseTreeErrorNode(ParseTreeNode):
         return True
 
 class ParseTreeApplicationNode(ParseTreeNode):
+    __slots__ = ('functional', 'arguments')
+
     def __init__(self, sourcePosition: SourcePosition, functional: ParseTreeNode, arguments: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.functional = functional
@@ -256,6 +264,8 @@ class ParseTreeApplicationNode(ParseTreeNode):
         return True
     
 class ParseTreeArgumentNode(ParseTreeNode):
+    __slots__ = ('name',)
+
     def __init__(self, sourcePosition: SourcePosition, name: str) -> None:
         super().__init__(sourcePosition)
         self.name = name
@@ -267,6 +277,8 @@ class ParseTreeArgumentNode(ParseTreeNode):
         return True
 
 class ParseTreeArrayNode(ParseTreeNode):
+    __slots__ = ('elements',)
+
     def __init__(self, sourcePosition: SourcePosition, elements: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.elements = elements
@@ -278,6 +290,8 @@ class ParseTreeArrayNode(ParseTreeNode):
         return True
 
 class ParseTreeAssignmentNode(ParseTreeNode):
+    __slots__ = ('variable', 'value')
+
     def __init__(self, sourcePosition: SourcePosition, variable: ParseTreeNode, value: ParseTreeNode) -> None:
         super().__init__(sourcePosition)
         self.variable = variable
@@ -290,6 +304,8 @@ class ParseTreeAssignmentNode(ParseTreeNode):
         return True
     
 class ParseTreeBinaryExpressionSequenceNode(ParseTreeNode):
+    __slots__ = ('elements',)
+
     def __init__(self, sourcePosition: SourcePosition, elements: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.elements = elements
@@ -309,6 +325,8 @@ class ParseTreeBinaryExpressionSequenceNode(ParseTreeNode):
         return receiverSequence, ParseTreeCascadeMessageNode(self.sourcePosition, self.elements[-2], [self.elements[-1]])
 
 class ParseTreeBlockNode(ParseTreeNode):
+    __slots__ = ('arguments', 'body')
+
     def __init__(self, sourcePosition: SourcePosition, arguments: list[ParseTreeNode], body: ParseTreeNode) -> None:
         super().__init__(sourcePosition)
         self.arguments = arguments
@@ -321,6 +339,8 @@ class ParseTreeBlockNode(ParseTreeNode):
         return True
 
 class ParseTreeMessageCascadeNode(ParseTreeNode):
+    __slots__ = ('receiver', 'messages')
+
     def __init__(self, sourcePosition: SourcePosition, receiver: ParseTreeNode, messages: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.receiver = receiver
@@ -333,6 +353,8 @@ class ParseTreeMessageCascadeNode(ParseTreeNode):
         return True
     
 class ParseTreeCascadeMessageNode(ParseTreeNode):
+    __slots__ = ('selector', 'arguments')
+
     def __init__(self, sourcePosition: SourcePosition, selector: ParseTreeNode, arguments: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.selector = selector
@@ -345,6 +367,8 @@ class ParseTreeCascadeMessageNode(ParseTreeNode):
         return True
     
 class ParseTreeIdentifierReferenceNode(ParseTreeNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: str) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -356,6 +380,8 @@ class ParseTreeIdentifierReferenceNode(ParseTreeNode):
         return True
 
 class ParseTreeLexicalSequenceNode(ParseTreeNode):
+    __slots__ = ('locals', 'pragmas', 'elements')
+
     def __init__(self, sourcePosition: SourcePosition, locals: list[ParseTreeNode], pragmas: list[ParseTreeNode], elements: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.locals = locals
@@ -369,6 +395,8 @@ class ParseTreeLexicalSequenceNode(ParseTreeNode):
         return True
     
 class ParseTreeLiteralArrayNode(ParseTreeNode):
+    __slots__ = ('elements',)
+
     def __init__(self, sourcePosition: SourcePosition, elements: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.elements = elements
@@ -380,10 +408,14 @@ class ParseTreeLiteralArrayNode(ParseTreeNode):
         return True
 
 class ParseTreeLiteralNode(ParseTreeNode):
+    __slots__ = ()
+
     def isLiteralNode(self) -> bool:
         return True
 
 class ParseTreeLiteralCharacterNode(ParseTreeLiteralNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: int) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -395,6 +427,8 @@ class ParseTreeLiteralCharacterNode(ParseTreeLiteralNode):
         return True
 
 class ParseTreeLiteralFloatNode(ParseTreeLiteralNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: float) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -406,6 +440,8 @@ class ParseTreeLiteralFloatNode(ParseTreeLiteralNode):
         return True
 
 class ParseTreeLiteralIntegerNode(ParseTreeLiteralNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: int) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -417,6 +453,8 @@ class ParseTreeLiteralIntegerNode(ParseTreeLiteralNode):
         return True
 
 class ParseTreePragmaNode(ParseTreeLiteralNode):
+    __slots__ = ('selector', 'arguments')
+
     def __init__(self, sourcePosition: SourcePosition, selector: ParseTreeNode, arguments: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.selector = selector
@@ -429,6 +467,8 @@ class ParseTreePragmaNode(ParseTreeLiteralNode):
         return True
     
 class ParseTreeLiteralStringNode(ParseTreeLiteralNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: str) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -440,6 +480,8 @@ class ParseTreeLiteralStringNode(ParseTreeLiteralNode):
         return True
 
 class ParseTreeLiteralSymbolNode(ParseTreeLiteralNode):
+    __slots__ = ('value',)
+
     def __init__(self, sourcePosition: SourcePosition, value: str) -> None:
         super().__init__(sourcePosition)
         self.value = value
@@ -451,6 +493,8 @@ class ParseTreeLiteralSymbolNode(ParseTreeLiteralNode):
         return True
 
 class ParseTreeLocalVariableNode(ParseTreeNode):
+    __slots__ = ('name',)
+
     def __init__(self, sourcePosition: SourcePosition, name: str) -> None:
         super().__init__(sourcePosition)
         self.name = name
@@ -462,6 +506,8 @@ class ParseTreeLocalVariableNode(ParseTreeNode):
         return True
     
 class ParseTreeMessageSendNode(ParseTreeNode):
+    __slots__ = ('receiver', 'selector', 'arguments')
+
     def __init__(self, sourcePosition: SourcePosition, receiver: ParseTreeNode, selector: ParseTreeNode, arguments: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.receiver = receiver
@@ -478,6 +524,8 @@ class ParseTreeMessageSendNode(ParseTreeNode):
         return True
 
 class ParseTreeReturnNode(ParseTreeNode):
+    __slots__ = ('expression',)
+
     def __init__(self, sourcePosition: SourcePosition, expression: ParseTreeNode) -> None:
         super().__init__(sourcePosition)
         self.expression = expression
@@ -489,6 +537,8 @@ class ParseTreeReturnNode(ParseTreeNode):
         return True
 
 class ParseTreeSequenceNode(ParseTreeNode):
+    __slots__ = ('elements',)
+
     def __init__(self, sourcePosition: SourcePosition, elements: list[ParseTreeNode]) -> None:
         super().__init__(sourcePosition)
         self.elements = elements
@@ -499,6 +549,84 @@ class ParseTreeSequenceNode(ParseTreeNode):
     def isSequenceNode(self) -> bool:
         return True
 
+class ParseTreeBuilder:
+    """
+    Builds the parse tree nodes for the parser. Other builders can construct a different representation while parsing.
+    """
+    supportsReturnNodes = True
+
+    def sourcePositionOf(self, node) -> SourcePosition:
+        return node.sourcePosition
+
+    def messageSendCascadeReceiverAndFirstMessage(self, node):
+        return node.asMessageSendCascadeReceiverAndFirstMessage()
+
+    def errorNode(self, sourcePosition: SourcePosition, message: str, innerNodes: list = []):
+        return ParseTreeErrorNode(sourcePosition, message, innerNodes)
+
+    def applicationNode(self, sourcePosition: SourcePosition, functional, arguments: list):
+        return ParseTreeApplicationNode(sourcePosition, functional, arguments)
+
+    def argumentNode(self, sourcePosition: SourcePosition, name: str):
+        return ParseTreeArgumentNode(sourcePosition, name)
+
+    def arrayNode(self, sourcePosition: SourcePosition, elements: list):
+        return ParseTreeArrayNode(sourcePosition, elements)
+
+    def assignmentNode(self, sourcePosition: SourcePosition, store, value):
+        return ParseTreeAssignmentNode(sourcePosition, store, value)
+
+    def binaryExpressionSequenceNode(self, sourcePosition: SourcePosition, elements: list):
+        return ParseTreeBinaryExpressionSequenceNode(sourcePosition, elements)
+
+    def blockNode(self, sourcePosition: SourcePosition, arguments: list, body):
+        return ParseTreeBlockNode(sourcePosition, arguments, body)
+
+    def cascadeMessageNode(self, sourcePosition: SourcePosition, selector, arguments: list):
+        return ParseTreeCascadeMessageNode(sourcePosition, selector, arguments)
+
+    def identifierReferenceNode(self, sourcePosition: SourcePosition, value: str):
+        return ParseTreeIdentifierReferenceNode(sourcePosition, value)
+
+    def lexicalSequenceNode(self, sourcePosition: SourcePosition, locals: list, pragmas: list, elements: list):
+        return ParseTreeLexicalSequenceNode(sourcePosition, locals, pragmas, elements)
+
+    def literalArrayNode(self, sourcePosition: SourcePosition, elements: list):
+        return ParseTreeLiteralArrayNode(sourcePosition, elements)
+
+    def literalCharacterNode(self, sourcePosition: SourcePosition, value: int):
+        return ParseTreeLiteralCharacterNode(sourcePosition, value)
+
+    def literalFloatNode(self, sourcePosition: SourcePosition, value: float):
+        return ParseTreeLiteralFloatNode(sourcePosition, value)
+
+    def literalIntegerNode(self, sourcePosition: SourcePosition, value: int):
+        return ParseTreeLiteralIntegerNode(sourcePosition, value)
+
+    def literalStringNode(self, sourcePosition: SourcePosition, value: str):
+        return ParseTreeLiteralStringNode(sourcePosition, value)
+
+    def literalSymbolNode(self, sourcePosition: SourcePosition, value: str):
+        return ParseTreeLiteralSymbolNode(sourcePosition, value)
+
+    def localVariableNode(self, sourcePosition: SourcePosition, name: str):
+        return ParseTreeLocalVariableNode(sourcePosition, name)
+
+    def messageCascadeNode(self, sourcePosition: SourcePosition, receiver, messages: list):
+        return ParseTreeMessageCascadeNode(sourcePosition, receiver, messages)
+
+    def messageSendNode(self, sourcePosition: SourcePosition, receiver, selector, arguments: list):
+        return ParseTreeMessageSendNode(sourcePosition, receiver, selector, arguments)
+
+    def pragmaNode(self, sourcePosition: SourcePosition, selector, arguments: list):
+        return ParseTreePragmaNode(sourcePosition, selector, arguments)
+
+    def returnNode(self, sourcePosition: SourcePosition, expression):
+        return ParseTreeReturnNode(sourcePosition, expression)
+
+    def sequenceNode(self, sourcePosition: SourcePosition, elements: list):
+        return ParseTreeSequenceNode(sourcePosition, elements)
+
 class ParseTreeSequentialVisitor(ParseTreeVisitor):
     def visitErrorNode(self, node: ParseTreeErrorNode):
         self.visitNodes(node.innerNodes)
@@ -532,7 +660,9 @@ class ParseTreeSequentialVisitor(ParseTreeVisitor):
         pass
 
     def visitLexicalSequenceNode(self, node: ParseTreeLexicalSequenceNode):
-        pass
+        self.visitNodes(node.locals)
+        self.visitNodes(node.pragmas)
+        self.visitNodes(node.elements)
 
     def visitLiteralNode(self, node: ParseTreeLiteralNode):
         pass
@@ -0,0 +1,384 @@
+import sys
+import time
+import threading
+from .interpreter import *
+from .analysis import ASGExpansionAndAnalysisAlgorithm
+from .optimization import ASGGraphRewritingAlgorithm
+
+class ASGInstructionProfile:
+    def __init__(self, instructions: ASGNodeWithInterpretableInstructions, pc: int) -> None:
+        self.instructions = instructions
+        self.pc = pc
+        self.executionCount = 0
+        self.cumulativeTime = 0.0
+
+    def getInstruction(self) -> ASGInterpretableInstruction:
+        return self.instructions.instructions[self.pc]
+
+    def getSourcePosition(self):
+        return self.instructions.sourcePositionAt(self.pc)
+
+class ASGBlockProfile:
+    def __init__(self, instructions: ASGNodeWithInterpretableInstructions) -> None:
+        self.instructions = instructions
+        self.callCount = 0
+        self.cumulativeTime = 0.0
+        self.selfTime = 0.0
+
+    def getName(self) -> str:
+        return blockProfileNameOf(self.instructions)
+
+class ASGProfileCallTreeNode:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.callCount = 0
+        self.cumulativeTime = 0.0
+        self.children = {}
+
+    def getChildNamed(self, name: str):
+        child = self.children.get(name, None)
+        if child is None:
+            child = ASGProfileCallTreeNode(name)
+            self.children[name] = child
+        return child
+
+    def getSelfTime(self) -> float:
+        return self.cumulativeTime - sum(map(lambda child: child.cumulativeTime, self.children.values()))
+
+def blockProfileNameOf(instructions: ASGNodeWithInterpretableInstructions) -> str:
+    if instructions.name is None:
+        return 'image %s' % instructions.imageLocation
+    return instructions.name
+
+class ASGInterpreterProfiler:
+    """
+    Collects the execution counts and the cumulative times of the interpreted instructions and blocks.
+    """
+    activeProfiler = None
+
+    def __init__(self) -> None:
+        self.instructionProfiles = {}
+        self.blockProfiles = {}
+        self.callTree = ASGProfileCallTreeNode('<root>')
+        self.callTreeStack = [self.callTree]
+        self.childrenTimeStack = [0.0]
+        self.previousActivationContextClass = None
+
+    def start(self):
+        ASGInterpreterProfiler.activeProfiler = self
+        self.previousActivationContextClass = ASGNodeWithInterpretableInstructions.activationContextClass
+        ASGNodeWithInterpretableInstructions.activationContextClass = ASGNodeProfilingInterpreterActivationContext
+
+    def stop(self):
+        ASGNodeWithInterpretableInstructions.activationContextClass = self.previousActivationContextClass
+        ASGInterpreterProfiler.activeProfiler = None
+
+    def enterBlock(self, instructions: ASGNodeWithInterpretableInstructions):
+        treeNode = self.callTreeStack[-1].getChildNamed(blockProfileNameOf(instructions))
+        self.callTreeStack.append(treeNode)
+        self.childrenTimeStack.append(0.0)
+
+    def exitBlock(self, instructions: ASGNodeWithInterpretableInstructions, elapsedTime: float):
+        childrenTime = self.childrenTimeStack.pop()
+        self.childrenTimeStack[-1] += elapsedTime
+        treeNode = self.callTreeStack.pop()
+        treeNode.callCount += 1
+        treeNode.cumulativeTime += elapsedTime
+
+        blockProfile = self.blockProfiles.get(instructions, None)
+        if blockProfile is None:
+            blockProfile = ASGBlockProfile(instructions)
+            self.blockProfiles[instructions] = blockProfile
+        blockProfile.callCount += 1
+        blockProfile.cumulativeTime += elapsedTime
+        blockProfile.selfTime += elapsedTime - childrenTime
+
+    def recordInstruction(self, instructions: ASGNodeWithInterpretableInstructions, pc: int, elapsedTime: float):
+        key = (instructions, pc)
+        instructionProfile = self.instructionProfiles.get(key, None)
+        if instructionProfile is None:
+            instructionProfile = ASGInstructionProfile(instructions, pc)
+            self.instructionProfiles[key] = instructionProfile
+        instructionProfile.executionCount += 1
+        instructionProfile.cumulativeTime += elapsedTime
+
+    def flatReport(self) -> str:
+        result = 'Blocks:\n'
+        result += '%10s %12s %12s  %s\n' % ('calls', 'total ms', 'self ms', 'block')
+        for blockProfile in sorted(self.blockProfiles.values(), key = lambda profile: profile.selfTime, reverse = True):
+            result += '%10d %12.3f %12.3f  %s\n' % (blockProfile.callCount, blockProfile.cumulativeTime * 1000.0, blockProfile.selfTime * 1000.0, blockProfile.getName())
+
+        result += 'Instructions:\n'
+        result += '%10s %12s  %s\n' % ('count', 'total ms', 'instruction')
+        for instructionProfile in sorted(self.instructionProfiles.values(), key = lambda profile: profile.cumulativeTime, reverse = True):
+            result += '%10d %12.3f  %s %s\n' % (instructionProfile.executionCount, instructionProfile.cumulativeTime * 1000.0, str(instructionProfile.getSourcePosition()), instructionProfile.getInstruction().printName())
+        return result
+
+    def treeReport(self) -> str:
+        result = '%10s %12s %12s  %s\n' % ('calls', 'total ms', 'self ms', 'call tree')
+        pendingNodes = list(map(lambda child: (child, 0), reversed(self.callTree.children.values())))
+        while len(pendingNodes) != 0:
+            treeNode, depth = pendingNodes.pop()
+            result += '%10d %12.3f %12.3f  %s%s\n' % (treeNode.callCount, treeNode.cumulativeTime * 1000.0, treeNode.getSelfTime() * 1000.0, '  ' * depth, treeNode.name)
+            pendingNodes += map(lambda child: (child, depth + 1), reversed(treeNode.children.values()))
+        return result
+
+    def collapsedStacks(self) -> str:
+        # The collapsed stack format of the flamegraph tools, weighted by the self time in microseconds.
+        result = ''
+        pendingNodes = list(map(lambda child: (child, child.name), self.callTree.children.values()))
+        while len(pendingNodes) != 0:
+            treeNode, stack = pendingNodes.pop()
+            selfTime = int(treeNode.getSelfTime() * 1000000.0)
+            if selfTime > 0:
+                result += '%s %d\n' % (stack, selfTime)
+            pendingNodes += map(lambda child: (child, stack + ';' + child.name), treeNode.children.values())
+        return result
+
+    def writeCollapsedStacksToFileNamed(self, filename: str):
+        with open(filename, 'w') as f:
+            f.write(self.collapsedStacks())
+
+class ASGNodeProfilingInterpreterActivationContext(ASGNodeCountingInterpreterActivationContext):
+    def execute(self):
+        profiler = ASGInterpreterProfiler.activeProfiler
+        instructions = self.instructions
+        constantCount = instructions.constantCount
+        profiler.enterBlock(instructions)
+        self.shouldReturn = False
+        executedInstructionCount = 0
+        startTime = time.perf_counter()
+        try:
+            while not self.shouldReturn:
+                pc = self.pc
+                instruction = instructions.instructions[pc]
+                parameters = instructions.slotParametersLists[pc - constantCount]
+                self.pc += 1
+                executedInstructionCount += 1
+                instructionStartTime = time.perf_counter()
+                self.data[instructions.resultSlots[pc - constantCount]] = instruction.interpretInContext(self, parameters)
+                instructionTime = time.perf_counter() - instructionStartTime
+                profiler.recordInstruction(instructions, pc, instructionTime)
+        finally:
+            elapsedTime = time.perf_counter() - startTime
+            ASGNodeCountingInterpreterActivationContext.executedInstructionCount += executedInstructionCount
+            profiler.exitBlock(instructions, elapsedTime)
+
+        return self.result
+
+class ASGSourceLineSamples:
+    def __init__(self, sourceCode, line: int) -> None:
+        self.sourceCode = sourceCode
+        self.line = line
+        self.selfSamples = 0
+        self.totalSamples = 0
+
+class ASGSamplingProfiler:
+    """
+    Periodically samples the chain of activation contexts that are being executed by a thread, and aggregates the samples per source line.
+    The callers of a context are found through the Python frames of the interpreter loops, so the interpreter does not pay anything for them.
+    """
+    def __init__(self, samplingInterval: float = 0.005) -> None:
+        self.samplingInterval = samplingInterval
+        self.sampledThreadId = None
+        self.samplerThread = None
+        self.stopEvent = threading.Event()
+        self.sampleCount = 0
+        self.lineSamples = {}
+
+    def start(self):
+        self.sampledThreadId = threading.get_ident()
+        self.stopEvent.clear()
+        self.samplerThread = threading.Thread(target = self.samplingLoop, daemon = True)
+        self.samplerThread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.samplerThread is not None:
+            self.samplerThread.join()
+            self.samplerThread = None
+
+    def samplingLoop(self):
+        while not self.stopEvent.wait(self.samplingInterval):
+            frame = sys._current_frames().get(self.sampledThreadId, None)
+            if frame is not None:
+                self.recordSample(self.activationContextChainOf(frame))
+
+    def activationContextChainOf(self, frame) -> list:
+        chain = []
+        while frame is not None:
+            if frame.f_code.co_name == 'execute':
+                context = frame.f_locals.get('self', None)
+                if isinstance(context, ASGNodeInterpreterActivationContext):
+                    chain.append((context.instructions, context.pc - 1))
+            frame = frame.f_back
+        return chain
+
+    def recordSample(self, chain: list):
+        if len(chain) == 0:
+            return
+
+        self.sampleCount += 1
+        sampledLines = set()
+        for instructions, pc in chain:
+            if pc < instructions.startpc or pc >= len(instructions.instructions):
+                continue
+
+            sourcePosition = instructions.sourcePositionAt(pc)
+            if not isinstance(sourcePosition, SourcePosition):
+                continue
+
+            key = (str(sourcePosition.sourceCode), sourcePosition.startLine)
+            samples = self.lineSamples.get(key, None)
+            if samples is None:
+                samples = ASGSourceLineSamples(sourcePosition.sourceCode, sourcePosition.startLine)
+                self.lineSamples[key] = samples
+
+            if len(sampledLines) == 0:
+                samples.selfSamples += 1
+            if key not in sampledLines:
+                samples.totalSamples += 1
+                sampledLines.add(key)
+
+    def report(self) -> str:
+        result = '%d samples every %.3f ms\n' % (self.sampleCount, self.samplingInterval * 1000.0)
+        result += '%10s %10s  %s\n' % ('self', 'total', 'line')
+        for samples in sorted(self.lineSamples.values(), key = lambda samples: (samples.selfSamples, samples.totalSamples), reverse = True):
+            result += '%10d %10d  %s:%d\n' % (samples.selfSamples, samples.totalSamples, str(samples.sourceCode), samples.line)
+        return result
+
+    def writeReportToFileNamed(self, filename: str):
+        with open(filename, 'w') as f:
+            f.write(self.report())
+
+class ASGPatternProfile:
+    def __init__(self, pattern) -> None:
+        self.pattern = pattern
+        self.name = pattern.function.__qualname__
+        self.invocationCount = 0
+        self.memoHitCount = 0
+        self.cumulativeTime = 0.0
+        self.selfTime = 0.0
+
+class ASGBuilderProfile:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lookupCount = 0
+        self.hitCount = 0
+        self.walkedScopeCount = 0
+        self.maxScopeDepth = 0
+
+class ASGAnalysisProfiler:
+    """
+    Measures the pattern functions of the dynamic programming algorithms and the unification lookups of the builders along their parent builders.
+    The instrumented functions are only installed while the profiler is running.
+    """
+    def __init__(self) -> None:
+        self.patternProfiles = {}
+        self.expansionResultProfiles = {}
+        self.builderProfiles = {}
+        self.childrenTimeStack = [0.0]
+        self.originalPatternFunctions = {}
+        self.originalFromNodeContinueExpanding = None
+        self.originalUnifyChildNode = None
+
+    def allPatterns(self):
+        visitedPatterns = set()
+        pendingClasses = [ASGDynamicProgrammingAlgorithm]
+        while len(pendingClasses) != 0:
+            algorithmClass = pendingClasses.pop()
+            pendingClasses += algorithmClass.__subclasses__()
+            for pattern in algorithmClass.__asgDPAPatterns__:
+                if pattern not in visitedPatterns:
+                    visitedPatterns.add(pattern)
+                    yield pattern
+
+    def start(self):
+        for pattern in self.allPatterns():
+            self.originalPatternFunctions[pattern] = pattern.function
+            pattern.function = self.makeProfiledPatternFunction(pattern)
+
+        self.originalFromNodeContinueExpanding = ASGDynamicProgrammingAlgorithm.fromNodeContinueExpanding
+        self.originalUnifyChildNode = ASGBuilderWithGVN.unifyChildNode
+        ASGDynamicProgrammingAlgorithm.fromNodeContinueExpanding = self.makeProfiledFromNodeContinueExpanding()
+        ASGBuilderWithGVN.unifyChildNode = self.makeProfiledUnifyChildNode()
+
+    def stop(self):
+        for pattern, function in self.originalPatternFunctions.items():
+            pattern.function = function
+        self.originalPatternFunctions = {}
+        ASGDynamicProgrammingAlgorithm.fromNodeContinueExpanding = self.originalFromNodeContinueExpanding
+        ASGBuilderWithGVN.unifyChildNode = self.originalUnifyChildNode
+
+    def makeProfiledPatternFunction(self, pattern):
+        function = pattern.function
+        patternProfile = ASGPatternProfile(pattern)
+        self.patternProfiles[pattern] = patternProfile
+
+        def profiledPatternFunction(algorithm, *arguments):
+            # The expansion result of the node is registered right before invoking its pattern.
+            expansionResult = algorithm.processedNodes.get(arguments[-1], None)
+            if expansionResult is not None:
+                self.expansionResultProfiles[expansionResult] = patternProfile
+
+            patternProfile.invocationCount += 1
+            self.childrenTimeStack.append(0.0)
+            startTime = time.perf_counter()
+            try:
+                return function(algorithm, *arguments)
+            finally:
+                elapsedTime = time.perf_counter() - startTime
+                childrenTime = self.childrenTimeStack.pop()
+                self.childrenTimeStack[-1] += elapsedTime
+                patternProfile.cumulativeTime += elapsedTime
+                patternProfile.selfTime += elapsedTime - childrenTime
+        return profiledPatternFunction
+
+    def makeProfiledFromNodeContinueExpanding(self):
+        originalFromNodeContinueExpanding = self.originalFromNodeContinueExpanding
+
+        def profiledFromNodeContinueExpanding(algorithm, incomingDelegatingNode, node):
+            expansionResult = algorithm.processedNodes.get(node, None)
+            if expansionResult is not None and expansionResult.hasFinished:
+                patternProfile = self.expansionResultProfiles.get(expansionResult, None)
+                if patternProfile is not None:
+                    patternProfile.memoHitCount += 1
+            return originalFromNodeContinueExpanding(algorithm, incomingDelegatingNode, node)
+        return profiledFromNodeContinueExpanding
+
+    def makeProfiledUnifyChildNode(self):
+        def profiledUnifyChildNode(builder, node):
+            builderProfile = self.builderProfiles.get(builder.__class__, None)
+            if builderProfile is None:
+                builderProfile = ASGBuilderProfile(builder.__class__.__name__)
+                self.builderProfiles[builder.__class__] = builderProfile
+
+            unified = None
+            currentBuilder = builder
+            while currentBuilder is not None:
+                builderProfile.walkedScopeCount += 1
+                unified = currentBuilder.builtNodes.get(node, None)
+                if unified is not None:
+                    break
+                currentBuilder = currentBuilder.parentBuilder
+
+            builderProfile.lookupCount += 1
+            if unified is not None:
+                builderProfile.hitCount += 1
+            builderProfile.maxScopeDepth = max(builderProfile.maxScopeDepth, builder.scopeDepth)
+            return unified
+        return profiledUnifyChildNode
+
+    def report(self) -> str:
+        result = 'Patterns:\n'
+        result += '%10s %10s %12s %12s  %s\n' % ('calls', 'memo hits', 'total ms', 'self ms', 'pattern')
+        for patternProfile in sorted(self.patternProfiles.values(), key = lambda profile: profile.selfTime, reverse = True):
+            if patternProfile.invocationCount == 0 and patternProfile.memoHitCount == 0:
+                continue
+            result += '%10d %10d %12.3f %12.3f  %s\n' % (patternProfile.invocationCount, patternProfile.memoHitCount, patternProfile.cumulativeTime * 1000.0, patternProfile.selfTime * 1000.0, patternProfile.name)
+
+        result += 'Builders:\n'
+        result += '%10s %10s %14s %10s  %s\n' % ('lookups', 'hits', 'walked scopes', 'max depth', 'builder')
+        for builderProfile in self.builderProfiles.values():
+            result += '%10d %10d %14d %10d  %s\n' % (builderProfile.lookupCount, builderProfile.hitCount, builderProfile.walkedScopeCount, builderProfile.maxScopeDepth, builderProfile.name)
+        return result
@@ -2,6 +2,8 @@ from enum import Enum
 from .parsetree import SourceCode, SourcePosition
 import copy
 import os.path
+import re
+import sys
 
 TokenKind = Enum('TokenKind', [
     'END_OF_SOURCE', 'ERROR',
@@ -16,10 +18,13 @@ TokenKind = Enum('TokenKind', [
 ])
 
 class Token:
-    def __init__(self, kind: TokenKind, sourcePosition: SourcePosition, errorMessage: str = None):
+    __slots__ = ('kind', 'sourcePosition', 'errorMessage', 'value')
+
+    def __init__(self, kind: TokenKind, sourcePosition: SourcePosition, errorMessage: str = None, value = None):
         self.kind = kind
         self.sourcePosition = sourcePosition
         self.errorMessage = errorMessage
+        self.value = value
 
     def getValue(self) -> bytes:
         return self.sourcePosition.getValue()
@@ -34,12 +39,25 @@ class Token:
             return '%s: %s' % (str(self.sourcePosition), repr(self.kind))
 
 class ScannerState:
-    def __init__(self, sourceCode: SourceCode):
+    __slots__ = ('sourceCode', 'stringTable', 'position', 'line', 'column', 'isPreviousCR')
+
+    def __init__(self, sourceCode: SourceCode, stringTable: dict = None):
         self.sourceCode = sourceCode
+        self.stringTable = stringTable if stringTable is not None else {}
         self.position = 0
         self.line = 1
         self.column = 1
         self.isPreviousCR = False
+
+    def __copy__(self):
+        state = ScannerState.__new__(ScannerState)
+        state.sourceCode = self.sourceCode
+        state.stringTable = self.stringTable
+        state.position = self.position
+        state.line = self.line
+        state.column = self.column
+        state.isPreviousCR = self.isPreviousCR
+        return state
     
     def atEnd(self) -> bool:
         return self.position >= len(self.sourceCode.text)
@@ -73,7 +91,29 @@ class ScannerState:
     def advanceCount(self, count: int) -> None:
         for i in range(count):
             self.advance()
-        
+
+    def advanceTo(self, endIndex: int) -> None:
+        text = self.sourceCode.text
+        if text.find(b'\r', self.position, endIndex) >= 0:
+            self.advanceCount(endIndex - self.position)
+            return
+
+        while self.isPreviousCR and self.position < endIndex:
+            self.advance()
+
+        # Without carriage returns, only the characters after the last new line affect the column.
+        lastNewLine = text.rfind(b'\n', self.position, endIndex)
+        if lastNewLine >= 0:
+            self.line += text.count(b'\n', self.position, endIndex)
+            self.column = 1
+            self.position = lastNewLine + 1
+
+        if text.find(b'\t', self.position, endIndex) >= 0:
+            self.advanceCount(endIndex - self.position)
+        else:
+            self.column += endIndex - self.position
+            self.position = endIndex
+
     def makeToken(self, kind: TokenKind) -> Token:
         sourcePosition = SourcePosition(self.sourceCode, self.position, self.position, self.line, self.column, self.line, self.column)
         return Token(kind, sourcePosition)
@@ -82,6 +122,25 @@ class ScannerState:
         sourcePosition = SourcePosition(self.sourceCode, initialState.position, self.position, initialState.line, initialState.column, self.line, self.column)
         return Token(kind, sourcePosition)
 
+    def internTextFrom(self, startIndex: int) -> str:
+        # The copies of the state share the string table, so each distinct name is decoded only once per compilation.
+        text = self.sourceCode.text[startIndex:self.position]
+        string = self.stringTable.get(text, None)
+        if string is None:
+            string = sys.intern(text.decode('utf-8'))
+            self.stringTable[text] = string
+        return string
+
+    def makeInternedTokenStartingFrom(self, kind: TokenKind, initialState, prefixSize: int = 0) -> Token:
+        token = self.makeTokenStartingFrom(kind, initialState)
+        token.value = self.internTextFrom(initialState.position + prefixSize)
+        return token
+
+    def makeTokenWithValueStartingFrom(self, kind: TokenKind, initialState, value) -> Token:
+        token = self.makeTokenStartingFrom(kind, initialState)
+        token.value = value
+        return token
+
     def makeErrorTokenStartingFrom(self, errorMessage: str, initialState):
         sourcePosition = SourcePosition(self.sourceCode, initialState.position, self.position, initialState.line, initialState.column, self.line, self.column)
         return Token(TokenKind.ERROR, sourcePosition, errorMessage)
@@ -125,6 +184,31 @@ def isIdentifierMiddle(c: int) -> bool:
 def isOperatorCharacter(c: int) -> bool:
     return c >= 0 and c in b'+-/\\*~<>=@,%|&?!^'
 
+def decodeIntegerLiteral(text: bytes) -> int:
+    radixIndex = text.find(b'r')
+    if radixIndex < 0:
+        radixIndex = text.find(b'R')
+    if radixIndex < 0:
+        return int(text)
+
+    radix = int(text[0:radixIndex])
+    radixedInteger = int(text[radixIndex + 1:], abs(radix))
+    if radix < 0:
+        return -radixedInteger
+    else:
+        return radixedInteger
+
+def decodeQuotedLiteral(text: bytes) -> str:
+    return text.replace(b"''", b"'").decode('utf-8')
+
+def scanQuotedLiteralEnd(state: ScannerState, startIndex: int) -> int:
+    # Returns the index of the closing quote, skipping the doubled quotes, or -1 if the literal is incomplete.
+    text = state.sourceCode.text
+    quoteIndex = text.find(b"'", startIndex)
+    while quoteIndex >= 0 and text[quoteIndex + 1:quoteIndex + 2] == b"'":
+        quoteIndex = text.find(b"'", quoteIndex + 2)
+    return quoteIndex
+
 def scanAdvanceKeyword(state: ScannerState) -> tuple[ScannerState, Token]:
     if not isIdentifierStart(state.peek()):
         return state, False
@@ -164,11 +248,11 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
                 isMultiKeyword = isMultiKeyword or hasAdvanced
 
             if isMultiKeyword:
-                return state, state.makeTokenStartingFrom(TokenKind.MULTI_KEYWORD, initialState)
+                return state, state.makeInternedTokenStartingFrom(TokenKind.MULTI_KEYWORD, initialState)
             else:
-                return state, state.makeTokenStartingFrom(TokenKind.KEYWORD, initialState)
+                return state, state.makeInternedTokenStartingFrom(TokenKind.KEYWORD, initialState)
         
-        return state, state.makeTokenStartingFrom(TokenKind.IDENTIFIER, initialState)
+        return state, state.makeInternedTokenStartingFrom(TokenKind.IDENTIFIER, initialState)
     
     ## Numbers
     if isDigit(c) or ((state.peek() == b'+'[0] or state.peek() == b'-'[0]) and isDigit(state.peek(1))):
@@ -181,7 +265,11 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
             state.advance()
             while isIdentifierMiddle(state.peek()):
                 state.advance()
-            return state, state.makeTokenStartingFrom(TokenKind.INTEGER, initialState)
+            try:
+                integerValue = decodeIntegerLiteral(state.sourceCode.text[initialState.position:state.position])
+            except ValueError:
+                return state, state.makeErrorTokenStartingFrom("Invalid radix integer literal.", initialState)
+            return state, state.makeTokenWithValueStartingFrom(TokenKind.INTEGER, initialState, integerValue)
         
         ## Decimal point.
         if state.peek() == b'.'[0] and isDigit(state.peek(1)):
@@ -195,9 +283,9 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
                     while isDigit(state.peek()):
                         state.advance()
 
-            return state, state.makeTokenStartingFrom(TokenKind.FLOAT, initialState)
+            return state, state.makeTokenWithValueStartingFrom(TokenKind.FLOAT, initialState, float(state.sourceCode.text[initialState.position:state.position]))
         
-        return state, state.makeTokenStartingFrom(TokenKind.INTEGER, initialState)
+        return state, state.makeTokenWithValueStartingFrom(TokenKind.INTEGER, initialState, int(state.sourceCode.text[initialState.position:state.position]))
 
     ## Symbols
     if c == b'#'[0]:
@@ -216,30 +304,28 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
                     isMultiKeyword = isMultiKeyword or hasAdvanced
 
                 if isMultiKeyword:
-                    return state, state.makeTokenStartingFrom(TokenKind.SYMBOL, initialState)
+                    return state, state.makeInternedTokenStartingFrom(TokenKind.SYMBOL, initialState, 1)
                 else:
-                    return state, state.makeTokenStartingFrom(TokenKind.SYMBOL, initialState)
+                    return state, state.makeInternedTokenStartingFrom(TokenKind.SYMBOL, initialState, 1)
             
-            return state, state.makeTokenStartingFrom(TokenKind.SYMBOL, initialState)
+            return state, state.makeInternedTokenStartingFrom(TokenKind.SYMBOL, initialState, 1)
 
         elif c1 == b"'"[0]:
             state.advanceCount(2)
-            while not state.atEnd() and (state.peek() != b"'"[0] or (state.peek() == b"'"[0] and state.peek(1) == b"'"[0])):
-                if state.peek() == b"'"[0] and state.peek(1) == b"'"[0]:
-                    state.advanceCount(2)
-                else:
-                    state.advance()
-
-            if state.peek() != b"'"[0]:
+            closingQuoteIndex = scanQuotedLiteralEnd(state, state.position)
+            if closingQuoteIndex < 0:
+                state.advanceTo(len(state.sourceCode.text))
                 return state, state.makeErrorTokenStartingFrom("Incomplete symbol string literal.", initialState)
+            state.advanceTo(closingQuoteIndex)
             state.advance()
 
-            return state, state.makeTokenStartingFrom(TokenKind.SYMBOL, initialState)
+            symbolValue = sys.intern(decodeQuotedLiteral(state.sourceCode.text[initialState.position + 2:closingQuoteIndex]))
+            return state, state.makeTokenWithValueStartingFrom(TokenKind.SYMBOL, initialState, symbolValue)
         elif isOperatorCharacter(c1):
             state.advanceCount(2)
             while isOperatorCharacter(state.peek()):
                 state.advance()
-            return state, state.makeTokenStartingFrom(TokenKind.SYMBOL, initialState)
+            return state, state.makeInternedTokenStartingFrom(TokenKind.SYMBOL, initialState, 1)
         elif c1 == b'['[0]:
             state.advanceCount(2)
             return state, state.makeTokenStartingFrom(TokenKind.BYTE_ARRAY_START, initialState)
@@ -250,17 +336,15 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
     ## Strings
     if c == b"'"[0]:
         state.advance()
-        while not state.atEnd() and (state.peek() != b"'"[0] or (state.peek() == b"'"[0] and state.peek(1) == b"'"[0])):
-            if state.peek() == b"'"[0] and state.peek(1) == b"'"[0]:
-                state.advanceCount(2)
-            else:
-                state.advance()
-
-        if state.peek() != b"'"[0]:
+        closingQuoteIndex = scanQuotedLiteralEnd(state, state.position)
+        if closingQuoteIndex < 0:
+            state.advanceTo(len(state.sourceCode.text))
             return state, state.makeErrorTokenStartingFrom("Incomplete string literal.", initialState)
+        state.advanceTo(closingQuoteIndex)
         state.advance()
 
-        return state, state.makeTokenStartingFrom(TokenKind.STRING, initialState)
+        stringValue = decodeQuotedLiteral(state.sourceCode.text[initialState.position + 1:closingQuoteIndex])
+        return state, state.makeTokenWithValueStartingFrom(TokenKind.STRING, initialState, stringValue)
 
     ## Characters
     if c == b"$"[0]:
@@ -269,7 +353,7 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
             return state, state.makeErrorTokenStartingFrom("Incomplete character literal.", initialState)
         state.advance()
 
-        return state, state.makeTokenStartingFrom(TokenKind.CHARACTER, initialState)
+        return state, state.makeTokenWithValueStartingFrom(TokenKind.CHARACTER, initialState, state.sourceCode.text[initialState.position + 1])
 
     if c == b'('[0]:
         state.advance()
@@ -319,18 +403,17 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
         if isOperatorCharacter(state.peek()):
             while isOperatorCharacter(state.peek()):
                 state.advance()
-            return state, state.makeTokenStartingFrom(TokenKind.OPERATOR, initialState)
-        return state, state.makeTokenStartingFrom(TokenKind.BAR, initialState)
+            return state, state.makeInternedTokenStartingFrom(TokenKind.OPERATOR, initialState)
+        return state, state.makeInternedTokenStartingFrom(TokenKind.BAR, initialState)
     elif isOperatorCharacter(c):
         while isOperatorCharacter(state.peek()):
             state.advance()
-        token = state.makeTokenStartingFrom(TokenKind.OPERATOR, initialState)
-        tokenValue = token.getValue()
-        if tokenValue == b'<':
+        token = state.makeInternedTokenStartingFrom(TokenKind.OPERATOR, initialState)
+        if token.value == '<':
             token.kind = TokenKind.LESS_THAN
-        elif tokenValue == b'>':
+        elif token.value == '>':
             token.kind = TokenKind.GREATER_THAN
-        elif tokenValue == b'^':
+        elif token.value == '^':
             token.kind = TokenKind.CARET
         return state, token
 
@@ -338,16 +421,48 @@ def scanNextToken(state: ScannerState) -> tuple[ScannerState, Token]:
     errorToken = state.makeErrorTokenStartingFrom("Unexpected character.", initialState)
     return state, errorToken
 
-def scanSourceCode(sourceCode: SourceCode) -> list[Token]:
-    state = ScannerState(sourceCode)
+def scanSourceCodeUntil(state: ScannerState, endIndex: int) -> list[Token]:
     tokens = []
     while True:
         state, token = scanNextToken(state)
+        if token.kind != TokenKind.END_OF_SOURCE and token.sourcePosition.startIndex >= endIndex:
+            tokenPosition = token.sourcePosition
+            token = Token(TokenKind.END_OF_SOURCE, SourcePosition(state.sourceCode, tokenPosition.startIndex, tokenPosition.startIndex, tokenPosition.startLine, tokenPosition.startColumn, tokenPosition.startLine, tokenPosition.startColumn))
         tokens.append(token)
         if token.kind == TokenKind.END_OF_SOURCE:
             break
     return tokens
 
+def scanSourceCode(sourceCode: SourceCode, stringTable: dict = None) -> list[Token]:
+    return scanSourceCodeUntil(ScannerState(sourceCode, stringTable), len(sourceCode.text))
+
+# Only the tokens that may contain dots, brackets or quotes are distinguished by the statement pre-scan.
+TopLevelStatementPreScanPattern = re.compile(rb"""[A-Za-z_][A-Za-z0-9_]*|[0-9]+(?:[rR][A-Za-z0-9_]*|\.[0-9]+(?:[eE][+-]?[0-9]+)?)?|'[^']*(?:''[^']*)*'|"[^"]*"|\$.|`[`',@]|(?P<open>[(\[{])|(?P<close>[)\]}])|(?P<dot>\.)|(?P<incomplete>['"$])""", re.DOTALL)
+
+def findTopLevelStatementEnds(sourceCode: SourceCode) -> list[int] | None:
+    # Returns the indices after the statement separating dots that are outside of any parenthesis, bracket or curly bracket, or None when the source is not balanced.
+    depth = 0
+    statementEnds = []
+    for match in TopLevelStatementPreScanPattern.finditer(sourceCode.text):
+        group = match.lastgroup
+        if group is None:
+            continue
+        elif group == 'dot':
+            if depth == 0:
+                statementEnds.append(match.end())
+        elif group == 'open':
+            depth += 1
+        elif group == 'close':
+            depth -= 1
+            if depth < 0:
+                return None
+        else:
+            return None
+
+    if depth != 0:
+        return None
+    return statementEnds
+
 def scanSourceString(sourceText: str, sourceName: str = '<string>') -> tuple[SourceCode, list[Token]]:
     sourceCode = SourceCode(None, sourceName, 'smalltalk', sourceText.encode('utf-8'))
     tokens = scanSourceCode(sourceCode)
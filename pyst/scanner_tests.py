@@ -1,5 +1,5 @@
 import unittest
-from .scanner import TokenKind, scanSourceString
+from .scanner import ScannerState, TokenKind, scanSourceString, findTopLevelStatementEnds
 
 class TestScanner(unittest.TestCase):
     def scanTokenKinds(self, string: str) -> list[TokenKind]:
@@ -74,5 +74,41 @@ class TestScanner(unittest.TestCase):
         self.assertEqual(self.scanTokenKinds("+"), [TokenKind.OPERATOR, TokenKind.END_OF_SOURCE])
         self.assertEqual(self.scanTokenKinds("-"), [TokenKind.OPERATOR, TokenKind.END_OF_SOURCE])
 
+    def testInternedValues(self):
+        sourceCode, tokens = scanSourceString("foo bar: foo #foo #+ + 'foo'")
+        self.assertEqual(list(map(lambda t: t.value, tokens)), ['foo', 'bar:', 'foo', 'foo', '+', '+', 'foo', None])
+        self.assertIs(tokens[0].value, tokens[2].value)
+        self.assertIs(tokens[0].value, tokens[3].value)
+        self.assertIs(tokens[4].value, tokens[5].value)
+
+    def testDecodedLiterals(self):
+        sourceCode, tokens = scanSourceString("'it''s' #'a''b' 42 -7 16r1F -2r101 2.5e1 $a")
+        self.assertEqual(list(map(lambda t: t.value, tokens[:-1])), ["it's", "a'b", 42, -7, 31, -5, 25.0, ord('a')])
+
+    def testInvalidRadixInteger(self):
+        self.assertEqual(self.scanTokenKinds("2r123"), [TokenKind.ERROR, TokenKind.END_OF_SOURCE])
+
+    def testLargeStringLiteral(self):
+        text = "line ''quoted''\n" * 100000
+        sourceCode, tokens = scanSourceString("'" + text + "' x")
+        self.assertEqual(tokens[0].value, text.replace("''", "'"))
+        self.assertEqual(tokens[1].sourcePosition.startLine, 100001)
+        self.assertEqual(tokens[1].sourcePosition.startColumn, 3)
+
+    def testTokensHaveNoInstanceDictionary(self):
+        sourceCode, tokens = scanSourceString('a')
+        for object in [tokens[0], tokens[0].sourcePosition, ScannerState(sourceCode)]:
+            self.assertFalse(hasattr(object, '__dict__'))
+
+    def testTopLevelStatementEnds(self):
+        sourceCode, tokens = scanSourceString("a := 1.5. 'b.''c'. \"d.\" $. e. [f. g] h. #(1 . 2). `'i. j")
+        dotIndices = list(map(lambda t: t.sourcePosition.endIndex, filter(lambda t: t.kind == TokenKind.DOT, tokens)))
+        self.assertEqual(findTopLevelStatementEnds(sourceCode), [dotIndices[i] for i in [0, 1, 2, 4, 6, 7]])
+
+    def testUnbalancedTopLevelStatements(self):
+        for source in ['a. (b. c', 'a) b. c', "a. 'b", 'a. "b']:
+            sourceCode, tokens = scanSourceString(source)
+            self.assertIsNone(findTopLevelStatementEnds(sourceCode))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
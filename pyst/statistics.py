@@ -0,0 +1,75 @@
+import time
+import tracemalloc
+
+class PipelineStageStatistics:
+    def __init__(self, name: str, wallTime: float, peakMemory: int) -> None:
+        self.name = name
+        self.wallTime = wallTime
+        self.peakMemory = peakMemory
+
+    def asJson(self):
+        return {'name': self.name, 'wallTime': self.wallTime, 'peakMemory': self.peakMemory}
+
+class SourceFileStatistics:
+    """
+    The wall time and tracemalloc peak of each pipeline stage of a source file, along with the counts of the produced elements.
+    """
+    def __init__(self, sourceFile: str) -> None:
+        self.sourceFile = sourceFile
+        self.stages = []
+        self.counts = {}
+
+    def measureStage(self, name: str, function, *arguments):
+        tracemalloc.reset_peak()
+        initialMemory = tracemalloc.get_traced_memory()[0]
+        startTime = time.perf_counter()
+        result = function(*arguments)
+        wallTime = time.perf_counter() - startTime
+        peakMemory = tracemalloc.get_traced_memory()[1] - initialMemory
+        self.stages.append(PipelineStageStatistics(name, wallTime, peakMemory))
+        return result
+
+    def setCount(self, name: str, value: int):
+        self.counts[name] = value
+
+    def asJson(self):
+        return {
+            'sourceFile': self.sourceFile,
+            'stages': list(map(lambda stage: stage.asJson(), self.stages)),
+            'counts': self.counts
+        }
+
+    def prettyPrint(self) -> str:
+        result = '%s\n' % self.sourceFile
+        for stage in self.stages:
+            result += '    %-16s %10.3f ms %12.1f KiB peak\n' % (stage.name, stage.wallTime * 1000.0, stage.peakMemory / 1024.0)
+        for name, value in self.counts.items():
+            result += '    %-24s %10d\n' % (name, value)
+        return result
+
+class PipelineStatistics:
+    def __init__(self) -> None:
+        self.sourceFiles = []
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def statisticsForSourceFile(self, sourceFile: str) -> SourceFileStatistics:
+        for statistics in self.sourceFiles:
+            if statistics.sourceFile == sourceFile:
+                return statistics
+
+        statistics = SourceFileStatistics(sourceFile)
+        self.sourceFiles.append(statistics)
+        return statistics
+
+    def asJson(self):
+        return {'version': 1, 'sourceFiles': list(map(lambda statistics: statistics.asJson(), self.sourceFiles))}
+
+    def prettyPrint(self) -> str:
+        return ''.join(map(lambda statistics: statistics.prettyPrint(), self.sourceFiles))
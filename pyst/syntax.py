@@ -1,5 +1,7 @@
 from .mop import *
 from .parsetree import *
+from .scanner import scanSourceString, scanFileNamed
+from .parser import ParserState, parseTopLevelExpressionWithErrors
 
 class ASGSyntaxNode(ASGNode):
     sourceDerivation = ASGNodeSourceDerivationAttribute()
@@ -14,9 +16,12 @@ class ASGSyntaxNode(ASGNode):
         return self.sourceDerivation
 
 class ASGSyntaxErrorNode(ASGSyntaxNode):
-    message = ASGNodeDataAttribute(int)
+    message = ASGNodeDataAttribute(str)
     innerNodes = ASGNodeDataInputPorts()
 
+    def prettyPrintError(self) -> str:
+        return '%s: %s' % (str(self.sourceDerivation.getSourcePosition()), self.message)
+
 class ASGSyntaxArgumentNode(ASGSyntaxNode):
     name = ASGNodeDataAttribute(str)
 
@@ -108,7 +113,7 @@ class ASGParseTreeFrontEnd(ParseTreeVisitor):
         return ASGSyntaxArrayNode(ASGNodeSourceCodeDerivation(node.sourcePosition), self.transformNodes(node.elements))
 
     def visitAssignmentNode(self, node: ParseTreeAssignmentNode):
-        return ASGSyntaxAssignmentNode(ASGNodeSourceCodeDerivation(node.sourcePosition), self.visitNode(node.store), self.visitNode(node.value))
+        return ASGSyntaxAssignmentNode(ASGNodeSourceCodeDerivation(node.sourcePosition), self.visitNode(node.variable), self.visitNode(node.value))
 
     def visitArgumentNode(self, node: ParseTreeArgumentNode):
         return ASGSyntaxArgumentNode(ASGNodeSourceCodeDerivation(node.sourcePosition), node.name)
@@ -160,3 +165,104 @@ class ASGParseTreeFrontEnd(ParseTreeVisitor):
 
     def visitSequenceNode(self, node: ParseTreeSequenceNode):
         return ASGSyntaxSequenceNode(ASGNodeSourceCodeDerivation(node.sourcePosition), self.transformNodes(node.elements))
+
+class ASGSyntaxBuilder(ParseTreeBuilder):
+    """
+    Builds the syntax nodes directly while parsing, without the intermediate parse tree.
+    """
+    # There is no syntax node for the non-local returns yet.
+    supportsReturnNodes = False
+
+    def __init__(self) -> None:
+        self.builtNodeCount = 0
+
+    def sourcePositionOf(self, node: ASGSyntaxNode) -> SourcePosition:
+        return node.sourceDerivation.getSourcePosition()
+
+    def messageSendCascadeReceiverAndFirstMessage(self, node: ASGSyntaxNode):
+        if isinstance(node, ASGSyntaxMessageSendNode):
+            return node.receiver, self.cascadeMessageNode(self.sourcePositionOf(node), node.selector, node.arguments)
+        elif isinstance(node, ASGSyntaxBinaryExpressionSequenceNode):
+            # The last operator and its argument are the first cascaded message, as in ParseTreeBinaryExpressionSequenceNode.
+            sourcePosition = self.sourcePositionOf(node)
+            elements = node.elements
+            if len(elements) == 3:
+                return elements[0], self.cascadeMessageNode(sourcePosition, elements[1], [elements[2]])
+            return self.binaryExpressionSequenceNode(sourcePosition, elements[:-2]), self.cascadeMessageNode(sourcePosition, elements[-2], [elements[-1]])
+        return node, None
+
+    def buildNode(self, nodeClass, sourcePosition: SourcePosition, *attributes):
+        self.builtNodeCount += 1
+        return nodeClass(ASGNodeSourceCodeDerivation(sourcePosition), *attributes)
+
+    def errorNode(self, sourcePosition: SourcePosition, message: str, innerNodes: list = []):
+        return self.buildNode(ASGSyntaxErrorNode, sourcePosition, message, list(innerNodes))
+
+    def applicationNode(self, sourcePosition: SourcePosition, functional, arguments: list):
+        return self.buildNode(ASGSyntaxApplicationNode, sourcePosition, functional, arguments)
+
+    def argumentNode(self, sourcePosition: SourcePosition, name: str):
+        return self.buildNode(ASGSyntaxArgumentNode, sourcePosition, name)
+
+    def arrayNode(self, sourcePosition: SourcePosition, elements: list):
+        return self.buildNode(ASGSyntaxArrayNode, sourcePosition, elements)
+
+    def assignmentNode(self, sourcePosition: SourcePosition, store, value):
+        return self.buildNode(ASGSyntaxAssignmentNode, sourcePosition, store, value)
+
+    def binaryExpressionSequenceNode(self, sourcePosition: SourcePosition, elements: list):
+        return self.buildNode(ASGSyntaxBinaryExpressionSequenceNode, sourcePosition, elements)
+
+    def blockNode(self, sourcePosition: SourcePosition, arguments: list, body):
+        return self.buildNode(ASGSyntaxBlockNode, sourcePosition, arguments, body)
+
+    def cascadeMessageNode(self, sourcePosition: SourcePosition, selector, arguments: list):
+        return self.buildNode(ASGSyntaxCascadeMessageNode, sourcePosition, selector, arguments)
+
+    def identifierReferenceNode(self, sourcePosition: SourcePosition, value: str):
+        return self.buildNode(ASGSyntaxIdentifierReferenceNode, sourcePosition, value)
+
+    def lexicalSequenceNode(self, sourcePosition: SourcePosition, locals: list, pragmas: list, elements: list):
+        return self.buildNode(ASGSyntaxLexicalSequenceNode, sourcePosition, locals, pragmas, elements)
+
+    def literalArrayNode(self, sourcePosition: SourcePosition, elements: list):
+        return self.buildNode(ASGSyntaxLiteralArrayNode, sourcePosition, elements)
+
+    def literalCharacterNode(self, sourcePosition: SourcePosition, value: int):
+        return self.buildNode(ASGSyntaxLiteralCharacterNode, sourcePosition, value)
+
+    def literalFloatNode(self, sourcePosition: SourcePosition, value: float):
+        return self.buildNode(ASGSyntaxLiteralFloatNode, sourcePosition, value)
+
+    def literalIntegerNode(self, sourcePosition: SourcePosition, value: int):
+        return self.buildNode(ASGSyntaxLiteralIntegerNode, sourcePosition, value)
+
+    def literalStringNode(self, sourcePosition: SourcePosition, value: str):
+        return self.buildNode(ASGSyntaxLiteralStringNode, sourcePosition, value)
+
+    def literalSymbolNode(self, sourcePosition: SourcePosition, value: str):
+        return self.buildNode(ASGSyntaxLiteralSymbolNode, sourcePosition, value)
+
+    def localVariableNode(self, sourcePosition: SourcePosition, name: str):
+        return self.buildNode(ASGSyntaxLocalVariableNode, sourcePosition, name)
+
+    def messageCascadeNode(self, sourcePosition: SourcePosition, receiver, messages: list):
+        return self.buildNode(ASGSyntaxMessageCascadeNode, sourcePosition, receiver, messages)
+
+    def messageSendNode(self, sourcePosition: SourcePosition, receiver, selector, arguments: list):
+        return self.buildNode(ASGSyntaxMessageSendNode, sourcePosition, receiver, selector, arguments)
+
+    def pragmaNode(self, sourcePosition: SourcePosition, selector, arguments: list):
+        return self.buildNode(ASGSyntaxPragmaNode, sourcePosition, selector, arguments)
+
+    def sequenceNode(self, sourcePosition: SourcePosition, elements: list):
+        return self.buildNode(ASGSyntaxSequenceNode, sourcePosition, elements)
+
+def parseTokensIntoSyntax(sourceCode: SourceCode, tokens: list) -> tuple[ASGSyntaxNode, list[ASGSyntaxErrorNode]]:
+    return parseTopLevelExpressionWithErrors(ParserState(sourceCode, tokens, ASGSyntaxBuilder()))
+
+def parseSourceStringIntoSyntax(sourceText: str, sourceName: str = '<string>') -> tuple[ASGSyntaxNode, list[ASGSyntaxErrorNode]]:
+    return parseTokensIntoSyntax(*scanSourceString(sourceText, sourceName))
+
+def parseFileNamedIntoSyntax(fileName: str) -> tuple[ASGSyntaxNode, list[ASGSyntaxErrorNode]]:
+    return parseTokensIntoSyntax(*scanFileNamed(fileName))
@@ -0,0 +1,24 @@
+from .parser import parseSourceString
+from .syntax import ASGParseTreeFrontEnd
+from .analysis import expandAndAnalyze
+from .environment import makeScriptAnalysisEnvironment
+from .gcm import topLevelScriptGCM
+
+class ASGCompilationTestMixin:
+    """
+    Analyzes and compiles source strings for the test cases.
+    """
+    def analyzeSourceStringWithErrors(self, string: str):
+        asgSyntax = ASGParseTreeFrontEnd().visitNode(parseSourceString(string))
+        return expandAndAnalyze(makeScriptAnalysisEnvironment(asgSyntax.sourceDerivation.getSourcePosition(), 'test.st'), asgSyntax)
+
+    def analyzeSourceString(self, string: str):
+        asgAnalyzed, asgAnalysisErrors = self.analyzeSourceStringWithErrors(string)
+        self.assertEqual(len(asgAnalysisErrors), 0)
+        return asgAnalyzed
+
+    def compileAnalyzedScript(self, script):
+        return topLevelScriptGCM(script).asInterpretableInstructions()
+
+    def compileSourceString(self, string: str):
+        return self.compileAnalyzedScript(self.analyzeSourceString(string))
@@ -1,6 +1,12 @@
 import unittest
 from pyst.scanner_tests import *
 from pyst.parser_tests import *
+from pyst.environment_tests import *
+from pyst.analysis_tests import *
+from pyst.interpreter_tests import *
+from pyst.optimization_tests import *
+from pyst.image_tests import *
+from pyst.modules_tests import *
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file